@@ -0,0 +1,5 @@
+"""Load tests model endpoints at increasing concurrency and recommends an instance setting per model, and measures the synth of large configurations"""
+from benchmark.workload import Workload
+from benchmark.targets import ApiTarget, EndpointTarget
+from benchmark.runner import run_ramp, run_step
+from benchmark.recommend import recommend
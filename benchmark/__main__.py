@@ -0,0 +1,157 @@
+"""Benchmark CLI: python -m benchmark run|emulate|recommend|synth"""
+import sys
+import json
+import argparse
+
+from emulator import EmulatorSettings
+from benchmark.workload import Workload, PAYLOAD_FORMATS
+from benchmark.targets import ApiTarget, EndpointTarget
+from benchmark.runner import run_ramp, PERCENTILES
+from benchmark.emulated import benchmark_candidates, parse_candidates
+from benchmark.recommend import recommend, DEFAULT_PRICES
+from benchmark.synth import run_synth, format_result
+
+
+def load_json(value):
+    """Parses a json argument, or the json file it names"""
+    if value.lstrip().startswith(("{", "[")):
+        return json.loads(value)
+    with open(value) as file:
+        return json.load(file)
+
+
+def write_results(results, output):
+    if output is None:
+        print(json.dumps(results, indent=2))
+        return
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+
+def add_workload_arguments(parser):
+    parser.add_argument("--model", required=True, help="Model name of the results, i.e. Falcon40B")
+    parser.add_argument("--ramp", default="1,2,4,8,16", help="Comma separated concurrency steps")
+    parser.add_argument("--step-seconds", type=float, default=60, help="Duration of each concurrency step")
+    parser.add_argument("--prompt-tokens", default="fixed:128",
+                        help="Prompt length distribution: fixed:<n>, uniform:<low>:<high>, normal:<mean>:<std> or choice:<n>,<n>")
+    parser.add_argument("--output-tokens", default="fixed:128", help="Output length distribution, as --prompt-tokens")
+    parser.add_argument("--payload-format", choices=list(PAYLOAD_FORMATS), default="tgi")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Json file of the results, printed when omitted")
+
+
+def workload_of(args):
+    return Workload(args.prompt_tokens, args.output_tokens, args.payload_format, args.seed)
+
+
+def ramp_of(args):
+    return [int(concurrency) for concurrency in args.ramp.split(",")]
+
+
+def run(args):
+    if args.api_url is not None:
+        target = ApiTarget(args.api_url, args.resource, args.token)
+    else:
+        target = EndpointTarget(args.endpoint_name, args.inference_component_name, max_concurrency=max(ramp_of(args)))
+    steps = run_ramp(target, workload_of(args), ramp_of(args), args.step_seconds)
+    write_results([{"model": args.model, "instance_type": args.instance_type, "instance_count": args.instance_count,
+                    "target": target.describe(), "workload": workload_of(args).spec, "steps": steps}], args.output)
+
+
+def emulate(args):
+    settings = EmulatorSettings(**dict(load_json(args.emulator_settings) if args.emulator_settings else {},
+                                       time_scale=args.time_scale))
+    if args.instance_profiles is not None:
+        settings.instance_profiles = load_json(args.instance_profiles)
+    results = benchmark_candidates(args.model, parse_candidates(args.candidates), workload_of(args), ramp_of(args),
+                                   args.step_seconds, settings)
+    write_results(results, args.output)
+
+
+def recommend_settings(args):
+    results = []
+    for path in args.results:
+        results += load_json(path)
+    prices = dict(DEFAULT_PRICES, **load_json(args.prices)) if args.prices else DEFAULT_PRICES
+
+    recommendations = recommend(results, args.slo_ms, args.percentile, prices, args.target_rps, args.max_error_rate)
+    for recommendation in recommendations:
+        print(f"{recommendation['model']}:")
+        for candidate in recommendation["candidates"]:
+            print(f"  {candidate['instance_count']} x {candidate['instance_type']}: {candidate['throughput_rps']:.2f} req/s "
+                  f"at concurrency {candidate['concurrency']}, {args.percentile} {candidate['latency_ms']:.0f} ms, "
+                  f"${candidate['cost_per_hour']:.2f}/hour, ${candidate['cost_per_million_requests']:.2f}/million requests")
+        for reason in recommendation["rejected"]:
+            print(f"  rejected {reason}")
+        if recommendation["recommended"] is None:
+            print("  no setting meets the SLO")
+        else:
+            print(f"  recommended: {json.dumps(recommendation['recommended']['config'])}")
+    if args.output is not None:
+        write_results(recommendations, args.output)
+
+
+def synth(args):
+    results = []
+    for model_count in [int(count) for count in args.models.split(",")]:
+        result = run_synth(model_count, args.workdir)
+        print(format_result(result))
+        for warning in result["warnings"]:
+            print(f"  warning: {warning}")
+        results.append(result)
+    if args.output is not None:
+        write_results(results, args.output)
+    if args.fail_on_warnings and any(result["warnings"] for result in results):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load tests model endpoints and recommends instance settings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Benchmark a deployed model through the api or its SageMaker endpoint")
+    add_workload_arguments(run_parser)
+    target = run_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--api-url", help="APIURL output of the stack")
+    target.add_argument("--endpoint-name")
+    run_parser.add_argument("--resource", help="Api resource of the model, i.e. falcon")
+    run_parser.add_argument("--token", help="Auth token of the api")
+    run_parser.add_argument("--inference-component-name")
+    run_parser.add_argument("--instance-type", required=True, help="Instance type of the endpoint, i.e. ml.g5.12xlarge")
+    run_parser.add_argument("--instance-count", type=int, default=1)
+    run_parser.set_defaults(handler=run)
+
+    emulate_parser = commands.add_parser("emulate", help="Benchmark candidate settings on emulated endpoints")
+    add_workload_arguments(emulate_parser)
+    emulate_parser.add_argument("--candidates", required=True, help="Comma separated settings, i.e. ml.g5.2xlarge:1,ml.g5.12xlarge:1")
+    emulate_parser.add_argument("--instance-profiles", help="Json, or json file, of emulator serving settings per instance type")
+    emulate_parser.add_argument("--emulator-settings", help="Json, or json file, of emulator settings")
+    emulate_parser.add_argument("--time-scale", type=float, default=0.1, help="Emulated time runs this much faster than real time")
+    emulate_parser.set_defaults(handler=emulate)
+
+    recommend_parser = commands.add_parser("recommend", help="Recommend a setting per model from results files")
+    recommend_parser.add_argument("results", nargs="+", help="Json results files of run or emulate")
+    recommend_parser.add_argument("--slo-ms", type=float, required=True, help="Latency SLO in milliseconds")
+    recommend_parser.add_argument("--percentile", choices=list(PERCENTILES), default="p90")
+    recommend_parser.add_argument("--target-rps", type=float, help="Requests per second to sustain, sizes the instance count")
+    recommend_parser.add_argument("--max-error-rate", type=float, default=0.01)
+    recommend_parser.add_argument("--prices", help="Json, or json file, of instance hourly prices overriding the defaults")
+    recommend_parser.add_argument("--output", help="Json file of the recommendations")
+    recommend_parser.set_defaults(handler=recommend_settings)
+
+    synth_parser = commands.add_parser("synth", help="Measure the synth of generated configurations of increasing numbers of models")
+    synth_parser.add_argument("--models", default="1,10,50,200", help="Comma separated numbers of models")
+    synth_parser.add_argument("--workdir", default=".synth_benchmark", help="Directory of the generated configurations and cloud assemblies")
+    synth_parser.add_argument("--output", help="Json file of the measurements")
+    synth_parser.add_argument("--fail-on-warnings", action="store_true", help="Exit with an error when a template is close to a CloudFormation limit")
+    synth_parser.set_defaults(handler=synth)
+
+    args = parser.parse_args()
+    if args.command == "run" and args.api_url is not None and (args.resource is None or args.token is None):
+        parser.error("--api-url requires --resource and --token")
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Benchmarks candidate instance settings of a model on emulated endpoints"""
+import time
+
+import boto3
+
+from emulator import Emulator
+from benchmark.runner import run_ramp
+from benchmark.targets import EndpointTarget
+
+
+def parse_candidates(spec):
+    """Parses candidate settings like ml.g5.2xlarge:1,ml.g5.12xlarge:2 into (instance type, instance count) pairs"""
+    candidates = []
+    for candidate in spec.split(","):
+        instance_type, _, instance_count = candidate.strip().partition(":")
+        candidates.append((instance_type, int(instance_count or 1)))
+    return candidates
+
+
+def wait_in_service(sagemaker_client, endpoint_name, settings):
+    time.sleep(settings.scaled(settings.creation_delay_seconds))
+    while True:
+        status = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)["EndpointStatus"]
+        if status == "InService":
+            return
+        if status == "Failed":
+            raise RuntimeError(f"Emulated endpoint {endpoint_name} failed")
+        time.sleep(settings.scaled(10))
+
+
+def benchmark_candidates(model, candidates, workload, ramp, step_seconds, settings, report=print):
+    """Runs the ramp against an emulated endpoint per candidate setting, step_seconds are emulated seconds"""
+    results = []
+    with Emulator(settings) as emulator:
+        client_args = {"endpoint_url": emulator.url, "region_name": settings.region_name,
+                       "aws_access_key_id": "emulator", "aws_secret_access_key": "emulator"}
+        sagemaker_client = boto3.client("sagemaker", **client_args)
+
+        for instance_type, instance_count in candidates:
+            endpoint_name = f"{model}-{instance_type.replace('.', '-')}-{instance_count}-Endpoint"
+            sagemaker_client.create_endpoint_config(
+                EndpointConfigName=f"{endpoint_name}-Config",
+                ProductionVariants=[{"VariantName": "AllTraffic", "ModelName": model, "InstanceType": instance_type,
+                                     "InitialInstanceCount": instance_count}])
+            sagemaker_client.create_endpoint(EndpointName=endpoint_name, EndpointConfigName=f"{endpoint_name}-Config")
+            wait_in_service(sagemaker_client, endpoint_name, settings)
+
+            report(f"{model} on {instance_count} x {instance_type}")
+            target = EndpointTarget(endpoint_name, max_concurrency=max(ramp), **client_args)
+            steps = run_ramp(target, workload, ramp, settings.scaled(step_seconds), settings.time_scale, report=report)
+            sagemaker_client.delete_endpoint(EndpointName=endpoint_name)
+
+            results.append({"model": model, "instance_type": instance_type, "instance_count": instance_count,
+                            "target": dict(target.describe(), emulated=True), "workload": workload.spec, "steps": steps})
+    return results
@@ -0,0 +1,72 @@
+"""Recommends an instance setting per model from benchmark results, a latency SLO and instance prices"""
+import math
+
+# Approximate SageMaker real-time inference on-demand prices in us-east-1, in dollars per instance hour
+DEFAULT_PRICES = {
+    "ml.g4dn.xlarge": 0.736,
+    "ml.g4dn.2xlarge": 0.94,
+    "ml.g4dn.12xlarge": 4.89,
+    "ml.g5.xlarge": 1.408,
+    "ml.g5.2xlarge": 1.515,
+    "ml.g5.4xlarge": 2.03,
+    "ml.g5.8xlarge": 3.06,
+    "ml.g5.12xlarge": 7.09,
+    "ml.g5.16xlarge": 4.096,
+    "ml.g5.24xlarge": 10.18,
+    "ml.g5.48xlarge": 20.36,
+    "ml.p4d.24xlarge": 37.688,
+}
+
+
+def best_step(steps, slo_ms, percentile="p90", max_error_rate=0.01):
+    """Returns the highest throughput step meeting the latency SLO, None when no step does"""
+    passing = [step for step in steps
+               if step["latency_ms"][percentile] is not None and step["latency_ms"][percentile] <= slo_ms
+               and step["error_rate"] <= max_error_rate]
+    return max(passing, key=lambda step: step["throughput_rps"], default=None)
+
+
+def recommend(results, slo_ms, percentile="p90", prices=None, target_rps=None, max_error_rate=0.01):
+    """Returns a recommendation per model of the results.
+
+    Without target_rps the cheapest setting per request is recommended at its benchmarked instance
+    count. With target_rps the instance count of each setting is scaled to sustain it, assuming
+    throughput grows linearly with the instance count, and the cheapest setting per hour is recommended.
+    """
+    prices = prices or DEFAULT_PRICES
+    recommendations = []
+    for model in sorted({result["model"] for result in results}):
+        candidates = []
+        rejected = []
+        for result in [result for result in results if result["model"] == model]:
+            setting = f"{result['instance_count']} x {result['instance_type']}"
+            if result["instance_type"] not in prices:
+                rejected.append(f"{setting}: no price for {result['instance_type']}")
+                continue
+            step = best_step(result["steps"], slo_ms, percentile, max_error_rate)
+            if step is None or step["throughput_rps"] == 0:
+                rejected.append(f"{setting}: no concurrency meets {percentile} latency of {slo_ms} ms")
+                continue
+
+            instance_count = result["instance_count"]
+            if target_rps is not None:
+                instance_count = math.ceil(target_rps * result["instance_count"] / step["throughput_rps"])
+            cost_per_hour = prices[result["instance_type"]] * instance_count
+            candidates.append({
+                "instance_type": result["instance_type"],
+                "instance_count": instance_count,
+                "concurrency": step["concurrency"],
+                "throughput_rps": step["throughput_rps"] * instance_count / result["instance_count"],
+                "latency_ms": step["latency_ms"][percentile],
+                "cost_per_hour": cost_per_hour,
+                "cost_per_million_requests": cost_per_hour / (step["throughput_rps"] * instance_count / result["instance_count"] * 3600) * 1e6
+            })
+
+        recommendation = {"model": model, "rejected": rejected, "candidates": candidates, "recommended": None}
+        if candidates:
+            cost = "cost_per_hour" if target_rps is not None else "cost_per_million_requests"
+            best = min(candidates, key=lambda candidate: candidate[cost])
+            recommendation["recommended"] = dict(best, config={"inference_instance_type": best["instance_type"],
+                                                               "inference_instance_count": best["instance_count"]})
+        recommendations.append(recommendation)
+    return recommendations
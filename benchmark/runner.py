@@ -0,0 +1,85 @@
+"""Closed loop load generation: each concurrency step keeps a fixed number of requests in flight"""
+import math
+import time
+import threading
+from concurrent import futures
+
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile of a list of values, None when it is empty"""
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(concurrency, samples, elapsed_seconds, time_scale=1.0):
+    """Summarizes the samples of a step, latencies and throughput are converted back to real time with time_scale"""
+    succeeded = [sample for sample in samples if sample.error is None]
+    latencies = [sample.latency_ms / time_scale for sample in succeeded]
+    times_to_first_token = [sample.time_to_first_token_ms / time_scale for sample in succeeded
+                            if sample.time_to_first_token_ms is not None]
+    seconds = elapsed_seconds / time_scale
+
+    errors = {}
+    for sample in samples:
+        if sample.error is not None:
+            errors[sample.error] = errors.get(sample.error, 0) + 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": (len(samples) - len(succeeded)) / len(samples) if samples else 0,
+        "throughput_rps": len(succeeded) / seconds,
+        "output_tokens_per_second": sum(sample.output_tokens for sample in succeeded) / seconds,
+        "latency_ms": {name: percentile(latencies, fraction) for name, fraction in PERCENTILES.items()},
+        "time_to_first_token_ms": {name: percentile(times_to_first_token, fraction) for name, fraction in PERCENTILES.items()}
+    }
+
+
+def run_step(target, workload, concurrency, duration_seconds, time_scale=1.0):
+    """Keeps concurrency requests in flight for duration_seconds, returns the step summary"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration_seconds
+
+    def worker():
+        while time.monotonic() < deadline:
+            body, output_tokens = workload.request()
+            sample = target.send(body, output_tokens)
+            with lock:
+                samples.append(sample)
+
+    start = time.monotonic()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+
+    return summarize(concurrency, samples, time.monotonic() - start, time_scale)
+
+
+def run_ramp(target, workload, ramp, duration_seconds, time_scale=1.0, stop_error_rate=0.5, report=print):
+    """Runs a step per concurrency of the ramp, stopping once most requests fail"""
+    steps = []
+    for concurrency in ramp:
+        step = run_step(target, workload, concurrency, duration_seconds, time_scale)
+        steps.append(step)
+        report(format_step(step))
+        if step["error_rate"] > stop_error_rate:
+            report(f"Stopping the ramp, {step['error_rate']:.0%} of the requests failed")
+            break
+    return steps
+
+
+def format_step(step):
+    def milliseconds(value):
+        return f"{value:8.0f}" if value is not None else "       -"
+
+    latency = step["latency_ms"]
+    return (f"concurrency {step['concurrency']:4d} | {step['throughput_rps']:8.2f} req/s | "
+            f"{step['output_tokens_per_second']:9.1f} tok/s | "
+            f"latency p50 {milliseconds(latency['p50'])} p90 {milliseconds(latency['p90'])} p99 {milliseconds(latency['p99'])} ms | "
+            f"ttft p50 {milliseconds(step['time_to_first_token_ms']['p50'])} ms | errors {step['error_rate']:.1%}")
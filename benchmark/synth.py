@@ -0,0 +1,200 @@
+"""Measures cdk synth of the stack with generated configurations of increasing numbers of models.
+
+Each synth runs in a new interpreter, so that its peak memory is measured on its own, with the
+JumpStart lookups of the generated models served from a seeded JumpStart cache.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import resource
+import subprocess
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# CloudFormation quotas of a template, the synth warns once a template reaches WARNING_FRACTION of one
+TEMPLATE_LIMITS = {"resources": 500, "outputs": 200, "parameters": 200, "bytes": 1000000}
+WARNING_FRACTION = 0.8
+
+# Version of the generated models and stubbed JumpStart metadata, no lookup reaches the SageMaker SDK
+MODEL_VERSION = "1.0.0"
+
+# Models of the generated configurations, cycling through the integrations of the example configuration
+MODEL_TEMPLATES = [
+    {
+        "model_id": "huggingface-llm-falcon-40b-instruct-bf16",
+        "inference_instance_type": "ml.g5.12xlarge",
+        "inference_type": "realtime",
+        "schedule": {"initial_provision_minutes": 90},
+        "integration": {"type": "lambda", "properties": {"lambda_src": "functions/falcon"}}
+    },
+    {
+        "model_id": "huggingface-text2text-flan-t5-xxl",
+        "inference_instance_type": "ml.g5.12xlarge",
+        "inference_type": "realtime",
+        "schedule": {"initial_provision_minutes": 90},
+        "integration": {"type": "api", "properties": {}}
+    },
+    {
+        "model_id": "huggingface-text2text-flan-t5-xxl",
+        "inference_instance_type": "ml.g5.8xlarge",
+        "inference_type": "async",
+        "max_concurrent_invocations_per_instance": 4,
+        "autoscaling": {"min_capacity": 0, "max_capacity": 2, "target_backlog_per_instance": 5}
+    }
+]
+
+
+def generate_configs(model_count, region_name="us-east-1"):
+    """Returns a configuration of model_count models cycling through MODEL_TEMPLATES"""
+    models = []
+    for index in range(model_count):
+        model = json.loads(json.dumps(MODEL_TEMPLATES[index % len(MODEL_TEMPLATES)]))
+        model["name"] = f"Model{index}"
+        if "integration" in model:
+            model["integration"]["properties"]["api_resource_name"] = f"model{index}"
+        models.append(model)
+
+    return {"project_prefix": "bench", "region_name": region_name, "ddb_auth_table_name": "AuthTable",
+            "jumpstart_models": models}
+
+
+def seed_jumpstart_cache(cache, configs):
+    """Stores stub JumpStart metadata of the models of configs in a JumpStart cache"""
+    region_name = configs["region_name"]
+    for model in configs["jumpstart_models"]:
+        model_id = model["model_id"]
+        key = {"model_id": model_id, "version": MODEL_VERSION, "region": region_name, "scope": "inference"}
+        cache.lock_version(model_id, MODEL_VERSION)
+        cache.get("model_specs", lambda: {"version": MODEL_VERSION, "hosting_model_package_arns": None,
+                                          "inference_enable_network_isolation": False}, **key)
+        cache.get("environment_variables", lambda: {"SAGEMAKER_PROGRAM": "inference.py"}, **key)
+        cache.get("sagemaker_uris", lambda: {
+            "model_bucket_name": f"jumpstart-cache-prod-{region_name}",
+            "model_bucket_key": f"{model_id}/artifacts/inference-prepack/v1.0.0/",
+            "model_docker_image": f"763104351884.dkr.ecr.{region_name}.amazonaws.com/huggingface-pytorch-tgi-inference:latest",
+            "instance_type": model["inference_instance_type"],
+            "inference_source_uri": f"s3://jumpstart-cache-prod-{region_name}/source-directory-tarballs/{model_id}/sourcedir.tar.gz",
+            "region_name": region_name
+        }, instance_type=model["inference_instance_type"], **key)
+
+
+def template_stats(outdir):
+    """Returns the size, resources, outputs and parameters of each template of a cloud assembly"""
+    stats = {}
+    for path in sorted(glob.glob(os.path.join(outdir, "*.template.json"))):
+        with open(path, encoding="UTF-8") as file:
+            template = json.load(file)
+        resource_types = {}
+        for resource_definition in template.get("Resources", {}).values():
+            resource_types[resource_definition["Type"]] = resource_types.get(resource_definition["Type"], 0) + 1
+        stats[os.path.basename(path)] = {
+            "bytes": os.path.getsize(path),
+            "resources": len(template.get("Resources", {})),
+            "outputs": len(template.get("Outputs", {})),
+            "parameters": len(template.get("Parameters", {})),
+            "resource_types": resource_types
+        }
+    return stats
+
+
+def limit_warnings(templates):
+    """Returns a warning per template quantity at WARNING_FRACTION of its CloudFormation quota or above"""
+    warnings = []
+    for name, stats in templates.items():
+        for quantity, limit in TEMPLATE_LIMITS.items():
+            if stats[quantity] > limit:
+                warnings.append(f"{name} has {stats[quantity]} {quantity}, over the CloudFormation limit of {limit}")
+            elif stats[quantity] >= limit * WARNING_FRACTION:
+                warnings.append(f"{name} has {stats[quantity]} {quantity}, close to the CloudFormation limit of {limit}")
+    return warnings
+
+
+def child_peak_memory_mb():
+    """Peak resident memory of the child processes, i.e. the jsii node process, None without /proc"""
+    peak_kib = 0
+    for status_path in glob.glob("/proc/[0-9]*/status"):
+        try:
+            with open(status_path, encoding="UTF-8") as file:
+                status = dict(line.split(":", 1) for line in file if ":" in line)
+        except OSError:
+            continue
+        if int(status.get("PPid", "0").strip()) == os.getpid() and "VmHWM" in status:
+            peak_kib += int(status["VmHWM"].split()[0])
+    return peak_kib / 1024 if os.path.isdir("/proc") else None
+
+
+def synth(configs_path, outdir):
+    """Synthesizes the stack of a configuration file in this interpreter, returns the measurements"""
+    start = time.monotonic()
+    import aws_cdk as cdk
+    from stack.sagemaker_endpoint_manager_stack import SagemakerEndpointManagerStack
+    import_seconds = time.monotonic() - start
+
+    with open(configs_path, encoding="UTF-8") as file:
+        configs = json.load(file)
+
+    start = time.monotonic()
+    # Templates over the resource limit are synthesized too, so that they are measured and reported
+    app = cdk.App(outdir=outdir, context={"@aws-cdk/core:stackResourceLimit": 0})
+    SagemakerEndpointManagerStack(app, "SagemakerEndpointManagerStack",
+                                  env=cdk.Environment(region=configs["region_name"]),
+                                  configs=configs)
+    app.synth()
+    synth_seconds = time.monotonic() - start
+
+    templates = template_stats(outdir)
+    return {
+        "models": len(configs["jumpstart_models"]),
+        "outdir": outdir,
+        "import_seconds": import_seconds,
+        "synth_seconds": synth_seconds,
+        # ru_maxrss is in KiB on Linux
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "node_peak_memory_mb": child_peak_memory_mb(),
+        "template_bytes": sum(stats["bytes"] for stats in templates.values()),
+        "resources": sum(stats["resources"] for stats in templates.values()),
+        "templates": templates,
+        "warnings": limit_warnings(templates)
+    }
+
+
+def run_synth(model_count, workdir):
+    """Synthesizes a generated configuration of model_count models in a new interpreter, returns the measurements"""
+    from utils.jumpstart_cache import JumpStartCache
+
+    workdir = os.path.abspath(os.path.join(workdir, f"models-{model_count}"))
+    os.makedirs(workdir, exist_ok=True)
+    configs = generate_configs(model_count)
+    configs_path = os.path.join(workdir, "configs.json")
+    with open(configs_path, "w", encoding="UTF-8") as file:
+        json.dump(configs, file, indent=2)
+
+    cache_dir = os.path.join(workdir, "jumpstart_cache")
+    lockfile = os.path.join(workdir, "jumpstart.lock.json")
+    seed_jumpstart_cache(JumpStartCache(cache_dir, lockfile, ttl_seconds=float("inf")), configs)
+
+    outdir = os.path.join(workdir, "cdk.out")
+    shutil.rmtree(outdir, ignore_errors=True)
+    environment = dict(os.environ, JUMPSTART_CACHE_DIR=cache_dir, JUMPSTART_LOCKFILE=lockfile, JUMPSTART_CACHE_REFRESH="false",
+                       JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION="1")
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), configs_path, outdir],
+                            cwd=ROOT_DIR, env=environment, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Synth of {model_count} models failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def format_result(result):
+    largest = max(result["templates"].values(), key=lambda stats: stats["resources"])
+    node_memory = f"{result['node_peak_memory_mb']:6.1f}" if result["node_peak_memory_mb"] is not None else "     -"
+    return (f"{result['models']:5d} models | synth {result['synth_seconds']:7.2f} s (imports {result['import_seconds']:5.2f} s) | "
+            f"peak memory {result['peak_memory_mb']:6.1f} MB python {node_memory} MB node | templates {result['template_bytes'] / 1024:8.1f} KiB | "
+            f"{result['resources']:5d} resources, largest template {largest['resources']} resources {largest['bytes'] / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT_DIR)
+    print(json.dumps(synth(sys.argv[1], sys.argv[2])))
@@ -0,0 +1,88 @@
+"""Benchmark targets: a model resource of the API Gateway api, or a SageMaker endpoint invoked directly"""
+import time
+import urllib.error
+import urllib.request
+
+import boto3
+import botocore
+from botocore.config import Config
+
+# Time to first token reported by the emulator, real endpoints only report the full latency
+EMULATOR_TIME_TO_FIRST_TOKEN_HEADER = "x-emulator-time-to-first-token-ms"
+
+
+class Sample:
+    """Outcome of a single benchmark request"""
+
+    def __init__(self, latency_ms, time_to_first_token_ms=None, output_tokens=0, error=None):
+        self.latency_ms = latency_ms
+        self.time_to_first_token_ms = time_to_first_token_ms
+        self.output_tokens = output_tokens
+        self.error = error
+
+
+class ApiTarget:
+    """Posts requests to a model resource of the api, i.e. <APIURL>/falcon, with an auth token.
+
+    The api returns the whole model answer at once, the time to first token is the time to the
+    response headers.
+    """
+
+    def __init__(self, api_url, resource, token, timeout_seconds=120):
+        self.url = f"{api_url.rstrip('/')}/{resource}"
+        self.token = token
+        self.timeout_seconds = timeout_seconds
+
+    def describe(self):
+        return {"type": "api", "url": self.url}
+
+    def send(self, body, output_tokens):
+        request = urllib.request.Request(self.url, data=body.encode("utf-8"), method="POST",
+                                         headers={"Authorization": self.token, "Content-Type": "application/json"})
+        start = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+                first_byte_ms = (time.monotonic() - start) * 1000
+                response.read()
+        except urllib.error.HTTPError as error:
+            return Sample((time.monotonic() - start) * 1000, error=str(error.code))
+        except (urllib.error.URLError, TimeoutError) as error:
+            return Sample((time.monotonic() - start) * 1000, error=type(error).__name__)
+
+        return Sample((time.monotonic() - start) * 1000, first_byte_ms, output_tokens)
+
+
+class EndpointTarget:
+    """Invokes a SageMaker endpoint, or an inference component, with the SageMaker runtime.
+
+    Requests are not retried, throttled requests are counted as errors.
+    """
+
+    def __init__(self, endpoint_name, inference_component_name=None, max_concurrency=64, **client_args):
+        self.endpoint_name = endpoint_name
+        self.inference_component_name = inference_component_name
+        self.client = boto3.client("sagemaker-runtime",
+                                   config=Config(retries={"total_max_attempts": 1}, max_pool_connections=max_concurrency,
+                                                 read_timeout=300),
+                                   **client_args)
+
+    def describe(self):
+        return {"type": "endpoint", "endpoint_name": self.endpoint_name, "inference_component_name": self.inference_component_name}
+
+    def send(self, body, output_tokens):
+        invoke_args = {}
+        if self.inference_component_name is not None:
+            invoke_args["InferenceComponentName"] = self.inference_component_name
+
+        start = time.monotonic()
+        try:
+            response = self.client.invoke_endpoint(EndpointName=self.endpoint_name, ContentType="application/json",
+                                                   Accept="application/json", Body=body, **invoke_args)
+            response["Body"].read()
+        except botocore.exceptions.ClientError as error:
+            return Sample((time.monotonic() - start) * 1000, error=error.response["Error"]["Code"])
+
+        latency_ms = (time.monotonic() - start) * 1000
+        headers = response["ResponseMetadata"]["HTTPHeaders"]
+        time_to_first_token_ms = float(headers.get(EMULATOR_TIME_TO_FIRST_TOKEN_HEADER, latency_ms))
+        return Sample(latency_ms, time_to_first_token_ms, output_tokens)
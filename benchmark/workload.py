@@ -0,0 +1,60 @@
+"""Benchmark requests, with prompt and output lengths drawn from distributions"""
+import json
+import random
+import threading
+
+# Words of the generated prompts, about 4 tokens for 3 words
+PROMPT_WORDS = ["amazon", "sagemaker", "endpoint", "model", "inference", "latency", "throughput", "instance",
+                "request", "token", "prompt", "answer", "question", "describe", "explain", "summarize"]
+
+# Request bodies of the model containers, by payload format
+PAYLOAD_FORMATS = {
+    # Text generation inference containers, i.e. Falcon
+    "tgi": lambda prompt, output_tokens: {"inputs": prompt, "parameters": {"max_new_tokens": output_tokens}},
+    # JumpStart text2text containers, i.e. Flan T5
+    "flan": lambda prompt, output_tokens: {"text_inputs": prompt, "max_length": output_tokens},
+}
+
+
+def parse_distribution(spec):
+    """Returns a function drawing a positive token count from a distribution spec.
+
+    Specs are fixed:<n>, uniform:<low>:<high>, normal:<mean>:<standard deviation> or choice:<n>,<n>,...
+    """
+    kind, _, arguments = spec.partition(":")
+    if kind == "fixed":
+        count = int(arguments)
+        return lambda rng: count
+    if kind == "uniform":
+        low, high = [int(argument) for argument in arguments.split(":")]
+        return lambda rng: rng.randint(low, high)
+    if kind == "normal":
+        mean, deviation = [float(argument) for argument in arguments.split(":")]
+        return lambda rng: max(1, round(rng.gauss(mean, deviation)))
+    if kind == "choice":
+        counts = [int(argument) for argument in arguments.split(",")]
+        return lambda rng: rng.choice(counts)
+    raise ValueError(f"Unknown distribution {spec}, expected fixed, uniform, normal or choice")
+
+
+class Workload:
+    """Generates the request bodies sent to a model"""
+
+    def __init__(self, prompt_tokens="fixed:128", output_tokens="fixed:128", payload_format="tgi", seed=0):
+        if payload_format not in PAYLOAD_FORMATS:
+            raise ValueError(f"Unknown payload format {payload_format}, expected one of {', '.join(PAYLOAD_FORMATS)}")
+        self.spec = {"prompt_tokens": prompt_tokens, "output_tokens": output_tokens, "payload_format": payload_format}
+        self._prompt_tokens = parse_distribution(prompt_tokens)
+        self._output_tokens = parse_distribution(output_tokens)
+        self._payload = PAYLOAD_FORMATS[payload_format]
+        # Requests are drawn by concurrent workers, the sequence is reproducible for a seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def request(self):
+        """Returns a json request body and its requested output tokens"""
+        with self._lock:
+            prompt_tokens = self._prompt_tokens(self._rng)
+            output_tokens = self._output_tokens(self._rng)
+            words = [self._rng.choice(PROMPT_WORDS) for _ in range(max(1, prompt_tokens * 3 // 4))]
+        return json.dumps(self._payload(" ".join(words), output_tokens)), output_tokens
@@ -0,0 +1,18 @@
+"""Model data of SageMaker models"""
+from aws_cdk import (
+    aws_sagemaker as sagemaker
+)
+
+def set_model_data_source(model: sagemaker.CfnModel, model_bucket_name: str, model_bucket_key: str) -> None:
+    """Deploys uncompressed model data, an s3 prefix ending with /, without downloading and unpacking a tarball"""
+    if not model_bucket_key.endswith("/"):
+        return
+
+    model.add_property_deletion_override("Containers.0.ModelDataUrl")
+    model.add_property_override("Containers.0.ModelDataSource", {
+        "S3DataSource": {
+            "S3Uri": f"s3://{model_bucket_name}/{model_bucket_key}",
+            "S3DataType": "S3Prefix",
+            "CompressionType": "None"
+        }
+    })
@@ -2,9 +2,14 @@
 from typing import Optional
 from aws_cdk import (
     aws_sagemaker as sagemaker,
-    CfnOutput
+    aws_applicationautoscaling as appscaling,
+    aws_cloudwatch as cloudwatch,
+    aws_cloudwatch_actions as cloudwatch_actions,
+    CfnOutput,
+    Duration
 )
 from constructs import Construct
+from construct.model_data import set_model_data_source
 
 class SageMakerAsyncEndpointConstruct(Construct):
     """Class representing a SageMaker Async Endpoint Construct"""
@@ -26,7 +31,10 @@ class SageMakerAsyncEndpointConstruct(Construct):
         s3_async_bucket: str,
         deploy_enable: bool,
         model_package_arn: Optional[str],
-        enable_network_isolation: Optional[bool]) -> None:
+        enable_network_isolation: Optional[bool],
+        max_concurrent_invocations_per_instance: int = 4,
+        model_data_download_timeout: Optional[int] = None,
+        container_startup_health_check_timeout: Optional[int] = None) -> None:
         super().__init__(scope, construct_id)
 
         if model_package_arn is not None:
@@ -51,15 +59,19 @@ class SageMakerAsyncEndpointConstruct(Construct):
                     containers=container,
                     enable_network_isolation=enable_network_isolation
             )
+        if model_package_arn is None:
+            set_model_data_source(model, model_bucket_name, model_bucket_key)
 
-        config = sagemaker.CfnEndpointConfig(self, f"{model_name}-Config",
+        self.config = sagemaker.CfnEndpointConfig(self, f"{model_name}-Config",
             production_variants=[
                 sagemaker.CfnEndpointConfig.ProductionVariantProperty(
                     model_name= model.attr_model_name,
                     variant_name= variant_name,
                     initial_variant_weight= variant_weight,
                     initial_instance_count= instance_count,
-                    instance_type= instance_type
+                    instance_type= instance_type,
+                    model_data_download_timeout_in_seconds= model_data_download_timeout,
+                    container_startup_health_check_timeout_in_seconds= container_startup_health_check_timeout
                 )
             ],
             async_inference_config=sagemaker.CfnEndpointConfig.AsyncInferenceConfigProperty(
@@ -73,20 +85,81 @@ class SageMakerAsyncEndpointConstruct(Construct):
                 ),
                 # the properties below are optional
                 client_config=sagemaker.CfnEndpointConfig.AsyncInferenceClientConfigProperty(
-                    max_concurrent_invocations_per_instance=4
+                    max_concurrent_invocations_per_instance=max_concurrent_invocations_per_instance
                 )
             )
         )
 
+        self.model_name = model_name
+        self.variant_name = variant_name
         self.deploy_enable = deploy_enable
         if deploy_enable:
             self.endpoint = sagemaker.CfnEndpoint(self, f"{model_name}-Endpoint",
                                 endpoint_name= f"{project_prefix}-{model_name}-Endpoint",
-                                endpoint_config_name= config.attr_endpoint_config_name
+                                endpoint_config_name= self.config.attr_endpoint_config_name
             )
 
             CfnOutput(scope=self,id=f"{model_name}EndpointName", value=self.endpoint.endpoint_name)
 
+    def add_autoscaling(self,
+        min_capacity: int,
+        max_capacity: int,
+        target_backlog_per_instance: float,
+        scale_in_cooldown: int,
+        scale_out_cooldown: int) -> appscaling.ScalableTarget:
+        """Scale the endpoint on its queue backlog, down to min_capacity instances which can be 0"""
+        endpoint_name = self.endpoint.endpoint_name
+
+        scalable_target = appscaling.ScalableTarget(self, f"{self.model_name}-ScalableTarget",
+                                service_namespace=appscaling.ServiceNamespace.SAGEMAKER,
+                                resource_id=f"endpoint/{endpoint_name}/variant/{self.variant_name}",
+                                scalable_dimension="sagemaker:variant:DesiredInstanceCount",
+                                min_capacity=min_capacity,
+                                max_capacity=max_capacity
+        )
+        scalable_target.node.add_dependency(self.endpoint)
+
+        # Track the number of queued requests per instance
+        scalable_target.scale_to_track_metric(f"{self.model_name}-BacklogTracking",
+                                target_value=target_backlog_per_instance,
+                                custom_metric=cloudwatch.Metric(
+                                    namespace="AWS/SageMaker",
+                                    metric_name="ApproximateBacklogSizePerInstance",
+                                    dimensions_map={"EndpointName": endpoint_name},
+                                    statistic="Average",
+                                    period=Duration.minutes(1)
+                                ),
+                                scale_in_cooldown=Duration.seconds(scale_in_cooldown),
+                                scale_out_cooldown=Duration.seconds(scale_out_cooldown)
+        )
+
+        if min_capacity == 0:
+            # The backlog per instance is not reported without instances, step up from zero on requests waiting for capacity
+            scale_out_action = appscaling.StepScalingAction(self, f"{self.model_name}-ScaleOutFromZero",
+                                scaling_target=scalable_target,
+                                adjustment_type=appscaling.AdjustmentType.CHANGE_IN_CAPACITY,
+                                cooldown=Duration.seconds(scale_out_cooldown),
+                                metric_aggregation_type=appscaling.MetricAggregationType.MAXIMUM
+            )
+            scale_out_action.add_adjustment(adjustment=1, lower_bound=0)
+
+            backlog_alarm = cloudwatch.Alarm(self, f"{self.model_name}-HasBacklogWithoutCapacity",
+                                metric=cloudwatch.Metric(
+                                    namespace="AWS/SageMaker",
+                                    metric_name="HasBacklogWithoutCapacity",
+                                    dimensions_map={"EndpointName": endpoint_name},
+                                    statistic="Maximum",
+                                    period=Duration.minutes(1)
+                                ),
+                                threshold=1,
+                                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                                evaluation_periods=1,
+                                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+            )
+            backlog_alarm.add_alarm_action(cloudwatch_actions.ApplicationScalingAction(scale_out_action))
+
+        return scalable_target
+
     @property
     def endpoint_name(self) -> str:
         """Return endpoint name"""
@@ -5,6 +5,7 @@ from aws_cdk import (
     CfnOutput
 )
 from constructs import Construct
+from construct.model_data import set_model_data_source
 
 class SageMakerEndpointConstruct(Construct):
     """Class representing a real-time SageMaker Endpoint Construct"""
@@ -18,12 +19,15 @@ class SageMakerEndpointConstruct(Construct):
         model_docker_image: Optional[str],
         variant_name: str,
         variant_weight: int,
-        instance_count: int,
-        instance_type: str,
+        instance_count: Optional[int],
+        instance_type: Optional[str],
         environment: dict,
         deploy_enable: bool,
         model_package_arn: Optional[str],
-        enable_network_isolation: Optional[bool]) -> None:
+        enable_network_isolation: Optional[bool],
+        serverless_config: Optional[dict] = None,
+        model_data_download_timeout: Optional[int] = None,
+        container_startup_health_check_timeout: Optional[int] = None) -> None:
         super().__init__(scope, construct_id)
 
         # Do not use a custom named resource for models as these get replaced
@@ -49,17 +53,34 @@ class SageMakerEndpointConstruct(Construct):
                 containers=container,
                 enable_network_isolation=enable_network_isolation
             )
+        if model_package_arn is None:
+            set_model_data_source(model, model_bucket_name, model_bucket_key)
 
-        self.config = sagemaker.CfnEndpointConfig(self, f"{model_name}-Config",
-            production_variants=[
-                sagemaker.CfnEndpointConfig.ProductionVariantProperty(
+        if serverless_config is not None:
+            # Serverless endpoints are billed per request and have no instances
+            production_variant = sagemaker.CfnEndpointConfig.ProductionVariantProperty(
+                    model_name= model.attr_model_name,
+                    variant_name= variant_name,
+                    initial_variant_weight= variant_weight,
+                    serverless_config=sagemaker.CfnEndpointConfig.ServerlessConfigProperty(
+                        memory_size_in_mb=serverless_config["memory_size_in_mb"],
+                        max_concurrency=serverless_config["max_concurrency"],
+                        provisioned_concurrency=serverless_config.get("provisioned_concurrency")
+                    )
+                )
+        else:
+            production_variant = sagemaker.CfnEndpointConfig.ProductionVariantProperty(
                     model_name= model.attr_model_name,
                     variant_name= variant_name,
                     initial_variant_weight= variant_weight,
                     initial_instance_count= instance_count,
-                    instance_type= instance_type
+                    instance_type= instance_type,
+                    model_data_download_timeout_in_seconds= model_data_download_timeout,
+                    container_startup_health_check_timeout_in_seconds= container_startup_health_check_timeout
                 )
-            ]
+
+        self.config = sagemaker.CfnEndpointConfig(self, f"{model_name}-Config",
+            production_variants=[production_variant]
         )
 
         self.deploy_enable = deploy_enable
@@ -0,0 +1,112 @@
+"""SageMaker Shared Endpoint Construct"""
+from typing import Optional
+from aws_cdk import (
+    aws_sagemaker as sagemaker
+)
+from constructs import Construct
+from construct.model_data import set_model_data_source
+
+class SageMakerSharedEndpointConstruct(Construct):
+    """Class representing the config of a real-time SageMaker Endpoint serving models packed as inference components.
+
+    The endpoint and its inference components are created by the endpoint manager, the
+    construct creates the endpoint config and the models of the components.
+    """
+
+    def __init__(self, scope: Construct, construct_id: str,
+        role_arn: str,
+        endpoint_name: str,
+        variant_name: str,
+        instance_count: int,
+        instance_type: str,
+        min_instance_count: Optional[int] = None,
+        max_instance_count: Optional[int] = None,
+        model_data_download_timeout: Optional[int] = None,
+        container_startup_health_check_timeout: Optional[int] = None) -> None:
+        super().__init__(scope, construct_id)
+
+        self.role_arn = role_arn
+        self.variant_name = variant_name
+        self.inference_components = []
+
+        # The models are deployed by the inference components, not by the endpoint config
+        self.config = sagemaker.CfnEndpointConfig(self, f"{endpoint_name}-Config",
+            production_variants=[
+                sagemaker.CfnEndpointConfig.ProductionVariantProperty(
+                    model_name= "",
+                    variant_name= variant_name,
+                    initial_variant_weight= 1,
+                    initial_instance_count= instance_count,
+                    instance_type= instance_type,
+                    model_data_download_timeout_in_seconds= model_data_download_timeout,
+                    container_startup_health_check_timeout_in_seconds= container_startup_health_check_timeout
+                )
+            ]
+        )
+        self.config.add_property_deletion_override("ProductionVariants.0.ModelName")
+        self.config.add_property_deletion_override("ProductionVariants.0.InitialVariantWeight")
+        self.config.add_property_override("ExecutionRoleArn", role_arn)
+        self.config.add_property_override("ProductionVariants.0.RoutingConfig", {"RoutingStrategy": "LEAST_OUTSTANDING_REQUESTS"})
+
+        if max_instance_count is not None:
+            # Add and remove instances as inference component copies are added and removed
+            self.config.add_property_override("ProductionVariants.0.ManagedInstanceScaling", {
+                "Status": "ENABLED",
+                "MinInstanceCount": min_instance_count if min_instance_count is not None else instance_count,
+                "MaxInstanceCount": max_instance_count
+            })
+
+    def add_inference_component(self,
+        inference_component_name: str,
+        model_name: str,
+        model_bucket_name: Optional[str],
+        model_bucket_key: Optional[str],
+        model_docker_image: Optional[str],
+        environment: dict,
+        model_package_arn: Optional[str],
+        enable_network_isolation: Optional[bool],
+        compute_resource_requirements: dict,
+        copy_count: int,
+        autoscaling: Optional[dict] = None,
+        warmup: Optional[dict] = None) -> None:
+        """Creates the model of an inference component, the component is created by the endpoint manager"""
+        if model_package_arn is not None:
+            # Deploy model using model package arn
+            container = [
+                        sagemaker.CfnModel.ContainerDefinitionProperty(
+                                model_package_name=model_package_arn
+                            )
+                        ]
+        else:
+            # Deploy model using docker image
+            container = [
+                        sagemaker.CfnModel.ContainerDefinitionProperty(
+                                image= model_docker_image,
+                                model_data_url= f"s3://{model_bucket_name}/{model_bucket_key}",
+                                environment= environment
+                            )
+                        ]
+
+        model = sagemaker.CfnModel(self, f"{model_name}-Model",
+                execution_role_arn= self.role_arn,
+                containers=container,
+                enable_network_isolation=enable_network_isolation
+            )
+        if model_package_arn is None:
+            set_model_data_source(model, model_bucket_name, model_bucket_key)
+
+        inference_component = {
+            "name": inference_component_name,
+            "model_name": model.attr_model_name,
+            "variant_name": self.variant_name,
+            "compute_resource_requirements": compute_resource_requirements,
+            "copy_count": copy_count
+        }
+
+        if autoscaling is not None:
+            inference_component["autoscaling"] = autoscaling
+
+        if warmup is not None:
+            inference_component["warmup"] = warmup
+
+        self.inference_components.append(inference_component)
@@ -0,0 +1,5 @@
+"""Local emulator of the AWS apis used by the lambdas, to load test the endpoint manager and invoke path without AWS"""
+from emulator.errors import EmulatorError
+from emulator.settings import EmulatorSettings
+from emulator.server import Emulator
+from emulator.lambdas import LocalLambda
@@ -0,0 +1,51 @@
+"""Runs the emulator as a standalone service: python -m emulator --port 4566"""
+import json
+import time
+import argparse
+
+from emulator import Emulator, EmulatorSettings
+
+
+def main():
+    defaults = EmulatorSettings()
+    parser = argparse.ArgumentParser(description="Local emulator of the SageMaker, SSM, DynamoDB, Application Auto Scaling and Service Quotas apis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4566)
+    parser.add_argument("--creation-delay-seconds", type=float, default=defaults.creation_delay_seconds)
+    parser.add_argument("--update-delay-seconds", type=float, default=defaults.update_delay_seconds)
+    parser.add_argument("--concurrency-per-instance", type=int, default=defaults.concurrency_per_instance)
+    parser.add_argument("--queue-per-instance", type=int, default=defaults.queue_per_instance)
+    parser.add_argument("--time-to-first-token-ms", type=float, default=defaults.time_to_first_token_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--control-plane-requests-per-second", type=float, default=None)
+    parser.add_argument("--instance-quotas", type=json.loads, default={},
+                        help='Json object of maximum instances per instance type, i.e. {"ml.g5.12xlarge": 2}')
+    parser.add_argument("--instance-profiles", type=json.loads, default={},
+                        help='Json object of request serving settings per instance type, i.e. {"ml.g5.12xlarge": {"tokens_per_second": 80}}')
+    parser.add_argument("--time-scale", type=float, default=defaults.time_scale)
+    args = parser.parse_args()
+
+    settings = EmulatorSettings(creation_delay_seconds=args.creation_delay_seconds,
+                                update_delay_seconds=args.update_delay_seconds,
+                                concurrency_per_instance=args.concurrency_per_instance,
+                                queue_per_instance=args.queue_per_instance,
+                                time_to_first_token_ms=args.time_to_first_token_ms,
+                                tokens_per_second=args.tokens_per_second,
+                                control_plane_requests_per_second=args.control_plane_requests_per_second,
+                                instance_quotas=args.instance_quotas,
+                                instance_profiles=args.instance_profiles,
+                                time_scale=args.time_scale)
+
+    with Emulator(settings, host=args.host, port=args.port) as emulator:
+        print(f"Emulator listening on {emulator.url}, point boto3 at it with:")
+        for name, value in emulator.environment().items():
+            print(f"export {name}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Emulated Application Auto Scaling, scalable targets and policies are recorded but do not scale the endpoints"""
+import threading
+
+from emulator.errors import EmulatorError
+
+
+class ApplicationAutoScaling:
+    """Scalable targets and scaling policies registered by the endpoint manager"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.scalable_targets = {}
+        self.scaling_policies = {}
+
+    def handle(self, operation, request):
+        method = getattr(self, operation, None)
+        if method is None:
+            raise EmulatorError("UnknownOperationException", f"Operation {operation} is not emulated")
+        with self.lock:
+            return method(request)
+
+    def RegisterScalableTarget(self, request):
+        key = (request["ResourceId"], request["ScalableDimension"])
+        self.scalable_targets[key] = {
+            "ServiceNamespace": request["ServiceNamespace"],
+            "ResourceId": request["ResourceId"],
+            "ScalableDimension": request["ScalableDimension"],
+            "MinCapacity": request.get("MinCapacity", 0),
+            "MaxCapacity": request.get("MaxCapacity", 0),
+            "RoleARN": f"arn:aws:iam::{self.settings.account_id}:role/emulator",
+            "CreationTime": 0
+        }
+        return {}
+
+    def DescribeScalableTargets(self, request):
+        resource_ids = request.get("ResourceIds")
+        targets = [target for (resource_id, dimension), target in self.scalable_targets.items()
+                   if (resource_ids is None or resource_id in resource_ids)
+                   and request.get("ScalableDimension", dimension) == dimension]
+        return {"ScalableTargets": targets}
+
+    def DeregisterScalableTarget(self, request):
+        key = (request["ResourceId"], request["ScalableDimension"])
+        if key not in self.scalable_targets:
+            raise EmulatorError("ObjectNotFoundException", f"No scalable target found for service namespace: {request['ServiceNamespace']}, "
+                                                          f"resource ID: {request['ResourceId']}, scalable dimension: {request['ScalableDimension']}")
+        del self.scalable_targets[key]
+        for policy_key in [policy_key for policy_key in self.scaling_policies if policy_key[:2] == key]:
+            del self.scaling_policies[policy_key]
+        return {}
+
+    def PutScalingPolicy(self, request):
+        key = (request["ResourceId"], request["ScalableDimension"], request["PolicyName"])
+        self.scaling_policies[key] = request
+        return {
+            "PolicyARN": f"arn:aws:autoscaling:{self.settings.region_name}:{self.settings.account_id}:scalingPolicy:emulator:resource/{request['ResourceId']}:policyName/{request['PolicyName']}",
+            "Alarms": []
+        }
@@ -0,0 +1,354 @@
+"""In-memory DynamoDB tables with the subset of condition and update expressions used by the lambdas"""
+import re
+import copy
+import threading
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from emulator.errors import EmulatorError
+
+TOKEN_PATTERN = re.compile(r"\s*(<>|<=|>=|=|<|>|\(|\)|,|\+|-|#[A-Za-z0-9_]+|:[A-Za-z0-9_]+|[A-Za-z_][A-Za-z0-9_]*)")
+KEYWORDS = {"AND", "OR", "NOT", "IN", "BETWEEN", "SET", "REMOVE", "ADD", "DELETE"}
+UPDATE_CLAUSES = ["SET", "REMOVE", "ADD", "DELETE"]
+
+deserializer = TypeDeserializer()
+serializer = TypeSerializer()
+
+
+def deserialize(values):
+    return {name: deserializer.deserialize(value) for name, value in (values or {}).items()}
+
+
+def serialize(item):
+    return {name: serializer.serialize(value) for name, value in item.items()}
+
+
+class ConditionalCheckFailed(EmulatorError):
+    def __init__(self):
+        super().__init__("ConditionalCheckFailedException", "The conditional request failed")
+
+
+class Expression:
+    """Tokens of a condition or update expression, with its attribute names and values"""
+
+    def __init__(self, expression, names, values):
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values
+
+    @staticmethod
+    def _tokenize(expression):
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = TOKEN_PATTERN.match(expression, position)
+            if match is None:
+                raise EmulatorError("ValidationException", f"Invalid expression: {expression}")
+            tokens.append(match.group(1))
+            position = match.end()
+        return tokens
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def peek_keyword(self):
+        token = self.peek()
+        return token.upper() if token is not None and token.upper() in KEYWORDS else None
+
+    def next(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise EmulatorError("ValidationException", f"Invalid expression, expected {expected} at {token}")
+        self.position += 1
+        return token
+
+    def path(self):
+        token = self.next()
+        if token.startswith("#"):
+            if token not in self.names:
+                raise EmulatorError("ValidationException", f"Expression attribute name {token} is not defined")
+            return self.names[token]
+        return token
+
+    def operand(self, item):
+        """Returns the value of an attribute path, its size or an expression value, None if the attribute does not exist"""
+        token = self.peek()
+        if token.lower() == "size":
+            self.next()
+            self.next("(")
+            value = item.get(self.path())
+            self.next(")")
+            return len(value) if value is not None else None
+        if token.startswith(":"):
+            self.next()
+            if token not in self.values:
+                raise EmulatorError("ValidationException", f"Expression attribute value {token} is not defined")
+            return self.values[token]
+        return item.get(self.path())
+
+    def done(self):
+        return self.position == len(self.tokens)
+
+
+def compare(left, operator, right):
+    if operator == "=":
+        return left == right
+    if operator == "<>":
+        return left != right
+    if left is None or right is None:
+        return False
+    try:
+        return {"<": left < right, "<=": left <= right, ">": left > right, ">=": left >= right}[operator]
+    except TypeError:
+        return False
+
+
+def evaluate_condition(expression, item):
+    """Evaluates a condition expression against an item, missing attributes compare as None"""
+
+    def parse_or():
+        result = parse_and()
+        while expression.peek_keyword() == "OR":
+            expression.next()
+            # Both sides are parsed, DynamoDB does not short circuit the syntax check
+            right = parse_and()
+            result = result or right
+        return result
+
+    def parse_and():
+        result = parse_not()
+        while expression.peek_keyword() == "AND":
+            expression.next()
+            right = parse_not()
+            result = result and right
+        return result
+
+    def parse_not():
+        if expression.peek_keyword() == "NOT":
+            expression.next()
+            return not parse_not()
+        return parse_primary()
+
+    def parse_primary():
+        token = expression.peek()
+        if token == "(":
+            expression.next()
+            result = parse_or()
+            expression.next(")")
+            return result
+
+        function = token.lower() if token is not None else None
+        if function in ["attribute_exists", "attribute_not_exists", "begins_with", "contains"]:
+            expression.next()
+            expression.next("(")
+            if function in ["attribute_exists", "attribute_not_exists"]:
+                exists = expression.path() in item
+                expression.next(")")
+                return exists if function == "attribute_exists" else not exists
+            value = expression.operand(item)
+            expression.next(",")
+            argument = expression.operand(item)
+            expression.next(")")
+            if value is None:
+                return False
+            return value.startswith(argument) if function == "begins_with" else argument in value
+
+        left = expression.operand(item)
+        keyword = expression.peek_keyword()
+        if keyword == "IN":
+            expression.next()
+            expression.next("(")
+            candidates = [expression.operand(item)]
+            while expression.peek() == ",":
+                expression.next()
+                candidates.append(expression.operand(item))
+            expression.next(")")
+            return left in candidates
+        if keyword == "BETWEEN":
+            expression.next()
+            low = expression.operand(item)
+            expression.next("AND")
+            high = expression.operand(item)
+            return compare(left, ">=", low) and compare(left, "<=", high)
+
+        operator = expression.next()
+        if operator not in ["=", "<>", "<", "<=", ">", ">="]:
+            raise EmulatorError("ValidationException", f"Invalid comparator {operator}")
+        return compare(left, operator, expression.operand(item))
+
+    result = parse_or()
+    if not expression.done():
+        raise EmulatorError("ValidationException", f"Invalid condition expression at {expression.peek()}")
+    return result
+
+
+def apply_update(expression, item):
+    """Applies the SET, REMOVE, ADD and DELETE clauses of an update expression to an item in place"""
+
+    def set_value():
+        token = expression.peek()
+        if token is not None and token.lower() == "if_not_exists":
+            expression.next()
+            expression.next("(")
+            path = expression.path()
+            expression.next(",")
+            default = expression.operand(item)
+            expression.next(")")
+            return item[path] if path in item else default
+        if token is not None and token.lower() == "list_append":
+            expression.next()
+            expression.next("(")
+            first = expression.operand(item)
+            expression.next(",")
+            second = expression.operand(item)
+            expression.next(")")
+            return list(first or []) + list(second or [])
+        return expression.operand(item)
+
+    while not expression.done():
+        clause = expression.next().upper()
+        if clause not in UPDATE_CLAUSES:
+            raise EmulatorError("ValidationException", f"Invalid update expression clause {clause}")
+
+        while True:
+            path = expression.path()
+            if clause == "SET":
+                expression.next("=")
+                value = set_value()
+                if expression.peek() in ["+", "-"]:
+                    operator = expression.next()
+                    other = set_value()
+                    value = value + other if operator == "+" else value - other
+                item[path] = value
+            elif clause == "REMOVE":
+                item.pop(path, None)
+            elif clause == "ADD":
+                value = expression.operand(item)
+                if isinstance(value, (int, Decimal)):
+                    item[path] = item.get(path, Decimal(0)) + value
+                else:
+                    item[path] = set(item.get(path, set())) | set(value)
+            else:
+                value = expression.operand(item)
+                if path in item:
+                    item[path] = set(item[path]) - set(value)
+                    if len(item[path]) == 0:
+                        del item[path]
+
+            if expression.peek() != ",":
+                break
+            expression.next()
+
+
+class DynamoDBTables:
+    """DynamoDB tables keyed on the attributes of their key schema.
+
+    Tables that were not created are created with the attributes of the first key used to access them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key_schemas = {}
+        self.tables = {}
+
+    def handle(self, operation, request):
+        method = getattr(self, operation, None)
+        if method is None or operation.startswith("_"):
+            raise EmulatorError("UnknownOperationException", f"Operation {operation} is not emulated")
+        return method(request)
+
+    def _table(self, table_name, key=None):
+        if table_name not in self.tables:
+            if key is None:
+                raise EmulatorError("ResourceNotFoundException", f"Requested resource not found: Table: {table_name} not found")
+            self.key_schemas[table_name] = sorted(key)
+            self.tables[table_name] = {}
+        return self.tables[table_name]
+
+    def _item_key(self, table_name, key):
+        if sorted(key) != self.key_schemas[table_name]:
+            raise EmulatorError("ValidationException", "The provided key element does not match the schema")
+        return tuple(str(key[name]) for name in self.key_schemas[table_name])
+
+    def CreateTable(self, request):
+        with self.lock:
+            table_name = request["TableName"]
+            if table_name in self.tables:
+                raise EmulatorError("ResourceInUseException", f"Table already exists: {table_name}")
+            self.key_schemas[table_name] = sorted(element["AttributeName"] for element in request["KeySchema"])
+            self.tables[table_name] = {}
+            return {"TableDescription": {"TableName": table_name, "TableStatus": "ACTIVE", "KeySchema": request["KeySchema"]}}
+
+    def GetItem(self, request):
+        with self.lock:
+            key = deserialize(request["Key"])
+            table = self._table(request["TableName"], key)
+            item = table.get(self._item_key(request["TableName"], key))
+            return {"Item": serialize(item)} if item is not None else {}
+
+    def BatchGetItem(self, request):
+        with self.lock:
+            responses = {}
+            for table_name, table_request in request["RequestItems"].items():
+                items = []
+                for serialized_key in table_request["Keys"]:
+                    key = deserialize(serialized_key)
+                    item = self._table(table_name, key).get(self._item_key(table_name, key))
+                    if item is not None:
+                        items.append(serialize(item))
+                responses[table_name] = items
+            return {"Responses": responses, "UnprocessedKeys": {}}
+
+    def _check_condition(self, request, item):
+        if "ConditionExpression" in request:
+            expression = Expression(request["ConditionExpression"], request.get("ExpressionAttributeNames"),
+                                    deserialize(request.get("ExpressionAttributeValues")))
+            if not evaluate_condition(expression, item):
+                raise ConditionalCheckFailed()
+
+    def PutItem(self, request):
+        with self.lock:
+            item = deserialize(request["Item"])
+            table = self._table(request["TableName"])
+            item_key = self._item_key(request["TableName"], {name: item[name] for name in self.key_schemas[request["TableName"]]})
+            old_item = table.get(item_key)
+            self._check_condition(request, old_item or {})
+            table[item_key] = item
+            return {"Attributes": serialize(old_item)} if request.get("ReturnValues") == "ALL_OLD" and old_item else {}
+
+    def UpdateItem(self, request):
+        with self.lock:
+            key = deserialize(request["Key"])
+            table = self._table(request["TableName"], key)
+            item_key = self._item_key(request["TableName"], key)
+            old_item = table.get(item_key)
+            self._check_condition(request, old_item or {})
+
+            item = copy.deepcopy(old_item) if old_item is not None else dict(key)
+            if "UpdateExpression" in request:
+                apply_update(Expression(request["UpdateExpression"], request.get("ExpressionAttributeNames"),
+                                        deserialize(request.get("ExpressionAttributeValues"))), item)
+            table[item_key] = item
+
+            return_values = request.get("ReturnValues", "NONE")
+            if return_values in ["ALL_NEW", "UPDATED_NEW"]:
+                return {"Attributes": serialize(item)}
+            if return_values in ["ALL_OLD", "UPDATED_OLD"] and old_item is not None:
+                return {"Attributes": serialize(old_item)}
+            return {}
+
+    def DeleteItem(self, request):
+        with self.lock:
+            key = deserialize(request["Key"])
+            table = self._table(request["TableName"], key)
+            item_key = self._item_key(request["TableName"], key)
+            self._check_condition(request, table.get(item_key) or {})
+            old_item = table.pop(item_key, None)
+            return {"Attributes": serialize(old_item)} if request.get("ReturnValues") == "ALL_OLD" and old_item else {}
+
+    def Scan(self, request):
+        with self.lock:
+            items = list(self._table(request["TableName"]).values())
+            return {"Items": [serialize(item) for item in items], "Count": len(items), "ScannedCount": len(items)}
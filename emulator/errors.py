@@ -0,0 +1,11 @@
+"""Errors returned by the emulator as AWS service errors"""
+
+
+class EmulatorError(Exception):
+    """Error returned to the boto3 client with its AWS error code and http status"""
+
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
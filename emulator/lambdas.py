@@ -0,0 +1,52 @@
+"""Runs the lambdas of functions/ in the current process, with their boto3 clients pointed at the emulator"""
+import os
+import sys
+import time
+import uuid
+import importlib.util
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTIONS_DIR = os.path.join(ROOT_DIR, "functions")
+# The invoke lambdas import the shared helpers of the lambda layer
+LAYER_DIR = os.path.join(FUNCTIONS_DIR, "layer", "python")
+
+
+class LambdaContext:
+    """The subset of the lambda context used by the handlers"""
+
+    def __init__(self, function_name, timeout_seconds):
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout_seconds
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+class LocalLambda:
+    """A lambda handler of functions/<name> loaded in the current process.
+
+    The environment is set before the handler module is imported, so that the module level
+    boto3 clients target the emulator. Lambdas share the process environment, load them in the
+    order their environment should apply.
+    """
+
+    def __init__(self, name, environment=None, handler="app.handler", timeout_seconds=300):
+        self.name = name
+        self.timeout_seconds = timeout_seconds
+        os.environ.update(environment or {})
+
+        if LAYER_DIR not in sys.path:
+            sys.path.insert(0, LAYER_DIR)
+
+        module_name, self.handler_name = handler.rsplit(".", 1)
+        path = os.path.join(FUNCTIONS_DIR, name, f"{module_name}.py")
+        # A unique module name per lambda, the handlers of the lambdas are all named app
+        spec = importlib.util.spec_from_file_location(f"emulated_{name}_{module_name}_{uuid.uuid4().hex}", path)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+
+    def invoke(self, event=None):
+        """Calls the handler with an event, returns its response"""
+        handler = getattr(self.module, self.handler_name)
+        return handler(event or {}, LambdaContext(self.name, self.timeout_seconds))
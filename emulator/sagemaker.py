@@ -0,0 +1,381 @@
+"""Emulated SageMaker control plane and runtime"""
+import json
+import math
+import time
+import threading
+
+from emulator.errors import EmulatorError
+
+# Output of an emulated model, one token per generated word
+GENERATED_TOKEN = "token"
+
+
+class Capacity:
+    """Requests in flight and queued on an endpoint or inference component"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.waiting = 0
+
+
+class Endpoint:
+    """An emulated endpoint, its status moves on lazily when it is described or invoked"""
+
+    def __init__(self, name, config, now, delay):
+        self.name = name
+        self.creation_time = now
+        self.last_modified_time = now
+        self.status = "Creating"
+        self.transition_at = now + delay
+        self.pending_config = None
+        self.pending_instance_count = None
+        self.failure_reason = None
+        self.capacity = Capacity()
+        self._apply_config(config)
+
+    def _apply_config(self, config):
+        variant = config["ProductionVariants"][0]
+        self.config_name = config["EndpointConfigName"]
+        self.variant_name = variant["VariantName"]
+        self.instance_type = variant.get("InstanceType")
+        if "ServerlessConfig" in variant:
+            # Serverless endpoints serve MaxConcurrency requests, each on its own container
+            self.instance_count = variant["ServerlessConfig"]["MaxConcurrency"]
+        else:
+            self.instance_count = variant.get("InitialInstanceCount", 1)
+
+    def transition(self, status, now, delay, config=None, instance_count=None):
+        self.status = status
+        self.transition_at = now + delay
+        self.last_modified_time = now
+        self.pending_config = config
+        self.pending_instance_count = instance_count
+
+    def refresh(self, now):
+        """Moves the endpoint to its next status once its transition is over, returns whether it is deleted"""
+        if self.status in ["Creating", "Updating"] and now >= self.transition_at:
+            if self.pending_config is not None:
+                self._apply_config(self.pending_config)
+            if self.pending_instance_count is not None:
+                self.instance_count = self.pending_instance_count
+            self.pending_config = None
+            self.pending_instance_count = None
+            self.status = "InService"
+            self.last_modified_time = self.transition_at
+        return self.status == "Deleting" and now >= self.transition_at
+
+
+class InferenceComponent:
+    """An emulated inference component, served by copies on the instances of its endpoint"""
+
+    def __init__(self, request, now, delay):
+        self.name = request["InferenceComponentName"]
+        self.endpoint_name = request["EndpointName"]
+        self.variant_name = request["VariantName"]
+        self.specification = request["Specification"]
+        self.copy_count = request.get("RuntimeConfig", {}).get("CopyCount", 1)
+        self.creation_time = now
+        self.last_modified_time = now
+        self.status = "Creating"
+        self.transition_at = now + delay
+        self.pending_specification = None
+        self.capacity = Capacity()
+
+    def refresh(self, now):
+        if self.status in ["Creating", "Updating"] and now >= self.transition_at:
+            if self.pending_specification is not None:
+                self.specification = self.pending_specification
+                self.pending_specification = None
+            self.status = "InService"
+            self.last_modified_time = self.transition_at
+        return self.status == "Deleting" and now >= self.transition_at
+
+
+class SageMaker:
+    """SageMaker endpoint configs, endpoints and inference components, and the runtime invoking them"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.condition = threading.Condition()
+        self.endpoint_configs = {}
+        self.endpoints = {}
+        self.inference_components = {}
+        # Token bucket of the control plane rate limit
+        self._tokens = settings.control_plane_requests_per_second
+        self._tokens_updated = time.time()
+
+    def _arn(self, resource, name):
+        return f"arn:aws:sagemaker:{self.settings.region_name}:{self.settings.account_id}:{resource}/{name.lower()}"
+
+    def _throttle(self):
+        rate = self.settings.control_plane_requests_per_second
+        if rate is None:
+            return
+        now = time.time()
+        self._tokens = min(rate, self._tokens + (now - self._tokens_updated) * rate)
+        self._tokens_updated = now
+        if self._tokens < 1:
+            raise EmulatorError("ThrottlingException", "Rate exceeded")
+        self._tokens -= 1
+
+    def _refresh(self, now):
+        for name in [name for name, endpoint in self.endpoints.items() if endpoint.refresh(now)]:
+            del self.endpoints[name]
+            self.condition.notify_all()
+        for name in [name for name, component in self.inference_components.items()
+                     if component.refresh(now) or component.endpoint_name not in self.endpoints]:
+            del self.inference_components[name]
+            self.condition.notify_all()
+
+    def _endpoint(self, name):
+        if name not in self.endpoints:
+            raise EmulatorError("ValidationException", f"Could not find endpoint \"{self._arn('endpoint', name)}\".")
+        return self.endpoints[name]
+
+    def _inference_component(self, name):
+        if name not in self.inference_components:
+            raise EmulatorError("ValidationException", f"Could not find inference component \"{self._arn('inference-component', name)}\".")
+        return self.inference_components[name]
+
+    def _endpoint_config(self, name):
+        if name not in self.endpoint_configs:
+            raise EmulatorError("ValidationException", f"Could not find endpoint configuration \"{self._arn('endpoint-config', name)}\".")
+        return self.endpoint_configs[name]
+
+    def _check_quota(self, instance_type, instance_count, excluded_endpoint=None):
+        quota = self.settings.instance_quotas.get(instance_type)
+        if quota is None:
+            return
+        used = sum(endpoint.instance_count for endpoint in self.endpoints.values()
+                   if endpoint.instance_type == instance_type and endpoint.status != "Deleting" and endpoint.name != excluded_endpoint)
+        if used + instance_count > quota:
+            raise EmulatorError("ResourceLimitExceeded",
+                                f"The account-level service limit '{instance_type} for endpoint usage' is {quota} Instances, "
+                                f"with current utilization of {used} Instances and a request delta of {instance_count} Instances.")
+
+    def handle(self, operation, request):
+        method = getattr(self, operation, None)
+        if method is None:
+            raise EmulatorError("UnknownOperationException", f"Operation {operation} is not emulated")
+        with self.condition:
+            self._throttle()
+            self._refresh(time.time())
+            return method(request)
+
+    # Control plane operations, named after the SageMaker API
+
+    def CreateEndpointConfig(self, request):
+        name = request["EndpointConfigName"]
+        if name in self.endpoint_configs:
+            raise EmulatorError("ValidationException", f"Cannot create already existing endpoint configuration \"{self._arn('endpoint-config', name)}\".")
+        self.endpoint_configs[name] = dict(request, CreationTime=time.time())
+        return {"EndpointConfigArn": self._arn("endpoint-config", name)}
+
+    def DescribeEndpointConfig(self, request):
+        config = self._endpoint_config(request["EndpointConfigName"])
+        return dict(config, EndpointConfigArn=self._arn("endpoint-config", config["EndpointConfigName"]))
+
+    def DeleteEndpointConfig(self, request):
+        self._endpoint_config(request["EndpointConfigName"])
+        del self.endpoint_configs[request["EndpointConfigName"]]
+        return {}
+
+    def CreateEndpoint(self, request):
+        name = request["EndpointName"]
+        if name in self.endpoints:
+            raise EmulatorError("ValidationException", f"Cannot create already existing endpoint \"{self._arn('endpoint', name)}\".")
+        config = self._endpoint_config(request["EndpointConfigName"])
+        variant = config["ProductionVariants"][0]
+        self._check_quota(variant.get("InstanceType"), variant.get("InitialInstanceCount", 1))
+
+        now = time.time()
+        self.endpoints[name] = Endpoint(name, config, now, self.settings.scaled(self.settings.creation_delay_seconds))
+        return {"EndpointArn": self._arn("endpoint", name)}
+
+    def DescribeEndpoint(self, request):
+        endpoint = self._endpoint(request["EndpointName"])
+        response = {
+            "EndpointName": endpoint.name,
+            "EndpointArn": self._arn("endpoint", endpoint.name),
+            "EndpointConfigName": endpoint.config_name,
+            "EndpointStatus": endpoint.status,
+            "CreationTime": endpoint.creation_time,
+            "LastModifiedTime": endpoint.last_modified_time,
+            "ProductionVariants": [{
+                "VariantName": endpoint.variant_name,
+                "CurrentInstanceCount": endpoint.instance_count,
+                "DesiredInstanceCount": endpoint.pending_instance_count or endpoint.instance_count,
+                "CurrentWeight": 1.0,
+                "DesiredWeight": 1.0
+            }]
+        }
+        if endpoint.failure_reason is not None:
+            response["FailureReason"] = endpoint.failure_reason
+        return response
+
+    def ListEndpoints(self, request):
+        endpoints = sorted(self.endpoints.values(), key=lambda endpoint: endpoint.creation_time)
+        return {"Endpoints": [{
+            "EndpointName": endpoint.name,
+            "EndpointArn": self._arn("endpoint", endpoint.name),
+            "CreationTime": endpoint.creation_time,
+            "LastModifiedTime": endpoint.last_modified_time,
+            "EndpointStatus": endpoint.status
+        } for endpoint in endpoints]}
+
+    def DeleteEndpoint(self, request):
+        endpoint = self._endpoint(request["EndpointName"])
+        if endpoint.status == "Deleting":
+            raise EmulatorError("ValidationException", f"Cannot delete endpoint \"{self._arn('endpoint', endpoint.name)}\" while it is being deleted.")
+        endpoint.transition("Deleting", time.time(), self.settings.scaled(self.settings.deletion_delay_seconds))
+        return {}
+
+    def UpdateEndpoint(self, request):
+        endpoint = self._endpoint(request["EndpointName"])
+        if endpoint.status != "InService":
+            raise EmulatorError("ValidationException", f"Cannot update in-progress endpoint \"{self._arn('endpoint', endpoint.name)}\".")
+        config = self._endpoint_config(request["EndpointConfigName"])
+        variant = config["ProductionVariants"][0]
+        self._check_quota(variant.get("InstanceType"), variant.get("InitialInstanceCount", 1), excluded_endpoint=endpoint.name)
+        endpoint.transition("Updating", time.time(), self.settings.scaled(self.settings.update_delay_seconds), config=config)
+        return {"EndpointArn": self._arn("endpoint", endpoint.name)}
+
+    def UpdateEndpointWeightsAndCapacities(self, request):
+        endpoint = self._endpoint(request["EndpointName"])
+        if endpoint.status != "InService":
+            raise EmulatorError("ValidationException", f"Cannot update in-progress endpoint \"{self._arn('endpoint', endpoint.name)}\".")
+        instance_count = request["DesiredWeightsAndCapacities"][0].get("DesiredInstanceCount", endpoint.instance_count)
+        self._check_quota(endpoint.instance_type, instance_count, excluded_endpoint=endpoint.name)
+        endpoint.transition("Updating", time.time(), self.settings.scaled(self.settings.update_delay_seconds),
+                            instance_count=instance_count)
+        return {"EndpointArn": self._arn("endpoint", endpoint.name)}
+
+    def CreateInferenceComponent(self, request):
+        name = request["InferenceComponentName"]
+        if name in self.inference_components:
+            raise EmulatorError("ValidationException", f"Cannot create already existing inference component \"{self._arn('inference-component', name)}\".")
+        endpoint = self._endpoint(request["EndpointName"])
+        if endpoint.status != "InService":
+            raise EmulatorError("ValidationException", f"Endpoint \"{self._arn('endpoint', endpoint.name)}\" is not InService.")
+
+        self.inference_components[name] = InferenceComponent(request, time.time(),
+                                                             self.settings.scaled(self.settings.component_creation_delay_seconds))
+        return {"InferenceComponentArn": self._arn("inference-component", name)}
+
+    def DescribeInferenceComponent(self, request):
+        component = self._inference_component(request["InferenceComponentName"])
+        return {
+            "InferenceComponentName": component.name,
+            "InferenceComponentArn": self._arn("inference-component", component.name),
+            "EndpointName": component.endpoint_name,
+            "EndpointArn": self._arn("endpoint", component.endpoint_name),
+            "VariantName": component.variant_name,
+            "Specification": component.specification,
+            "RuntimeConfig": {"DesiredCopyCount": component.copy_count, "CurrentCopyCount": component.copy_count},
+            "InferenceComponentStatus": component.status,
+            "CreationTime": component.creation_time,
+            "LastModifiedTime": component.last_modified_time
+        }
+
+    def UpdateInferenceComponent(self, request):
+        component = self._inference_component(request["InferenceComponentName"])
+        if component.status != "InService":
+            raise EmulatorError("ValidationException", f"Cannot update in-progress inference component \"{self._arn('inference-component', component.name)}\".")
+        if "RuntimeConfig" in request:
+            component.copy_count = request["RuntimeConfig"]["CopyCount"]
+        if "Specification" in request:
+            component.pending_specification = request["Specification"]
+        component.status = "Updating"
+        component.transition_at = time.time() + self.settings.scaled(self.settings.component_creation_delay_seconds)
+        return {"InferenceComponentArn": self._arn("inference-component", component.name)}
+
+    def DeleteInferenceComponent(self, request):
+        component = self._inference_component(request["InferenceComponentName"])
+        component.status = "Deleting"
+        component.transition_at = time.time() + self.settings.scaled(self.settings.deletion_delay_seconds)
+        return {}
+
+    # Runtime
+
+    def _request_tokens(self, body):
+        """Returns the number of prompt tokens and output tokens of a request, with the payload formats of the models"""
+        try:
+            payload = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            payload = body.decode("utf-8", errors="ignore") if isinstance(body, bytes) else body
+
+        output_tokens = self.settings.default_output_tokens
+        if isinstance(payload, dict):
+            parameters = payload["parameters"] if isinstance(payload.get("parameters"), dict) else {}
+            for key in ["max_new_tokens", "max_length", "max_tokens"]:
+                value = parameters.get(key, payload.get(key))
+                if value is not None:
+                    output_tokens = int(value)
+                    break
+            prompt = payload.get("inputs", payload.get("text_inputs", payload.get("prompt", "")))
+        else:
+            prompt = payload
+
+        # Roughly 3 words for 4 tokens
+        prompt_tokens = math.ceil(len(str(prompt).split()) * 4 / 3)
+        return prompt_tokens, output_tokens
+
+    def invoke(self, endpoint_name, inference_component_name, body):
+        """Serves a request once an instance or inference component copy is free, returns the response body and timings.
+
+        Requests above the concurrency of the instances wait in a bounded queue and are throttled once it is full.
+        """
+        start = time.time()
+        with self.condition:
+            self._refresh(start)
+            if endpoint_name not in self.endpoints or self.endpoints[endpoint_name].status not in ["InService", "Updating"]:
+                raise EmulatorError("ValidationError", f"Endpoint {endpoint_name} of account {self.settings.account_id} not found.")
+            endpoint = self.endpoints[endpoint_name]
+            if inference_component_name is not None:
+                if (inference_component_name not in self.inference_components
+                        or self.inference_components[inference_component_name].status not in ["InService", "Updating"]):
+                    raise EmulatorError("ValidationError", f"Inference component {inference_component_name} of account {self.settings.account_id} not found.")
+                target = self.inference_components[inference_component_name]
+                units = target.copy_count
+            else:
+                target = endpoint
+                units = endpoint.instance_count
+
+            instance_type = endpoint.instance_type
+            capacity = target.capacity
+            concurrency = units * self.settings.profile(instance_type, "concurrency_per_instance")
+            if capacity.in_flight >= concurrency:
+                if capacity.waiting >= units * self.settings.profile(instance_type, "queue_per_instance"):
+                    raise EmulatorError("ThrottlingException", "Your request has been throttled, the endpoint is at capacity.", status=429)
+                capacity.waiting += 1
+                while capacity.in_flight >= concurrency:
+                    self.condition.wait()
+                    if endpoint_name not in self.endpoints:
+                        capacity.waiting -= 1
+                        raise EmulatorError("ValidationError", f"Endpoint {endpoint_name} of account {self.settings.account_id} not found.")
+                capacity.waiting -= 1
+            capacity.in_flight += 1
+            # Requests are spread evenly over the instances, each decodes its requests in a batch
+            batch_size = math.ceil(capacity.in_flight / units)
+
+        try:
+            prompt_tokens, output_tokens = self._request_tokens(body)
+            queue_ms = (time.time() - start) * 1000
+            time_to_first_token_ms = (self.settings.profile(instance_type, "time_to_first_token_ms")
+                                      + prompt_tokens * self.settings.profile(instance_type, "prefill_ms_per_token"))
+            tokens_per_second = (self.settings.profile(instance_type, "tokens_per_second")
+                                 / (1 + self.settings.profile(instance_type, "batching_slowdown") * (batch_size - 1)))
+            inference_ms = time_to_first_token_ms + output_tokens / tokens_per_second * 1000
+            time.sleep(self.settings.scaled(inference_ms) / 1000)
+        finally:
+            with self.condition:
+                capacity.in_flight -= 1
+                self.condition.notify_all()
+
+        body = json.dumps([{"generated_text": " ".join([GENERATED_TOKEN] * output_tokens)}]).encode("utf-8")
+        return body, {
+            "variant_name": endpoint.variant_name,
+            "queue_ms": queue_ms,
+            "time_to_first_token_ms": queue_ms + self.settings.scaled(time_to_first_token_ms),
+            "output_tokens": output_tokens
+        }
@@ -0,0 +1,153 @@
+"""HTTP service answering the boto3 clients of the lambdas in place of AWS"""
+import json
+import threading
+import collections
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from emulator.errors import EmulatorError
+from emulator.settings import EmulatorSettings
+from emulator.sagemaker import SageMaker
+from emulator.ssm import ParameterStore
+from emulator.dynamodb import DynamoDBTables
+from emulator.autoscaling import ApplicationAutoScaling
+from emulator.servicequotas import ServiceQuotas
+
+# CloudWatch clients use the smithy rpc v2 cbor or json protocol, their calls are counted and answered with an empty map
+CLOUDWATCH_TARGET_PREFIX = "GraniteServiceVersion20100801"
+CLOUDWATCH_PATH_PREFIX = "/service/GraniteServiceVersion20100801/operation/"
+EMPTY_CBOR_MAP = b"\xa0"
+
+
+class EmulatorRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches a signed boto3 request to the emulated service, by X-Amz-Target for json services and by path otherwise"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, without it delayed acks add about 40 ms to each response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        emulator = self.server.emulator
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self.path.startswith(CLOUDWATCH_PATH_PREFIX):
+            emulator.record_call(CLOUDWATCH_TARGET_PREFIX, self.path[len(CLOUDWATCH_PATH_PREFIX):])
+            self._send(200, EMPTY_CBOR_MAP, {"Content-Type": "application/cbor", "smithy-protocol": "rpc-v2-cbor"})
+            return
+
+        if self.path.startswith("/endpoints/"):
+            self._invoke_endpoint(emulator, body)
+            return
+
+        target = self.headers.get("X-Amz-Target", "")
+        prefix, _, operation = target.partition(".")
+        content_type = "application/x-amz-json-1.0" if prefix == "DynamoDB_20120810" else "application/x-amz-json-1.1"
+        try:
+            if prefix not in emulator.services and prefix != CLOUDWATCH_TARGET_PREFIX:
+                raise EmulatorError("UnknownOperationException", f"Service of {target or self.path} is not emulated")
+            emulator.record_call(prefix, operation)
+            response = emulator.services[prefix].handle(operation, json.loads(body or b"{}")) if prefix != CLOUDWATCH_TARGET_PREFIX else {}
+            self._send(200, json.dumps(response).encode("utf-8"), {"Content-Type": content_type})
+        except EmulatorError as error:
+            self._send(error.status, json.dumps({"__type": error.code, "message": error.message}).encode("utf-8"),
+                       {"Content-Type": content_type})
+
+    def _invoke_endpoint(self, emulator, body):
+        """Answers the rest-json InvokeEndpoint operation of the SageMaker runtime"""
+        path_parts = self.path.split("/")
+        try:
+            if len(path_parts) != 4 or path_parts[3] != "invocations":
+                raise EmulatorError("UnknownOperationException", f"Runtime operation {self.path} is not emulated")
+            emulator.record_call("SageMakerRuntime", "InvokeEndpoint")
+            response_body, timings = emulator.sagemaker.invoke(
+                unquote(path_parts[2]), self.headers.get("X-Amzn-SageMaker-Inference-Component"), body)
+        except EmulatorError as error:
+            self._send(error.status, json.dumps({"message": error.message}).encode("utf-8"),
+                       {"Content-Type": "application/json", "x-amzn-ErrorType": error.code})
+            return
+
+        # Timings are returned as extra headers, available in the ResponseMetadata of the boto3 response
+        self._send(200, response_body, {
+            "Content-Type": self.headers.get("Accept", "application/json"),
+            "x-Amzn-Invoked-Production-Variant": timings["variant_name"],
+            "X-Emulator-Queue-Ms": f"{timings['queue_ms']:.1f}",
+            "X-Emulator-Time-To-First-Token-Ms": f"{timings['time_to_first_token_ms']:.1f}",
+            "X-Emulator-Output-Tokens": str(timings["output_tokens"])
+        })
+
+
+class Emulator:
+    """Local emulator of the SageMaker, SageMaker runtime, SSM, DynamoDB, Application Auto Scaling and Service Quotas apis used by the lambdas.
+
+    Start it, then point the boto3 clients at it with the variables of environment(), before
+    the lambdas create their clients. CloudWatch calls are accepted and counted.
+    """
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        self.settings = settings or EmulatorSettings()
+        self.sagemaker = SageMaker(self.settings)
+        self.ssm = ParameterStore(self.settings)
+        self.dynamodb = DynamoDBTables()
+        self.autoscaling = ApplicationAutoScaling(self.settings)
+        self.service_quotas = ServiceQuotas(self.settings)
+        self.services = {
+            "SageMaker": self.sagemaker,
+            "AmazonSSM": self.ssm,
+            "DynamoDB_20120810": self.dynamodb,
+            "AnyScaleFrontendService": self.autoscaling,
+            "ServiceQuotasV20190624": self.service_quotas
+        }
+        # Number of calls per service and operation, i.e. to check how often the endpoint manager creates endpoints
+        self.calls = collections.Counter()
+        self._calls_lock = threading.Lock()
+
+        ThreadingHTTPServer.request_queue_size = 128
+        self.server = ThreadingHTTPServer((host, port), EmulatorRequestHandler)
+        self.server.daemon_threads = True
+        self.server.emulator = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_call(self, service, operation):
+        with self._calls_lock:
+            self.calls[(service, operation)] += 1
+
+    def environment(self):
+        """Environment variables pointing boto3 clients at the emulator"""
+        return {
+            "AWS_ENDPOINT_URL": self.url,
+            "AWS_ACCESS_KEY_ID": "emulator",
+            "AWS_SECRET_ACCESS_KEY": "emulator",
+            "AWS_DEFAULT_REGION": self.settings.region_name,
+            "AWS_REGION": self.settings.region_name
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
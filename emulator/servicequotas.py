@@ -0,0 +1,39 @@
+"""Emulated Service Quotas, listing the endpoint instance quotas of the emulated SageMaker"""
+from emulator.errors import EmulatorError
+
+# Quotas returned per page, small so that clients page through them
+PAGE_SIZE = 10
+
+
+class ServiceQuotas:
+    """SageMaker quotas of the account, with an endpoint usage quota per instance type of instance_quotas"""
+
+    def __init__(self, settings):
+        self.settings = settings
+
+    def handle(self, operation, request):
+        method = getattr(self, operation, None)
+        if method is None:
+            raise EmulatorError("UnknownOperationException", f"Operation {operation} is not emulated")
+        return method(request)
+
+    def ListServiceQuotas(self, request):
+        if request["ServiceCode"] != "sagemaker":
+            return {"Quotas": []}
+
+        quotas = [{
+            "ServiceCode": "sagemaker",
+            "ServiceName": "Amazon SageMaker",
+            "QuotaCode": f"L-{index:08d}",
+            "QuotaName": f"{instance_type} for endpoint usage",
+            "Value": float(quota),
+            "Unit": "None",
+            "Adjustable": True,
+            "GlobalQuota": False
+        } for index, (instance_type, quota) in enumerate(sorted(self.settings.instance_quotas.items()))]
+
+        start = int(request.get("NextToken", 0))
+        response = {"Quotas": quotas[start:start + PAGE_SIZE]}
+        if start + PAGE_SIZE < len(quotas):
+            response["NextToken"] = str(start + PAGE_SIZE)
+        return response
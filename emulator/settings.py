@@ -0,0 +1,61 @@
+"""Simulation settings of the emulator"""
+
+
+class EmulatorSettings:
+    """How the emulated SageMaker endpoints behave.
+
+    Delays and latencies are in real seconds and milliseconds, multiplied by time_scale so that
+    a load test can run faster than real time, i.e. a time_scale of 0.01 creates an endpoint with
+    a 300 seconds creation delay in 3 seconds.
+    """
+
+    def __init__(self,
+                 creation_delay_seconds=300.0,
+                 update_delay_seconds=120.0,
+                 deletion_delay_seconds=10.0,
+                 component_creation_delay_seconds=60.0,
+                 concurrency_per_instance=4,
+                 queue_per_instance=8,
+                 time_to_first_token_ms=150.0,
+                 prefill_ms_per_token=0.5,
+                 tokens_per_second=40.0,
+                 batching_slowdown=0.1,
+                 default_output_tokens=64,
+                 control_plane_requests_per_second=None,
+                 instance_quotas=None,
+                 instance_profiles=None,
+                 time_scale=1.0,
+                 region_name="us-east-1",
+                 account_id="000000000000"):
+        # Endpoint lifecycle
+        self.creation_delay_seconds = creation_delay_seconds
+        self.update_delay_seconds = update_delay_seconds
+        self.deletion_delay_seconds = deletion_delay_seconds
+        self.component_creation_delay_seconds = component_creation_delay_seconds
+        # Requests served concurrently by an instance or inference component copy, then queued, then throttled
+        self.concurrency_per_instance = concurrency_per_instance
+        self.queue_per_instance = queue_per_instance
+        # Inference latency is the time to first token plus the output tokens at the decoding rate, which
+        # drops by batching_slowdown for each other request decoded on the same instance
+        self.time_to_first_token_ms = time_to_first_token_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.tokens_per_second = tokens_per_second
+        self.batching_slowdown = batching_slowdown
+        self.default_output_tokens = default_output_tokens
+        # SageMaker control plane calls above this rate are throttled, None for no limit
+        self.control_plane_requests_per_second = control_plane_requests_per_second
+        # Maximum number of instances per instance type, creations above it fail with ResourceLimitExceeded
+        self.instance_quotas = instance_quotas or {}
+        # Request serving settings per instance type, i.e. {"ml.g5.12xlarge": {"tokens_per_second": 80}},
+        # the settings above apply to the other instance types and settings
+        self.instance_profiles = instance_profiles or {}
+        self.time_scale = time_scale
+        self.region_name = region_name
+        self.account_id = account_id
+
+    def profile(self, instance_type, name):
+        """Returns a request serving setting of an instance type"""
+        return self.instance_profiles.get(instance_type, {}).get(name, getattr(self, name))
+
+    def scaled(self, seconds):
+        return seconds * self.time_scale
@@ -0,0 +1,88 @@
+"""Emulated SSM parameter store"""
+import time
+import threading
+
+from emulator.errors import EmulatorError
+
+# Parameters returned per page of GetParametersByPath when MaxResults is not set, as in SSM
+DEFAULT_PAGE_SIZE = 10
+# Characters of the value of a standard tier parameter
+STANDARD_VALUE_LIMIT = 4096
+
+
+class ParameterStore:
+    """String parameters, paginated like SSM so that the pagination of the lambdas is exercised, with the size limit of the standard tier"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.lock = threading.Lock()
+        self.parameters = {}
+
+    def handle(self, operation, request):
+        method = getattr(self, operation, None)
+        if method is None:
+            raise EmulatorError("UnknownOperationException", f"Operation {operation} is not emulated")
+        with self.lock:
+            return method(request)
+
+    def _describe(self, parameter):
+        return dict(parameter, ARN=f"arn:aws:ssm:{self.settings.region_name}:{self.settings.account_id}:parameter{parameter['Name']}")
+
+    def PutParameter(self, request):
+        name = request["Name"]
+        existing = self.parameters.get(name)
+        if existing is not None and not request.get("Overwrite", False):
+            raise EmulatorError("ParameterAlreadyExists", "The parameter already exists. To overwrite this value, set the overwrite option in the request to true.")
+
+        # Without a tier, the default Standard tier applies, an advanced parameter cannot be moved back to it
+        tier = request.get("Tier", "Standard")
+        if tier == "Intelligent-Tiering":
+            tier = "Advanced" if len(request["Value"]) > STANDARD_VALUE_LIMIT or (existing and existing["Tier"] == "Advanced") else "Standard"
+        if tier == "Standard" and len(request["Value"]) > STANDARD_VALUE_LIMIT:
+            raise EmulatorError("ValidationException", f"Standard tier parameters support a maximum parameter value of {STANDARD_VALUE_LIMIT} characters.")
+        if tier == "Standard" and existing and existing["Tier"] == "Advanced":
+            raise EmulatorError("ValidationException", "This parameter uses the advanced-parameter tier. You can't downgrade a parameter from the advanced-parameter tier to the standard-parameter tier.")
+
+        self.parameters[name] = {
+            "Name": name,
+            "Type": request.get("Type", existing["Type"] if existing else "String"),
+            "Value": request["Value"],
+            "Version": existing["Version"] + 1 if existing else 1,
+            "LastModifiedDate": time.time(),
+            "DataType": "text",
+            "Tier": tier
+        }
+        return {"Version": self.parameters[name]["Version"], "Tier": self.parameters[name]["Tier"]}
+
+    def GetParameter(self, request):
+        if request["Name"] not in self.parameters:
+            raise EmulatorError("ParameterNotFound", f"Parameter {request['Name']} not found.")
+        parameter = dict(self.parameters[request["Name"]])
+        del parameter["Tier"]
+        return {"Parameter": self._describe(parameter)}
+
+    def GetParametersByPath(self, request):
+        path = request["Path"].rstrip("/") + "/"
+        names = sorted(name for name in self.parameters
+                       if name.startswith(path) and (request.get("Recursive", False) or "/" not in name[len(path):]))
+
+        start = int(request.get("NextToken", 0))
+        page_size = request.get("MaxResults", DEFAULT_PAGE_SIZE)
+        page = names[start:start + page_size]
+
+        parameters = []
+        for name in page:
+            parameter = dict(self.parameters[name])
+            del parameter["Tier"]
+            parameters.append(self._describe(parameter))
+
+        response = {"Parameters": parameters}
+        if start + page_size < len(names):
+            response["NextToken"] = str(start + page_size)
+        return response
+
+    def DeleteParameter(self, request):
+        if request["Name"] not in self.parameters:
+            raise EmulatorError("ParameterNotFound", f"Parameter {request['Name']} not found.")
+        del self.parameters[request["Name"]]
+        return {}
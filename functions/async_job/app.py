@@ -0,0 +1,267 @@
+import os
+import json
+import uuid
+import time
+from datetime import datetime, timedelta
+import boto3
+import botocore
+from boto3.dynamodb.conditions import Key
+
+sagemaker_runtime_client = boto3.client("sagemaker-runtime")
+s3_client = boto3.client("s3")
+ssm_client = boto3.client("ssm")
+dynamodb = boto3.resource("dynamodb")
+
+ASYNC_JOB_TABLE_NAME = os.environ["ASYNC_JOB_TABLE_NAME"]
+table = dynamodb.Table(ASYNC_JOB_TABLE_NAME)
+
+# Async endpoint name to the name of its bucket
+ASYNC_ENDPOINTS = json.loads(os.environ["ASYNC_ENDPOINTS"])
+
+# Managed async endpoint name to the minutes its expiry is extended by while jobs are queued for it
+WAKE_ENDPOINTS = json.loads(os.environ.get("WAKE_ENDPOINTS", "{}"))
+
+# Expiry parameters may be advanced parameters, overwriting one without its tier fails
+PARAMETER_TIER = "Intelligent-Tiering"
+
+INPUT_PREFIX = "async_inference_input"
+UPLOAD_PREFIX = "async_inference_uploads"
+
+# Maximum number of requests or uploads of a batch, and of job ids of a lookup
+MAX_BATCH_SIZE = 100
+UPLOAD_URL_EXPIRY_SECONDS = 900
+RESULT_URL_EXPIRY_SECONDS = 3600
+JOB_TTL_SECONDS = 7 * 24 * 3600
+
+
+def response(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Content-Type": "application/json"
+        },
+        "body": json.dumps(body)
+    }
+
+
+def new_job(endpoint_name, content_type, status):
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "endpoint_name": endpoint_name,
+        "content_type": content_type,
+        "status": status,
+        "submitted_at": datetime.utcnow().isoformat() + "Z",
+        "expires_at": int(time.time()) + JOB_TTL_SECONDS
+    }
+    table.put_item(Item=job)
+    return job
+
+
+def wake_endpoint(endpoint_name, minutes):
+    """Extends the expiry of a managed endpoint so that the endpoint manager creates it if it has expired"""
+    parameter_name = f"/sagemaker/endpoint/expiry/{endpoint_name}"
+    parameter = ssm_client.get_parameter(Name=parameter_name)
+    parameter_values = json.loads(parameter["Parameter"]["Value"])
+
+    expiry = datetime.strptime(parameter_values["expiry"], "%d-%m-%Y-%H-%M-%S")
+    wake_expiry = datetime.utcnow() + timedelta(minutes=minutes)
+    if expiry >= wake_expiry:
+        return
+
+    print(f"Extending expiry of endpoint {endpoint_name} for queued jobs")
+    parameter_values["expiry"] = wake_expiry.strftime("%d-%m-%Y-%H-%M-%S")
+    ssm_client.put_parameter(Name=parameter_name, Overwrite=True, Value=json.dumps(parameter_values), Tier=PARAMETER_TIER)
+
+
+def queue_job(job, input_location):
+    """Queues a job until its endpoint is InService, waking up the endpoint"""
+    table.update_item(
+        Key={"job_id": job["job_id"]},
+        UpdateExpression="SET #status = :status, input_location = :input",
+        ExpressionAttributeNames={"#status": "status"},
+        ExpressionAttributeValues={":status": "QUEUED", ":input": input_location}
+    )
+    try:
+        wake_endpoint(job["endpoint_name"], WAKE_ENDPOINTS[job["endpoint_name"]])
+    except botocore.exceptions.ClientError as error:
+        print(f"Error waking up endpoint {job['endpoint_name']}")
+        print(error)
+
+    return "QUEUED"
+
+
+def submit_job(job, input_location):
+    """Invokes the async endpoint with the staged input of the job"""
+    try:
+        invoke_response = sagemaker_runtime_client.invoke_endpoint_async(
+            EndpointName=job["endpoint_name"],
+            InputLocation=input_location,
+            ContentType=job["content_type"],
+            InferenceId=job["job_id"]
+        )
+    except botocore.exceptions.ClientError as error:
+        if error.response["Error"]["Code"] == "ValidationException" and job["endpoint_name"] in WAKE_ENDPOINTS:
+            # The endpoint has expired or is being created
+            return queue_job(job, input_location)
+
+        print(f"Error submitting job {job['job_id']}")
+        print(error)
+        table.update_item(
+            Key={"job_id": job["job_id"]},
+            UpdateExpression="SET #status = :status, failure_reason = :reason",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":status": "FAILED", ":reason": str(error)}
+        )
+        return "FAILED"
+
+    try:
+        table.update_item(
+            Key={"job_id": job["job_id"]},
+            UpdateExpression="SET #status = :status, input_location = :input, output_location = :output",
+            ConditionExpression="#status IN (:submitting, :awaiting_upload, :queued)",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={
+                ":status": "IN_PROGRESS",
+                ":submitting": "SUBMITTING",
+                ":awaiting_upload": "AWAITING_UPLOAD",
+                ":queued": "QUEUED",
+                ":input": input_location,
+                ":output": invoke_response["OutputLocation"]
+            }
+        )
+    except botocore.exceptions.ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # The result notification was recorded first
+        print(f"Job {job['job_id']} already completed")
+
+    return "IN_PROGRESS"
+
+
+def create_jobs(event):
+    body = json.loads(event["body"]) if event.get("body") else {}
+    endpoint_name = body.get("endpointname")
+
+    if endpoint_name not in ASYNC_ENDPOINTS:
+        return response(400, {"error": f"endpointname must be one of {list(ASYNC_ENDPOINTS)}"})
+
+    requests = body.get("requests", [])
+    uploads = body.get("uploads", 0)
+    if len(requests) + uploads == 0 or len(requests) + uploads > MAX_BATCH_SIZE:
+        return response(400, {"error": f"Between 1 and {MAX_BATCH_SIZE} requests or uploads required"})
+
+    bucket_name = ASYNC_ENDPOINTS[endpoint_name]
+    content_type = body.get("content_type", "application/json")
+    jobs = []
+
+    # Stage the request payloads and submit them straight away
+    for request in requests:
+        job = new_job(endpoint_name, content_type, "SUBMITTING")
+        key = f"{INPUT_PREFIX}/{job['job_id']}"
+        s3_client.put_object(Bucket=bucket_name, Key=key, ContentType=content_type,
+                             Body=request if isinstance(request, str) else json.dumps(request))
+        status = submit_job(job, f"s3://{bucket_name}/{key}")
+        jobs.append({"job_id": job["job_id"], "status": status})
+
+    # Jobs uploaded by the client are submitted once the upload completes
+    for _ in range(uploads):
+        job = new_job(endpoint_name, content_type, "AWAITING_UPLOAD")
+        upload_url = s3_client.generate_presigned_url("put_object",
+                                                      Params={"Bucket": bucket_name, "Key": f"{UPLOAD_PREFIX}/{job['job_id']}"},
+                                                      ExpiresIn=UPLOAD_URL_EXPIRY_SECONDS)
+        jobs.append({"job_id": job["job_id"], "status": job["status"], "upload_url": upload_url})
+
+    return response(202, {"jobs": jobs})
+
+
+def result_url(location):
+    bucket_name, key = location[len("s3://"):].split("/", 1)
+    return s3_client.generate_presigned_url("get_object",
+                                            Params={"Bucket": bucket_name, "Key": key},
+                                            ExpiresIn=RESULT_URL_EXPIRY_SECONDS)
+
+
+def format_job(item):
+    job = {attribute: item[attribute] for attribute in ["job_id", "endpoint_name", "status", "submitted_at", "completed_at", "failure_reason"]
+           if attribute in item}
+
+    if item["status"] == "COMPLETED":
+        job["result_url"] = result_url(item["output_location"])
+    elif item["status"] == "FAILED" and "failure_location" in item:
+        job["failure_url"] = result_url(item["failure_location"])
+
+    return job
+
+
+def get_jobs(event):
+    parameters = event.get("multiValueQueryStringParameters") or {}
+    job_ids = list(dict.fromkeys(job_id.strip() for value in parameters.get("ids", [])
+                                 for job_id in value.split(",") if job_id.strip()))
+
+    if len(job_ids) == 0 or len(job_ids) > MAX_BATCH_SIZE:
+        return response(400, {"error": f"Between 1 and {MAX_BATCH_SIZE} job ids required in the ids query parameter"})
+
+    keys = [{"job_id": job_id} for job_id in job_ids]
+    items = {}
+    while len(keys) > 0:
+        batch_response = dynamodb.batch_get_item(RequestItems={ASYNC_JOB_TABLE_NAME: {"Keys": keys}})
+        for item in batch_response["Responses"].get(ASYNC_JOB_TABLE_NAME, []):
+            items[item["job_id"]] = item
+        keys = batch_response.get("UnprocessedKeys", {}).get(ASYNC_JOB_TABLE_NAME, {}).get("Keys", [])
+
+    return response(200, {
+        "jobs": [format_job(items[job_id]) for job_id in job_ids if job_id in items],
+        "not_found": [job_id for job_id in job_ids if job_id not in items]
+    })
+
+
+def submit_uploads(event):
+    for record in event["Records"]:
+        bucket_name = record["s3"]["bucket"]["name"]
+        key = record["s3"]["object"]["key"]
+        job_id = key.split("/")[-1]
+
+        job = table.get_item(Key={"job_id": job_id}).get("Item")
+        if job is None or job["status"] != "AWAITING_UPLOAD":
+            print(f"Ignoring upload {key}, no job awaiting it")
+            continue
+
+        print(f"Submitting uploaded job {job_id}")
+        submit_job(job, f"s3://{bucket_name}/{key}")
+
+
+def submit_queued_jobs():
+    """Submits the jobs queued while their endpoint was not InService"""
+    query = {"IndexName": "status-index", "KeyConditionExpression": Key("status").eq("QUEUED")}
+    while True:
+        query_response = table.query(**query)
+        for job in query_response["Items"]:
+            print(f"Submitting queued job {job['job_id']}")
+            submit_job(job, job["input_location"])
+
+        if "LastEvaluatedKey" not in query_response:
+            break
+        query["ExclusiveStartKey"] = query_response["LastEvaluatedKey"]
+
+
+def handler(event, context):
+    # Scheduled submission of queued jobs
+    if event.get("source") == "aws.events":
+        return submit_queued_jobs()
+
+    # Uploads of presigned url jobs
+    if "Records" in event:
+        return submit_uploads(event)
+
+    http_method = event['httpMethod']
+
+    try:
+        if http_method == "GET":
+            return get_jobs(event)
+        elif http_method == "POST":
+            return create_jobs(event)
+        else:
+            return response(405, {"error": "Unsupported method"})
+    except botocore.exceptions.ClientError as error:
+        print(error)
+        return response(500, {"error": str(error)})
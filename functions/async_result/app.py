@@ -0,0 +1,50 @@
+import os
+import json
+import boto3
+import botocore
+
+dynamodb = boto3.resource("dynamodb")
+table = dynamodb.Table(os.environ["ASYNC_JOB_TABLE_NAME"])
+
+
+def record_result(notification):
+    """Records the result of an async inference notification on its job"""
+    job_id = notification.get("inferenceId")
+    if job_id is None:
+        print("Ignoring notification without inference id")
+        return
+
+    response_parameters = notification.get("responseParameters", {})
+    values = {":completed_at": notification.get("eventTime")}
+
+    if notification.get("invocationStatus") == "Completed":
+        values[":status"] = "COMPLETED"
+        values[":output"] = response_parameters["outputLocation"]
+        update_expression = "SET #status = :status, completed_at = :completed_at, output_location = :output"
+    else:
+        values[":status"] = "FAILED"
+        values[":reason"] = notification.get("failureReason", "Unknown")
+        update_expression = "SET #status = :status, completed_at = :completed_at, failure_reason = :reason"
+        if "failureLocation" in response_parameters:
+            values[":failure"] = response_parameters["failureLocation"]
+            update_expression += ", failure_location = :failure"
+
+    try:
+        table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression=update_expression,
+            ConditionExpression="attribute_exists(job_id)",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues=values
+        )
+        print(f"Job {job_id} {values[':status']}")
+    except botocore.exceptions.ClientError as error:
+        if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # The endpoint was invoked without the async job api
+        print(f"Ignoring notification of unknown job {job_id}")
+
+
+def handler(event, context):
+    for record in event["Records"]:
+        record_result(json.loads(record["Sns"]["Message"]))
@@ -1,17 +1,28 @@
-import os
-import boto3
+from invoke_utils.slo import invoker_from_env, SLOTimeoutError
+from invoke_utils.admission import admission_from_env
+from invoke_utils.status import status_gate_from_env
 
-# grab environment variables
-ENDPOINT_NAME = os.environ['ENDPOINT_NAME']
-client = boto3.client('runtime.sagemaker')
+# Route requests across the model's replica endpoints, falling back to a smaller model when slow
+invoker = invoker_from_env()
+# Limit in-flight requests to the model
+admission = admission_from_env()
+# Answer requests to endpoints which are not serving without invoking them
+status_gate = status_gate_from_env()
 
 def handler(event, context):
 
     payload = event['body']
 
+    unavailable = status_gate.check()
+    if unavailable is not None:
+        return unavailable
+
+    # Shed the request or spill it to the async workflow if the model is overloaded
+    if not admission.acquire():
+        return admission.overflow(payload)
+
     try:
-        response = client.invoke_endpoint(
-            EndpointName=ENDPOINT_NAME, 
+        model_name, replica, response = invoker.invoke(
             ContentType='application/json',
             Accept='application/json',
             Body=payload
@@ -19,10 +30,20 @@ def handler(event, context):
 
         result = {
             "statusCode": 200,
+            "headers": {
+                    'Content-Type': 'text/json',
+                    'X-Model-Name': model_name,
+                    'X-Endpoint-Name': replica.endpoint_name
+                        },
+            "body": response["Body"]
+        }
+    except SLOTimeoutError as e:
+        result = {
+            "statusCode": 504,
             "headers": {
                     'Content-Type': 'text/json'
                         },
-            "body": response["Body"].read()
+            "body": str(e)
         }
     except Exception as e:
         result = {
@@ -32,5 +53,7 @@ def handler(event, context):
                         },
             "body": str(e)
         }
+    finally:
+        admission.release()
 
     return result
@@ -1,10 +1,14 @@
-import os
 import json
-import boto3
+from invoke_utils.slo import invoker_from_env, SLOTimeoutError
+from invoke_utils.admission import admission_from_env
+from invoke_utils.status import status_gate_from_env
 
-# grab environment variables
-ENDPOINT_NAME = os.environ['ENDPOINT_NAME']
-runtime= boto3.client('runtime.sagemaker')
+# Route requests across the model's replica endpoints, falling back to a smaller model when slow
+invoker = invoker_from_env()
+# Limit in-flight requests to the model
+admission = admission_from_env()
+# Answer requests to endpoints which are not serving without invoking them
+status_gate = status_gate_from_env()
 
 def handler(event, context):
     payload = {'text_inputs':'write a sentence to suggest providing a custom input for the model inference', 'max_length': 50, 'temperature': 0.0, 'seed': 321}
@@ -13,22 +17,39 @@ def handler(event, context):
     else:
         body = json.dumps(payload)
 
+    unavailable = status_gate.check()
+    if unavailable is not None:
+        return unavailable
+
+    # Shed the request or spill it to the async workflow if the model is overloaded
+    if not admission.acquire():
+        return admission.overflow(body)
+
     try:
-        response = runtime.invoke_endpoint(
-            EndpointName=ENDPOINT_NAME,
+        model_name, replica, response = invoker.invoke(
             Body=body,
             ContentType='application/json',
             Accept='application/json'    )
 
-        response = response["Body"].read().decode('utf-8')
+        response = response["Body"].decode('utf-8')
 
         result = {
             "statusCode": 200,
             "headers": {
-                    'Content-Type': 'text/json'
+                    'Content-Type': 'text/json',
+                    'X-Model-Name': model_name,
+                    'X-Endpoint-Name': replica.endpoint_name
                         },
             "body": response
         }
+    except SLOTimeoutError as e:
+        result = {
+            "statusCode": 504,
+            "headers": {
+                    'Content-Type': 'text/json'
+                        },
+            "body": str(e)
+        }
     except Exception as e:
         result = {
             "statusCode": 500,
@@ -37,5 +58,7 @@ def handler(event, context):
                         },
             "body": str(e)
         }
+    finally:
+        admission.release()
         
     return result
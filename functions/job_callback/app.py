@@ -0,0 +1,121 @@
+import os
+import json
+import socket
+import ipaddress
+import http.client
+import urllib.parse
+from datetime import datetime
+import boto3
+import botocore
+from boto3.dynamodb.types import TypeDeserializer
+
+from invoke_utils.jobs import format_job
+
+s3_client = boto3.client("s3")
+job_table = boto3.resource("dynamodb").Table(os.environ["JOB_TABLE_NAME"]) if "JOB_TABLE_NAME" in os.environ else None
+deserializer = TypeDeserializer()
+
+CALLBACK_TIMEOUT_SECONDS = 10
+# Hosts callbacks may be sent to, any public host if empty
+CALLBACK_ALLOWED_HOSTS = json.loads(os.environ.get("CALLBACK_ALLOWED_HOSTS", "[]"))
+
+
+class CallbackRejected(ValueError):
+    """The callback url may not be called"""
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection to an address resolved beforehand, with the host name kept for SNI, certificate checks and the Host header.
+
+    Resolving the host name again when connecting would let a host whose DNS answer changes in between
+    (DNS rebinding) pass the address check, then be connected to on an internal address.
+    """
+
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+def check_callback_url(callback_url):
+    """Returns the address to send the callback to, raises CallbackRejected unless the url is an https url of an allowed host resolving to public addresses only.
+
+    Callback urls are supplied by clients, private, loopback, link-local and instance metadata addresses are
+    rejected so that callbacks cannot be used to reach the network of the stack.
+    """
+    url = urllib.parse.urlsplit(callback_url)
+    if url.scheme != "https" or not url.hostname:
+        raise CallbackRejected(f"Callback url {callback_url} must be an https url")
+    if len(CALLBACK_ALLOWED_HOSTS) > 0 and url.hostname not in CALLBACK_ALLOWED_HOSTS:
+        raise CallbackRejected(f"Callback host {url.hostname} is not allowed")
+
+    try:
+        addresses = socket.getaddrinfo(url.hostname, url.port or 443, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as error:
+        raise CallbackRejected(f"Callback host {url.hostname} cannot be resolved: {error}")
+    for _, _, _, _, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global:
+            raise CallbackRejected(f"Callback host {url.hostname} resolves to the non public address {address}")
+
+    return addresses[0][4][0]
+
+
+def send_callback(job, callback_url):
+    """Posts the job to the callback url on the checked address, redirects are not followed"""
+    address = check_callback_url(callback_url)
+    url = urllib.parse.urlsplit(callback_url)
+
+    connection = PinnedHTTPSConnection(url.hostname, address, port=url.port or 443, timeout=CALLBACK_TIMEOUT_SECONDS)
+    try:
+        connection.request("POST", (url.path or "/") + (f"?{url.query}" if url.query else ""),
+                           body=json.dumps(job).encode("utf-8"),
+                           headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status >= 300:
+            raise http.client.HTTPException(f"Callback answered with status {response.status}")
+        return response.status
+    finally:
+        connection.close()
+
+
+def record_callback(job_id, status, error=None):
+    """Records the delivery of the callback of a job, returned by the jobs api so that clients know to poll"""
+    if job_table is None:
+        return
+
+    update_expression = "SET callback_status = :status, callback_time = :now"
+    values = {":status": status, ":now": datetime.utcnow().isoformat()}
+    if error is not None:
+        update_expression += ", callback_error = :error"
+        values[":error"] = str(error)[:1024]
+
+    try:
+        job_table.update_item(Key={"job_id": job_id}, UpdateExpression=update_expression, ExpressionAttributeValues=values)
+    except botocore.exceptions.ClientError as error:
+        print(f"Error recording callback of job {job_id}")
+        print(error)
+
+
+def handler(event, context):
+    # Records are filtered to jobs with a callback url that have completed and whose callback was not sent yet
+    for record in event["Records"]:
+        item = {key: deserializer.deserialize(value) for key, value in record["dynamodb"]["NewImage"].items()}
+        job = format_job(item, s3_client)
+
+        # Callbacks are best effort, clients can still look up the job
+        try:
+            status = send_callback(job, item["callback_url"])
+            print(f"Sent callback of job {item['job_id']}, status {status}")
+            record_callback(item["job_id"], "SENT")
+        except CallbackRejected as error:
+            print(f"Rejected callback of job {item['job_id']}")
+            print(error)
+            record_callback(item["job_id"], "REJECTED", error)
+        except Exception as error:
+            print(f"Error sending callback of job {item['job_id']}")
+            print(error)
+            record_callback(item["job_id"], "FAILED", error)
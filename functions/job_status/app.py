@@ -0,0 +1,84 @@
+import os
+import json
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+import botocore
+
+from invoke_utils.jobs import format_job
+
+dynamodb_client = boto3.client("dynamodb")
+s3_client = boto3.client("s3")
+deserializer = TypeDeserializer()
+
+JOB_TABLE_NAME = os.environ["JOB_TABLE_NAME"]
+
+# Maximum number of keys of a dynamodb batch get
+MAX_JOB_IDS = 100
+
+
+def get_job_ids(event):
+    """Returns the job ids of the ids query parameter, a comma separated list of execution names or arns"""
+    parameters = event.get("multiValueQueryStringParameters") or {}
+    job_ids = []
+    for value in parameters.get("ids", []) + parameters.get("id", []):
+        for job_id in value.split(","):
+            job_id = job_id.strip()
+            if job_id:
+                # Execution arns end with the execution name
+                job_ids.append(job_id.split(":")[-1])
+
+    return list(dict.fromkeys(job_ids))
+
+
+def get_jobs(job_ids):
+    keys = [{"job_id": {"S": job_id}} for job_id in job_ids]
+    items = []
+    while len(keys) > 0:
+        response = dynamodb_client.batch_get_item(RequestItems={JOB_TABLE_NAME: {"Keys": keys}})
+        items.extend(response["Responses"].get(JOB_TABLE_NAME, []))
+        keys = response.get("UnprocessedKeys", {}).get(JOB_TABLE_NAME, {}).get("Keys", [])
+
+    jobs = {}
+    for item in items:
+        item = {key: deserializer.deserialize(value) for key, value in item.items()}
+        jobs[item["job_id"]] = format_job(item, s3_client)
+
+    return jobs
+
+
+def handler(event, context):
+    job_ids = get_job_ids(event)
+
+    if len(job_ids) == 0 or len(job_ids) > MAX_JOB_IDS:
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Content-Type": "application/json"
+            },
+            "body": json.dumps({"error": f"Between 1 and {MAX_JOB_IDS} job ids required in the ids query parameter"})
+        }
+
+    try:
+        jobs = get_jobs(job_ids)
+    except botocore.exceptions.ClientError as error:
+        print("Error getting jobs")
+        print(error)
+        return {
+            "statusCode": 500,
+            "headers": {
+                "Content-Type": "application/json"
+            },
+            "body": json.dumps({"error": str(error)})
+        }
+
+    # Jobs are returned in the requested order, unknown job ids are listed separately
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json"
+        },
+        "body": json.dumps({
+            "jobs": [jobs[job_id] for job_id in job_ids if job_id in jobs],
+            "not_found": [job_id for job_id in job_ids if job_id not in jobs]
+        })
+    }
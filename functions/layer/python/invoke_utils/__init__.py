@@ -0,0 +1 @@
+"""Shared helpers for the model invoke lambdas (packaged as a lambda layer)"""
@@ -0,0 +1,193 @@
+"""Admission control for model invocations, spilling overload to the async execution path"""
+import os
+import json
+import time
+import uuid
+import boto3
+import botocore
+
+from invoke_utils.router import replicas_from_env
+
+# Leases of requests admitted this long ago are treated as leaked (i.e. lambda timeout)
+STALE_SECONDS = int(os.environ.get("ADMISSION_STALE_SECONDS", "300"))
+
+
+def lease_time(lease):
+    """Returns when the request holding a lease was admitted"""
+    return int(lease.split(":", 1)[0])
+
+
+class AdmissionController:
+    """Tracks in-flight requests of a model against a concurrency limit.
+
+    Each admitted request holds a lease in the admitted set of the model in the router
+    state table, which is shared between lambda containers. With a limit per instance,
+    the limit follows the instances currently serving the model, as described by its
+    replicas, and never drops below the limit at minimum capacity. Leases older than
+    STALE_SECONDS are reclaimed when the model is at its limit. Requests over the
+    limit are either rejected with a 429 or started as a step function execution
+    through the async invoke workflow.
+    """
+
+    def __init__(self, endpoint_name, table_name=None, limit=None, state_machine_arn=None, limit_per_instance=None, replicas=None):
+        self.endpoint_name = endpoint_name
+        self.limit = limit
+        self.limit_per_instance = limit_per_instance
+        self.replicas = replicas or []
+        self.state_machine_arn = state_machine_arn
+        self.table = boto3.resource("dynamodb").Table(table_name) if table_name and limit else None
+        self.sfn_client = boto3.client("stepfunctions") if state_machine_arn else None
+        # Lease of the request being served by the lambda container
+        self.lease = None
+
+    def current_limit(self):
+        """Returns the concurrency limit at the current instance count, the configured limit if it is unknown"""
+        if self.limit_per_instance is None:
+            return self.limit
+
+        instance_counts = [replica.current_instance_count() for replica in self.replicas]
+        instance_counts = [count for count in instance_counts if count is not None]
+        if len(instance_counts) == 0:
+            return self.limit
+        return max(self.limit, self.limit_per_instance * sum(instance_counts))
+
+    def _add_lease(self, lease, limit):
+        """Returns whether the lease was added under the limit, fails open on errors"""
+        try:
+            self.table.update_item(
+                Key={"endpoint_name": self.endpoint_name},
+                UpdateExpression="ADD admitted :lease",
+                ConditionExpression="attribute_not_exists(admitted) OR size(admitted) < :limit",
+                ExpressionAttributeValues={":lease": {lease}, ":limit": limit}
+            )
+            return True
+        except botocore.exceptions.ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            # Fail open, the endpoint will throttle if it is overloaded
+            print("Error updating admission leases")
+            print(error)
+            return True
+
+    def _reclaim_stale_leases(self, now):
+        """Removes the leases which were never released, returns whether any was removed"""
+        try:
+            item = self.table.get_item(Key={"endpoint_name": self.endpoint_name}).get("Item", {})
+            stale_leases = {lease for lease in item.get("admitted", set()) if lease_time(lease) < now - STALE_SECONDS}
+            if len(stale_leases) == 0:
+                return False
+
+            self.table.update_item(
+                Key={"endpoint_name": self.endpoint_name},
+                UpdateExpression="DELETE admitted :stale_leases",
+                ExpressionAttributeValues={":stale_leases": stale_leases}
+            )
+            print(f"Reclaimed {len(stale_leases)} stale admission leases")
+            return True
+        except botocore.exceptions.ClientError as error:
+            print("Error reclaiming admission leases")
+            print(error)
+            return False
+
+    def acquire(self):
+        """Returns whether the request is admitted"""
+        if self.table is None:
+            return True
+
+        now = int(time.time())
+        lease = f"{now}:{uuid.uuid4().hex}"
+        limit = self.current_limit()
+        admitted = self._add_lease(lease, limit)
+        if not admitted and self._reclaim_stale_leases(now):
+            admitted = self._add_lease(lease, limit)
+
+        self.lease = lease if admitted else None
+        return admitted
+
+    def release(self):
+        if self.table is None or self.lease is None:
+            return
+
+        try:
+            self.table.update_item(
+                Key={"endpoint_name": self.endpoint_name},
+                UpdateExpression="DELETE admitted :lease",
+                ExpressionAttributeValues={":lease": {self.lease}}
+            )
+        except botocore.exceptions.ClientError as error:
+            print("Error updating admission leases")
+            print(error)
+        self.lease = None
+
+    def bad_request(self, message):
+        return {
+            "statusCode": 400,
+            "headers": {
+                "Content-Type": "application/json"
+            },
+            "body": json.dumps({"error": message})
+        }
+
+    def reject(self):
+        return {
+            "statusCode": 429,
+            "headers": {
+                "Content-Type": "application/json",
+                "Retry-After": "1"
+            },
+            "body": json.dumps({"error": f"Endpoint {self.endpoint_name} is at its concurrency limit"})
+        }
+
+    def overflow(self, body):
+        """Returns the lambda response for a request that was not admitted"""
+        if self.sfn_client is None:
+            return self.reject()
+
+        try:
+            payload = json.loads(body)
+        except (TypeError, ValueError):
+            return self.bad_request("Request body must be a JSON document")
+
+        # Complete the request through the async invoke workflow
+        try:
+            response = self.sfn_client.start_execution(
+                stateMachineArn=self.state_machine_arn,
+                input=json.dumps({
+                    "endpointname": self.endpoint_name,
+                    "body": payload
+                })
+            )
+        except botocore.exceptions.ClientError as error:
+            print("Error starting overflow execution")
+            print(error)
+            return self.reject()
+
+        return {
+            "statusCode": 202,
+            "headers": {
+                "Content-Type": "application/json"
+            },
+            "body": json.dumps({
+                "executionArn": response["executionArn"]
+            })
+        }
+
+
+def admission_from_env():
+    """Creates an admission controller from the lambda environment.
+
+    Requests are only limited if ADMISSION_LIMIT, the limit at minimum capacity, is set. With
+    ADMISSION_LIMIT_PER_INSTANCE, the limit is raised with the instances currently serving the
+    model. Over the limit, requests are started on OVERFLOW_STATE_MACHINE_ARN if it is set,
+    otherwise rejected.
+    """
+    limit = os.environ.get("ADMISSION_LIMIT")
+    limit_per_instance = os.environ.get("ADMISSION_LIMIT_PER_INSTANCE")
+
+    # Models packed on a shared endpoint are limited per inference component
+    return AdmissionController(os.environ.get("INFERENCE_COMPONENT_NAME", os.environ["ENDPOINT_NAME"]),
+                               table_name=os.environ.get("ROUTER_TABLE_NAME"),
+                               limit=int(limit) if limit else None,
+                               state_machine_arn=os.environ.get("OVERFLOW_STATE_MACHINE_ARN"),
+                               limit_per_instance=int(limit_per_instance) if limit and limit_per_instance else None,
+                               replicas=replicas_from_env() if limit and limit_per_instance else None)
@@ -0,0 +1,28 @@
+"""Formatting of the async job index items written by the invoke workflow"""
+import os
+
+# Presigned result urls are valid for this long
+RESULT_URL_EXPIRY_SECONDS = int(os.environ.get("RESULT_URL_EXPIRY_SECONDS", "3600"))
+
+# Attributes returned to clients as is
+JOB_ATTRIBUTES = ["job_id", "execution_arn", "endpoint_name", "status", "started_at", "completed_at", "error",
+                  "callback_status", "callback_error"]
+
+
+def format_job(item, s3_client):
+    """Returns the client view of a job item, with a presigned url to its result"""
+    job = {attribute: item[attribute] for attribute in JOB_ATTRIBUTES if attribute in item}
+
+    if "error_cause" in item:
+        job["cause"] = item["error_cause"]
+
+    if "result_key" in item:
+        job["result"] = {
+            "bucket": item["result_bucket"],
+            "key": item["result_key"],
+            "url": s3_client.generate_presigned_url("get_object",
+                                                    Params={"Bucket": item["result_bucket"], "Key": item["result_key"]},
+                                                    ExpiresIn=RESULT_URL_EXPIRY_SECONDS)
+        }
+
+    return job
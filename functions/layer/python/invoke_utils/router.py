@@ -0,0 +1,286 @@
+"""Least outstanding requests router across replica endpoints"""
+import os
+import json
+import time
+import boto3
+import botocore
+
+# How long an endpoint status lookup is cached for in a lambda container
+HEALTH_TTL_SECONDS = int(os.environ.get("ROUTER_HEALTH_TTL_SECONDS", "30"))
+# How long a replica is ejected for after a failed invocation
+EJECT_SECONDS = int(os.environ.get("ROUTER_EJECT_SECONDS", "30"))
+# In-flight counters not updated for this long are treated as leaked (i.e. lambda timeout)
+STALE_SECONDS = int(os.environ.get("ROUTER_STALE_SECONDS", "300"))
+# Weight of the latest sample in the latency moving average
+LATENCY_DECAY = 0.2
+# Assumed role credentials are refreshed before they expire
+CREDENTIALS_TTL_SECONDS = 50 * 60
+
+# Availability errors for which the replica is ejected and the request retried on the next replica.
+# Errors caused by the request itself, i.e. ValidationException or ModelError, are raised to the caller.
+FAILOVER_ERROR_CODES = [
+    "ServiceUnavailable",
+    "ThrottlingException",
+    "InternalFailure",
+    "InternalDependencyException",
+    "ModelNotReadyException",
+]
+
+
+class NoHealthyReplicaError(RuntimeError):
+    """Raised when none of the replica endpoints is InService"""
+
+
+class Replica:
+    """A single endpoint serving a model, possibly in another region or account.
+
+    Models packed on a shared endpoint are served by an inference component of the endpoint.
+    """
+
+    def __init__(self, endpoint_name, region_name=None, role_arn=None, inference_component_name=None):
+        self.endpoint_name = endpoint_name
+        self.region_name = region_name
+        self.role_arn = role_arn
+        self.inference_component_name = inference_component_name
+
+        self.status = None
+        # Instances of the endpoint, or copies of the inference component, serving the model when last described
+        self.instance_count = None
+        self.status_checked = 0
+        self.ejected_until = 0
+        self.latency_ms = None
+
+        self._session = None
+        self._session_created = 0
+        self._runtime_client = None
+        self._sagemaker_client = None
+
+    def _get_session(self):
+        if self.role_arn is None:
+            if self._session is None:
+                self._session = boto3.session.Session(region_name=self.region_name)
+            return self._session
+
+        # Assume the replica role for cross account endpoints
+        if self._session is None or time.time() - self._session_created > CREDENTIALS_TTL_SECONDS:
+            credentials = boto3.client("sts").assume_role(
+                RoleArn=self.role_arn,
+                RoleSessionName="sagemaker-endpoint-router"
+            )["Credentials"]
+
+            self._session = boto3.session.Session(
+                aws_access_key_id=credentials["AccessKeyId"],
+                aws_secret_access_key=credentials["SecretAccessKey"],
+                aws_session_token=credentials["SessionToken"],
+                region_name=self.region_name
+            )
+            self._session_created = time.time()
+            self._runtime_client = None
+            self._sagemaker_client = None
+
+        return self._session
+
+    @property
+    def runtime_client(self):
+        session = self._get_session()
+        if self._runtime_client is None:
+            self._runtime_client = session.client("runtime.sagemaker")
+        return self._runtime_client
+
+    @property
+    def sagemaker_client(self):
+        session = self._get_session()
+        if self._sagemaker_client is None:
+            self._sagemaker_client = session.client("sagemaker")
+        return self._sagemaker_client
+
+    def _refresh(self):
+        """Describes the replica again once its cached status is older than HEALTH_TTL_SECONDS"""
+        now = time.time()
+        if now - self.status_checked <= HEALTH_TTL_SECONDS:
+            return
+
+        try:
+            if self.inference_component_name is not None:
+                describe_response = self.sagemaker_client.describe_inference_component(
+                    InferenceComponentName=self.inference_component_name)
+                self.status = describe_response["InferenceComponentStatus"]
+                self.instance_count = describe_response.get("RuntimeConfig", {}).get("CurrentCopyCount")
+            else:
+                describe_response = self.sagemaker_client.describe_endpoint(EndpointName=self.endpoint_name)
+                self.status = describe_response["EndpointStatus"]
+                self.instance_count = sum(variant.get("CurrentInstanceCount", 0)
+                                          for variant in describe_response.get("ProductionVariants", []))
+        except botocore.exceptions.ClientError as error:
+            print(f"Error describing endpoint {self.endpoint_name}")
+            print(error)
+            # Endpoint does not exist (i.e. expired) or cannot be described
+            self.status = None
+            self.instance_count = None
+        self.status_checked = now
+
+    def is_healthy(self):
+        """Returns whether the replica is InService and not ejected"""
+        if time.time() < self.ejected_until:
+            return False
+
+        self._refresh()
+        return self.status == "InService"
+
+    def current_instance_count(self):
+        """Returns the number of instances, or copies, currently serving the model, None if it cannot be described"""
+        self._refresh()
+        return self.instance_count
+
+    def invoke(self, **kwargs):
+        if self.inference_component_name is not None:
+            kwargs["InferenceComponentName"] = self.inference_component_name
+        return self.runtime_client.invoke_endpoint(EndpointName=self.endpoint_name, **kwargs)
+
+    def eject(self):
+        print(f"Ejecting replica {self.endpoint_name} for {EJECT_SECONDS} seconds")
+        self.ejected_until = time.time() + EJECT_SECONDS
+        self.status_checked = 0
+
+    def record_latency(self, latency_ms):
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms = (1 - LATENCY_DECAY) * self.latency_ms + LATENCY_DECAY * latency_ms
+
+
+class EndpointRouter:
+    """Routes each request to the healthy replica with the least outstanding requests.
+
+    In-flight requests and latency are shared between lambda containers through a
+    dynamodb table keyed on endpoint name. Without a table, only the state of the
+    current container is used.
+    """
+
+    def __init__(self, replicas, table_name=None, check_health=None):
+        self.replicas = replicas
+        self.table = boto3.resource("dynamodb").Table(table_name) if table_name else None
+        # A single replica is invoked without checking its status unless requested
+        self.check_health = len(replicas) > 1 if check_health is None else check_health
+
+    def _load_state(self):
+        """Returns the shared in-flight counters and refreshes replica latencies"""
+        in_flight = {replica.endpoint_name: 0 for replica in self.replicas}
+        if self.table is None:
+            return in_flight
+
+        try:
+            response = self.table.meta.client.batch_get_item(
+                RequestItems={
+                    self.table.name: {
+                        "Keys": [{"endpoint_name": replica.endpoint_name} for replica in self.replicas]
+                    }
+                }
+            )
+        except botocore.exceptions.ClientError as error:
+            print("Error loading router state")
+            print(error)
+            return in_flight
+
+        now = time.time()
+        items = {item["endpoint_name"]: item for item in response["Responses"].get(self.table.name, [])}
+        for replica in self.replicas:
+            item = items.get(replica.endpoint_name)
+            if item is None:
+                continue
+            if now - float(item.get("updated_at", 0)) < STALE_SECONDS:
+                in_flight[replica.endpoint_name] = max(int(item.get("in_flight", 0)), 0)
+            if "latency_ms" in item:
+                replica.latency_ms = float(item["latency_ms"])
+
+        return in_flight
+
+    def _update_state(self, replica, delta, latency_ms=None):
+        if self.table is None:
+            return
+
+        update_expression = "ADD in_flight :delta SET updated_at = :now"
+        expression_values = {":delta": delta, ":now": int(time.time())}
+        if latency_ms is not None:
+            update_expression += ", latency_ms = :latency"
+            expression_values[":latency"] = int(replica.latency_ms)
+
+        try:
+            self.table.update_item(
+                Key={"endpoint_name": replica.endpoint_name},
+                UpdateExpression=update_expression,
+                ExpressionAttributeValues=expression_values
+            )
+        except botocore.exceptions.ClientError as error:
+            print("Error updating router state")
+            print(error)
+
+    def candidates(self):
+        """Returns the healthy replicas ordered by outstanding requests then latency"""
+        if not self.check_health:
+            return list(self.replicas)
+
+        in_flight = self._load_state()
+        healthy = [replica for replica in self.replicas if replica.is_healthy()]
+
+        return sorted(healthy, key=lambda replica: (
+            in_flight[replica.endpoint_name],
+            replica.latency_ms if replica.latency_ms is not None else 0
+        ))
+
+    def invoke(self, **kwargs):
+        """Invokes the least loaded healthy replica, failing over to the next one on error.
+
+        Returns the replica that served the request and the invoke_endpoint response.
+        """
+        candidates = self.candidates()
+        if len(candidates) == 0:
+            raise NoHealthyReplicaError("No healthy replica endpoint available")
+
+        last_error = None
+        for replica in candidates:
+            self._update_state(replica, 1)
+            start = time.time()
+            latency_ms = None
+            try:
+                response = replica.invoke(**kwargs)
+                # Read the body while the request is counted as in-flight
+                response["Body"] = response["Body"].read()
+                replica.record_latency((time.time() - start) * 1000)
+                latency_ms = replica.latency_ms
+                return replica, response
+            except botocore.exceptions.ClientError as error:
+                if error.response["Error"]["Code"] not in FAILOVER_ERROR_CODES:
+                    raise
+                replica.eject()
+                last_error = error
+            finally:
+                # Also released when reading the body fails, i.e. on a read timeout
+                self._update_state(replica, -1, latency_ms=latency_ms)
+
+        raise last_error
+
+
+def replicas_from_env():
+    """Returns the replicas of the model in the lambda environment, see router_from_env"""
+    if "ENDPOINT_REPLICAS" in os.environ:
+        return [Replica(replica["endpoint_name"],
+                        region_name=replica.get("region_name"),
+                        role_arn=replica.get("role_arn"))
+                for replica in json.loads(os.environ["ENDPOINT_REPLICAS"])]
+
+    return [Replica(os.environ["ENDPOINT_NAME"],
+                    inference_component_name=os.environ.get("INFERENCE_COMPONENT_NAME"))]
+
+
+def router_from_env(check_health=None):
+    """Creates a router from the lambda environment.
+
+    ENDPOINT_REPLICAS is a json list of replicas, each with an endpoint_name and an
+    optional region_name and role_arn. If it is not set, the router only targets
+    ENDPOINT_NAME, or its INFERENCE_COMPONENT_NAME component when the model is packed
+    on a shared endpoint.
+    """
+    return EndpointRouter(replicas_from_env(),
+                          table_name=os.environ.get("ROUTER_TABLE_NAME"),
+                          check_health=check_health)
@@ -0,0 +1,151 @@
+"""Latency SLO enforcement with hedged requests to a fallback model"""
+import os
+import json
+import time
+from concurrent import futures
+
+import botocore
+
+from invoke_utils.router import EndpointRouter, Replica, NoHealthyReplicaError, FAILOVER_ERROR_CODES, router_from_env
+
+# Shared by all invocations of a lambda container, futures that miss their deadline keep running
+executor = futures.ThreadPoolExecutor(max_workers=4)
+
+
+class SLOTimeoutError(Exception):
+    """Raised when neither the model nor its fallback answered within the SLO timeout"""
+
+
+def map_request(body, request_mapping):
+    """Maps a json request body to the fallback model's format.
+
+    request_mapping maps a dotted source path to a dotted target path, for example
+    {"inputs": "text_inputs", "parameters.max_new_tokens": "max_length"}. Only
+    mapped fields are sent to the fallback model.
+    """
+    if request_mapping is None:
+        return body
+
+    payload = json.loads(body)
+    mapped = {}
+    for source, target in request_mapping.items():
+        value = payload
+        for key in source.split("."):
+            if not isinstance(value, dict) or key not in value:
+                value = None
+                break
+            value = value[key]
+        if value is None:
+            continue
+
+        target_keys = target.split(".")
+        destination = mapped
+        for key in target_keys[:-1]:
+            destination = destination.setdefault(key, {})
+        destination[target_keys[-1]] = value
+
+    return json.dumps(mapped)
+
+
+def is_availability_error(error):
+    """Returns whether an invocation failed because of the model rather than the request.
+
+    The caller's own errors, i.e. a ValidationException or a 4xx ModelError of a malformed
+    payload, are not answered by the fallback model.
+    """
+    if isinstance(error, (NoHealthyReplicaError, botocore.exceptions.ConnectionError, botocore.exceptions.ReadTimeoutError)):
+        return True
+    if isinstance(error, botocore.exceptions.ClientError):
+        code = error.response["Error"]["Code"]
+        if code == "ModelError":
+            return error.response.get("OriginalStatusCode", 500) >= 500
+        return code in FAILOVER_ERROR_CODES
+    return False
+
+
+class SLOInvoker:
+    """Invokes a model within a latency deadline, answering from a fallback model when it is missed.
+
+    The fallback is used straight away when the model has no InService endpoint or is unavailable.
+    Once the deadline passes, the fallback is invoked and, when hedging, the first of the
+    two to answer is returned, otherwise only the fallback answer is waited for.
+    """
+
+    def __init__(self, model_name, router, fallback_model_name=None, fallback_router=None,
+                 deadline_seconds=None, timeout_seconds=None, hedge=True, request_mapping=None):
+        self.model_name = model_name
+        self.router = router
+        self.fallback_model_name = fallback_model_name
+        self.fallback_router = fallback_router
+        self.deadline_seconds = deadline_seconds
+        self.timeout_seconds = timeout_seconds
+        self.hedge = hedge
+        self.request_mapping = request_mapping
+
+    def _invoke_fallback(self, Body, **kwargs):
+        replica, response = self.fallback_router.invoke(Body=map_request(Body, self.request_mapping), **kwargs)
+        return self.fallback_model_name, replica, response
+
+    def _invoke_primary(self, **kwargs):
+        replica, response = self.router.invoke(**kwargs)
+        return self.model_name, replica, response
+
+    def invoke(self, **kwargs):
+        """Returns the name of the model that answered, the replica and the invoke_endpoint response"""
+        if self.fallback_router is None:
+            return self._invoke_primary(**kwargs)
+
+        primary = executor.submit(self._invoke_primary, **kwargs)
+        try:
+            return primary.result(timeout=self.deadline_seconds)
+        except futures.TimeoutError:
+            print(f"Model {self.model_name} missed its {self.deadline_seconds}s deadline, using fallback model {self.fallback_model_name}")
+        except Exception as error:
+            if not is_availability_error(error):
+                raise
+            print(f"Model {self.model_name} is unavailable, using fallback model {self.fallback_model_name}")
+            print(error)
+            return self._invoke_fallback(**kwargs)
+
+        fallback = executor.submit(self._invoke_fallback, **kwargs)
+        pending = [primary, fallback] if self.hedge else [fallback]
+        end = None if self.timeout_seconds is None else time.monotonic() + self.timeout_seconds - self.deadline_seconds
+
+        # Return the first successful answer
+        while len(pending) > 0:
+            remaining = None if end is None else max(end - time.monotonic(), 0)
+            done, _ = futures.wait(pending, timeout=remaining, return_when=futures.FIRST_COMPLETED)
+            if len(done) == 0:
+                break
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    return future.result()
+                if len(pending) == 0:
+                    raise future.exception()
+
+        raise SLOTimeoutError(f"No answer from {self.model_name} or {self.fallback_model_name} within {self.timeout_seconds}s")
+
+
+def invoker_from_env():
+    """Creates an invoker from the lambda environment.
+
+    If FALLBACK_ENDPOINT_NAME is set, requests that miss SLO_DEADLINE_SECONDS are
+    answered by the fallback model.
+    """
+    model_name = os.environ.get("MODEL_NAME", os.environ["ENDPOINT_NAME"])
+
+    if "FALLBACK_ENDPOINT_NAME" not in os.environ:
+        return SLOInvoker(model_name, router_from_env())
+
+    timeout_seconds = os.environ.get("SLO_TIMEOUT_SECONDS")
+    request_mapping = os.environ.get("FALLBACK_REQUEST_MAPPING")
+
+    return SLOInvoker(model_name, router_from_env(check_health=True),
+                      fallback_model_name=os.environ.get("FALLBACK_MODEL_NAME", os.environ["FALLBACK_ENDPOINT_NAME"]),
+                      fallback_router=EndpointRouter([Replica(os.environ["FALLBACK_ENDPOINT_NAME"],
+                                                              inference_component_name=os.environ.get("FALLBACK_INFERENCE_COMPONENT_NAME"))]),
+                      deadline_seconds=float(os.environ["SLO_DEADLINE_SECONDS"]),
+                      timeout_seconds=float(timeout_seconds) if timeout_seconds else None,
+                      hedge=os.environ.get("SLO_HEDGE", "true") == "true",
+                      request_mapping=json.loads(request_mapping) if request_mapping else None)
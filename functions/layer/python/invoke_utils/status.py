@@ -0,0 +1,123 @@
+"""Fast-fail of requests to endpoints which are not serving, from the statuses published by the endpoint manager"""
+import os
+import json
+import time
+from datetime import datetime
+import boto3
+import botocore
+
+# How long the endpoint statuses are cached for in a lambda container
+STATUS_TTL_SECONDS = int(os.environ.get("ENDPOINT_STATUS_TTL_SECONDS", "10"))
+# Retry-After of endpoints without an estimate of when they serve, the endpoint manager runs every minute
+DEFAULT_RETRY_AFTER_SECONDS = 60
+# Retry-After of endpoints taking longer than expected to be created
+MIN_RETRY_AFTER_SECONDS = 10
+# Expected creation time of endpoints whose creation was never timed
+DEFAULT_CREATION_SECONDS = 600
+
+# Statuses of endpoints which cannot serve requests, Updating endpoints keep serving while they are updated
+UNAVAILABLE_STATUSES = ["Creating", "Queued", "Deleting", "Stopped", "Failed", "OutOfService"]
+
+
+def retry_after_seconds(item):
+    """Returns when to retry a request to an endpoint which is not serving, None if it does not start until its expiry is extended"""
+    status = item["endpoint_status"]
+    if status == "Stopped":
+        return None
+    if status != "Creating":
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+    # A new endpoint is expected to be InService after as long as its last creation took
+    expected_seconds = float(item.get("seconds_to_in_service", DEFAULT_CREATION_SECONDS))
+    elapsed_seconds = (datetime.utcnow() - datetime.fromisoformat(item["status_time"])).total_seconds()
+    return max(int(expected_seconds - elapsed_seconds), MIN_RETRY_AFTER_SECONDS)
+
+
+class EndpointStatusGate:
+    """Answers requests to a model which none of its endpoints can serve, without invoking them.
+
+    The endpoint manager publishes the status of each endpoint it manages to the endpoint
+    status table when the status changes. A request is let through when one of the endpoints
+    able to answer it, its replicas or SLO fallback, is serving or has no published status.
+    """
+
+    def __init__(self, endpoint_names, table_name=None):
+        self.endpoint_names = endpoint_names
+        self.table = boto3.resource("dynamodb").Table(table_name) if table_name else None
+        self.items = {}
+        self.loaded_at = 0
+
+    def _load_statuses(self):
+        """Returns the status items of the endpoints, looked up at most once per STATUS_TTL_SECONDS"""
+        now = time.time()
+        if now - self.loaded_at < STATUS_TTL_SECONDS:
+            return self.items
+
+        try:
+            response = self.table.meta.client.batch_get_item(
+                RequestItems={
+                    self.table.name: {
+                        "Keys": [{"endpoint_name": endpoint_name} for endpoint_name in self.endpoint_names]
+                    }
+                }
+            )
+            self.items = {item["endpoint_name"]: item for item in response["Responses"].get(self.table.name, [])}
+        except botocore.exceptions.ClientError as error:
+            # Fail open, the request is invoked as if the endpoints were serving
+            print("Error loading endpoint status")
+            print(error)
+            self.items = {}
+        self.loaded_at = now
+
+        return self.items
+
+    def check(self):
+        """Returns the 503 lambda response of a request no endpoint can serve, None if the request can be invoked"""
+        if self.table is None:
+            return None
+
+        items = self._load_statuses()
+        unavailable = []
+        for endpoint_name in self.endpoint_names:
+            item = items.get(endpoint_name, {})
+            if item.get("endpoint_status") not in UNAVAILABLE_STATUSES:
+                return None
+            unavailable.append(item)
+
+        # Point the client at the endpoint expected to serve first
+        item = min(unavailable, key=lambda item: retry_after_seconds(item) or float("inf"))
+        return self.unavailable(item)
+
+    def unavailable(self, item):
+        status = item["endpoint_status"]
+        retry_after = retry_after_seconds(item)
+        headers = {"Content-Type": "application/json"}
+        body = {"endpoint_name": item["endpoint_name"], "status": status}
+        if retry_after is None:
+            body["error"] = f"Endpoint {item['endpoint_name']} has expired, extend its expiry to start it"
+        else:
+            headers["Retry-After"] = str(retry_after)
+            body["error"] = f"Endpoint {item['endpoint_name']} is {status}"
+            body["retry_after_seconds"] = retry_after
+
+        return {
+            "statusCode": 503,
+            "headers": headers,
+            "body": json.dumps(body)
+        }
+
+
+def status_gate_from_env():
+    """Creates a status gate from the lambda environment.
+
+    Requests are only checked if ENDPOINT_STATUS_TABLE_NAME is set. The endpoints able to
+    answer a request are the ENDPOINT_REPLICAS, or else ENDPOINT_NAME, and FALLBACK_ENDPOINT_NAME.
+    """
+    if "ENDPOINT_REPLICAS" in os.environ:
+        endpoint_names = [replica["endpoint_name"] for replica in json.loads(os.environ["ENDPOINT_REPLICAS"])]
+    else:
+        endpoint_names = [os.environ["ENDPOINT_NAME"]]
+    if "FALLBACK_ENDPOINT_NAME" in os.environ:
+        endpoint_names.append(os.environ["FALLBACK_ENDPOINT_NAME"])
+
+    return EndpointStatusGate(endpoint_names, table_name=os.environ.get("ENDPOINT_STATUS_TABLE_NAME"))
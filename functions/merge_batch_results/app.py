@@ -0,0 +1,47 @@
+import json
+import boto3
+
+s3_client = boto3.client("s3")
+
+# Result files of a distributed map run listed in its manifest, prompts which were not run are PENDING
+RESULT_FILE_STATUSES = ["SUCCEEDED", "FAILED"]
+
+
+def get_json(bucket, key):
+    return json.loads(s3_client.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+
+def format_result(execution):
+    """Returns the result of the prompt of a child execution, its index and either its output or its error"""
+    if execution.get("Status") == "SUCCEEDED":
+        return json.loads(execution["Output"])
+
+    # The invocation errors are caught by the child executions, the others fail the execution (i.e. a timeout)
+    prompt = json.loads(execution["Input"])
+    return {
+        "index": prompt["index"],
+        "error": execution.get("Error", execution.get("Status")),
+        "cause": execution.get("Cause", "")
+    }
+
+
+def handler(event, context):
+    """Merges the result files of a distributed map run into a single results file in prompt order.
+
+    The child executions of a distributed map complete out of order, the results of each prompt
+    carry its index. Returns the bucket and key of the results file.
+    """
+    manifest = get_json(event["bucket"], event["manifest_key"])
+
+    results = []
+    for status in RESULT_FILE_STATUSES:
+        for result_file in manifest.get("ResultFiles", {}).get(status, []):
+            results.extend(format_result(execution) for execution in get_json(event["bucket"], result_file["Key"]))
+    results.sort(key=lambda result: result["index"])
+    print(f"Merged the results of {len(results)} prompts")
+
+    s3_client.put_object(Bucket=event["bucket"],
+                         Key=event["key"],
+                         ContentType="application/json",
+                         Body=json.dumps(results).encode("utf-8"))
+    return {"bucket": event["bucket"], "key": event["key"]}
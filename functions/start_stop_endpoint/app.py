@@ -1,24 +1,683 @@
+import os
+import time
 import boto3
 import botocore
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
 sagemaker_client = boto3.client('sagemaker')
+sagemaker_runtime_client = boto3.client('sagemaker-runtime')
 ssm_client = boto3.client("ssm")
+autoscaling_client = boto3.client("application-autoscaling")
+cloudwatch_client = boto3.client("cloudwatch")
+service_quotas_client = boto3.client("service-quotas")
+endpoint_status_table = boto3.resource("dynamodb").Table(os.environ["ENDPOINT_STATUS_TABLE_NAME"]) if "ENDPOINT_STATUS_TABLE_NAME" in os.environ else None
 
-def start_stop_endpoint(expiry_parameter_values):
-    expiry = datetime.strptime(expiry_parameter_values['expiry'], '%d-%m-%Y-%H-%M-%S')
-    now = datetime.utcnow()
-    
-    # Expired, delete endpoint
-    if expiry < now:
-        # Delete endpoint
-        print("Endpoint has expired, deleting endpoint")
+SCALABLE_DIMENSION = "sagemaker:variant:DesiredInstanceCount"
+COMPONENT_SCALABLE_DIMENSION = "sagemaker:inference-component:DesiredCopyCount"
+# A warm-up not finished after the lambda timeout was interrupted and is claimed again
+WARMUP_CLAIM_SECONDS = 300
+# Seconds of warm-up requests per run, the endpoints not warmed up within the budget resume on the next runs
+WARMUP_BUDGET_SECONDS = float(os.environ.get("WARMUP_BUDGET_SECONDS", "60"))
+# Instances per instance type the endpoint manager may start, the quotas of the other instance types are looked up
+INSTANCE_QUOTAS = json.loads(os.environ.get("INSTANCE_QUOTAS", "{}"))
+# The endpoint instance quotas of the account are looked up again after this long
+QUOTA_CACHE_SECONDS = 3600
+# Endpoint instance quotas are named i.e. "ml.g5.12xlarge for endpoint usage"
+ENDPOINT_QUOTA_SUFFIX = " for endpoint usage"
+# An expired async endpoint is kept until its backlog metric has been empty for this long, the metric is published every minute
+BACKLOG_EMPTY_SECONDS = 180
+
+# Looked up quotas, kept while the lambda container is reused
+account_quotas = {"quotas": None, "lookup_time": 0}
+# Variants of the endpoint configs looked up during a run, by endpoint config name
+endpoint_config_variants = {}
+# When the warm-up budget of the current run is spent
+warmup_budget = {"deadline": 0}
+
+def get_resource_id(endpoint_name):
+    return f"endpoint/{endpoint_name}/variant/AllTraffic"
+
+def register_autoscaling(endpoint_name, autoscaling):
+    """Registers autoscaling of an endpoint, if it is not registered yet.
+
+    Realtime endpoints track a predefined metric, async endpoints track their queue backlog.
+    """
+    resource_id = get_resource_id(endpoint_name)
+    scalable_targets = autoscaling_client.describe_scalable_targets(
+        ServiceNamespace="sagemaker",
+        ResourceIds=[resource_id],
+        ScalableDimension=SCALABLE_DIMENSION)
+    if len(scalable_targets["ScalableTargets"]) > 0:
+        return
+
+    print("Registering endpoint autoscaling")
+    autoscaling_client.register_scalable_target(
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension=SCALABLE_DIMENSION,
+        MinCapacity=autoscaling["min_capacity"],
+        MaxCapacity=autoscaling["max_capacity"])
+
+    if "predefined_metric" in autoscaling:
+        # Track the invocations or concurrent requests per instance of a realtime endpoint
+        autoscaling_client.put_scaling_policy(
+            PolicyName=f"{endpoint_name}-TargetTracking",
+            ServiceNamespace="sagemaker",
+            ResourceId=resource_id,
+            ScalableDimension=SCALABLE_DIMENSION,
+            PolicyType="TargetTrackingScaling",
+            TargetTrackingScalingPolicyConfiguration={
+                "TargetValue": autoscaling["target_value"],
+                "PredefinedMetricSpecification": {
+                    "PredefinedMetricType": autoscaling["predefined_metric"]
+                },
+                "ScaleInCooldown": autoscaling["scale_in_cooldown"],
+                "ScaleOutCooldown": autoscaling["scale_out_cooldown"]
+            })
+        return
+
+    # Track the number of queued requests per instance
+    autoscaling_client.put_scaling_policy(
+        PolicyName=f"{endpoint_name}-BacklogTracking",
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension=SCALABLE_DIMENSION,
+        PolicyType="TargetTrackingScaling",
+        TargetTrackingScalingPolicyConfiguration={
+            "TargetValue": autoscaling["target_backlog_per_instance"],
+            "CustomizedMetricSpecification": {
+                "MetricName": "ApproximateBacklogSizePerInstance",
+                "Namespace": "AWS/SageMaker",
+                "Dimensions": [{"Name": "EndpointName", "Value": endpoint_name}],
+                "Statistic": "Average"
+            },
+            "ScaleInCooldown": autoscaling["scale_in_cooldown"],
+            "ScaleOutCooldown": autoscaling["scale_out_cooldown"]
+        })
+
+    if autoscaling["min_capacity"] == 0:
+        # The backlog per instance is not reported without instances, step up from zero on requests waiting for capacity
+        scale_out_policy = autoscaling_client.put_scaling_policy(
+            PolicyName=f"{endpoint_name}-ScaleOutFromZero",
+            ServiceNamespace="sagemaker",
+            ResourceId=resource_id,
+            ScalableDimension=SCALABLE_DIMENSION,
+            PolicyType="StepScaling",
+            StepScalingPolicyConfiguration={
+                "AdjustmentType": "ChangeInCapacity",
+                "MetricAggregationType": "Maximum",
+                "Cooldown": autoscaling["scale_out_cooldown"],
+                "StepAdjustments": [{"MetricIntervalLowerBound": 0, "ScalingAdjustment": 1}]
+            })
+
+        cloudwatch_client.put_metric_alarm(
+            AlarmName=f"{endpoint_name}-HasBacklogWithoutCapacity",
+            MetricName="HasBacklogWithoutCapacity",
+            Namespace="AWS/SageMaker",
+            Dimensions=[{"Name": "EndpointName", "Value": endpoint_name}],
+            Statistic="Maximum",
+            Period=60,
+            EvaluationPeriods=1,
+            Threshold=1,
+            ComparisonOperator="GreaterThanOrEqualToThreshold",
+            TreatMissingData="notBreaching",
+            AlarmActions=[scale_out_policy["PolicyARN"]])
+
+def deregister_autoscaling(endpoint_name):
+    """Deregisters autoscaling of an endpoint, which also deletes its scaling policies"""
+    try:
+        autoscaling_client.deregister_scalable_target(
+            ServiceNamespace="sagemaker",
+            ResourceId=get_resource_id(endpoint_name),
+            ScalableDimension=SCALABLE_DIMENSION)
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] != 'ObjectNotFoundException':
+            print("Error deregistering endpoint autoscaling")
+            print(error)
+
+    try:
+        cloudwatch_client.delete_alarms(AlarmNames=[f"{endpoint_name}-HasBacklogWithoutCapacity"])
+    except botocore.exceptions.ClientError as error:
+        print("Error deleting endpoint autoscaling alarm")
+        print(error)
+
+def register_component_autoscaling(inference_component_name, autoscaling):
+    """Registers autoscaling of the copies of an inference component, if it is not registered yet"""
+    resource_id = f"inference-component/{inference_component_name}"
+    scalable_targets = autoscaling_client.describe_scalable_targets(
+        ServiceNamespace="sagemaker",
+        ResourceIds=[resource_id],
+        ScalableDimension=COMPONENT_SCALABLE_DIMENSION)
+    if len(scalable_targets["ScalableTargets"]) > 0:
+        return
+
+    print(f"Registering inference component {inference_component_name} autoscaling")
+    autoscaling_client.register_scalable_target(
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension=COMPONENT_SCALABLE_DIMENSION,
+        MinCapacity=autoscaling["min_capacity"],
+        MaxCapacity=autoscaling["max_capacity"])
+
+    autoscaling_client.put_scaling_policy(
+        PolicyName=f"{inference_component_name}-TargetTracking",
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension=COMPONENT_SCALABLE_DIMENSION,
+        PolicyType="TargetTrackingScaling",
+        TargetTrackingScalingPolicyConfiguration={
+            "TargetValue": autoscaling["target_value"],
+            "PredefinedMetricSpecification": {
+                "PredefinedMetricType": autoscaling["predefined_metric"]
+            },
+            "ScaleInCooldown": autoscaling["scale_in_cooldown"],
+            "ScaleOutCooldown": autoscaling["scale_out_cooldown"]
+        })
+
+def start_inference_components(endpoint_name, inference_components):
+    """Creates the missing inference components of an InService shared endpoint, and recreates the failed ones"""
+    for inference_component in inference_components:
+        try:
+            describe_response = sagemaker_client.describe_inference_component(
+                InferenceComponentName=inference_component['name'])
+        except botocore.exceptions.ClientError as error:
+            if error.response['Error']['Code'] != 'ValidationException':
+                print(f"Error describing inference component {inference_component['name']}")
+                print(error)
+                continue
+
+            print(f"Creating inference component {inference_component['name']}")
+            try:
+                sagemaker_client.create_inference_component(
+                    InferenceComponentName=inference_component['name'],
+                    EndpointName=endpoint_name,
+                    VariantName=inference_component['variant_name'],
+                    Specification={
+                        "ModelName": inference_component['model_name'],
+                        "ComputeResourceRequirements": inference_component['compute_resource_requirements']
+                    },
+                    RuntimeConfig={"CopyCount": inference_component['copy_count']})
+                mark_not_ready(inference_component['name'])
+            except botocore.exceptions.ClientError as error:
+                print(f"Error creating inference component {inference_component['name']}")
+                print(error)
+            continue
+
+        status = describe_response['InferenceComponentStatus']
+        if status == 'Failed':
+            # Delete the failed inference component so that it can be created
+            print(f"Inference component {inference_component['name']} creation failed, deleting inference component")
+            delete_inference_component(inference_component)
+        elif status == 'InService':
+            if update_drifted_inference_component(inference_component, describe_response):
+                continue
+            warm_up(inference_component['name'], inference_component.get('warmup'),
+                    EndpointName=endpoint_name, InferenceComponentName=inference_component['name'])
+            if 'autoscaling' in inference_component:
+                try:
+                    register_component_autoscaling(inference_component['name'], inference_component['autoscaling'])
+                except botocore.exceptions.ClientError as error:
+                    print(f"Error registering inference component {inference_component['name']} autoscaling")
+                    print(error)
+
+def update_drifted_inference_component(inference_component, describe_response):
+    """Updates the model or compute resources of an inference component in place if they changed, returns whether it is updating"""
+    specification = {
+        "ModelName": inference_component['model_name'],
+        "ComputeResourceRequirements": inference_component['compute_resource_requirements']
+    }
+    current_specification = describe_response['Specification']
+    if (current_specification.get('ModelName') == specification['ModelName']
+            and current_specification.get('ComputeResourceRequirements') == specification['ComputeResourceRequirements']):
+        return False
+
+    update_target = json.dumps(specification, sort_keys=True)
+    if was_update_attempted(inference_component['name'], update_target):
+        return False
+
+    print(f"Inference component {inference_component['name']} drifted, updating inference component")
+    try:
+        sagemaker_client.update_inference_component(
+            InferenceComponentName=inference_component['name'],
+            Specification=specification)
+    except botocore.exceptions.ClientError as error:
+        print(f"Error updating inference component {inference_component['name']}")
+        print(error)
+        return False
+
+    record_update_attempt(inference_component['name'], update_target)
+    return True
+
+def delete_inference_component(inference_component):
+    if 'autoscaling' in inference_component:
         try:
-            sagemaker_client.delete_endpoint(EndpointName=expiry_parameter_values['endpoint_name'])
+            autoscaling_client.deregister_scalable_target(
+                ServiceNamespace="sagemaker",
+                ResourceId=f"inference-component/{inference_component['name']}",
+                ScalableDimension=COMPONENT_SCALABLE_DIMENSION)
         except botocore.exceptions.ClientError as error:
-            print("Error deleting endpoint")
+            if error.response['Error']['Code'] != 'ObjectNotFoundException':
+                print(f"Error deregistering inference component {inference_component['name']} autoscaling")
+                print(error)
+
+    try:
+        sagemaker_client.delete_inference_component(InferenceComponentName=inference_component['name'])
+        mark_not_ready(inference_component['name'])
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] != 'ValidationException':
+            print(f"Error deleting inference component {inference_component['name']}")
             print(error)
+
+def record_time_to_in_service(endpoint_name, describe_response):
+    """Records how long the endpoint took to be InService, once per endpoint creation"""
+    if endpoint_status_table is None:
+        return
+
+    creation_time = describe_response['CreationTime']
+    seconds_to_in_service = int((describe_response['LastModifiedTime'] - creation_time).total_seconds())
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': endpoint_name},
+            UpdateExpression="SET creation_time = :creation_time, in_service_time = :in_service_time, seconds_to_in_service = :seconds",
+            ConditionExpression="attribute_not_exists(creation_time) OR creation_time <> :creation_time",
+            ExpressionAttributeValues={
+                ':creation_time': creation_time.isoformat(),
+                ':in_service_time': describe_response['LastModifiedTime'].isoformat(),
+                ':seconds': seconds_to_in_service
+            })
+    except botocore.exceptions.ClientError as error:
+        # Already recorded for this endpoint creation
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print("Error recording endpoint status")
+            print(error)
+        return
+
+    print(f"Endpoint was InService after {seconds_to_in_service} seconds")
+    cloudwatch_client.put_metric_data(
+        Namespace="SageMakerEndpointManager",
+        MetricData=[{
+            "MetricName": "TimeToInService",
+            "Dimensions": [{"Name": "EndpointName", "Value": endpoint_name}],
+            "Value": seconds_to_in_service,
+            "Unit": "Seconds"
+        }])
+
+def mark_not_ready(name):
+    """Marks a new or deleted endpoint or inference component as not ready, it is warmed up again once InService.
+
+    A created endpoint also leaves the queue of endpoints waiting for instances.
+    """
+    if endpoint_status_table is None:
+        return
+
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET ready = :false REMOVE warmup_started, warmup_sent, ready_time, warmup_seconds, warmup_errors, "
+                             "queue_position, queue_instance_type, queued_since, queue_time, hibernation_tier, hibernation_time",
+            ExpressionAttributeValues={':false': False})
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint status")
+        print(error)
+
+def claim_warm_up(name):
+    """Returns the status of the warm-up this run resumes, None if the endpoint or inference component is ready or another run is warming it up"""
+    now = datetime.utcnow()
+    try:
+        response = endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET warmup_started = :now",
+            ConditionExpression="(attribute_not_exists(ready) OR ready = :false) AND (attribute_not_exists(warmup_started) OR warmup_started < :stale)",
+            ExpressionAttributeValues={
+                ':now': now.isoformat(),
+                ':stale': (now - timedelta(seconds=WARMUP_CLAIM_SECONDS)).isoformat(),
+                ':false': False
+            },
+            ReturnValues="ALL_NEW")
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print("Error recording endpoint status")
+            print(error)
+        return None
+
+    return response['Attributes']
+
+def record_warm_up_progress(name, sent, warmup_seconds, errors):
+    """Records the warm-up requests sent so far and releases the claim, the next run resumes the warm-up"""
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET warmup_sent = :sent, warmup_seconds = :seconds, warmup_errors = :errors REMOVE warmup_started",
+            ExpressionAttributeValues={
+                ':sent': sent,
+                ':seconds': warmup_seconds,
+                ':errors': errors
+            })
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint status")
+        print(error)
+
+def warm_up(name, warmup, **invoke_args):
+    """Sends the warm-up requests to an InService endpoint or inference component once per creation, then marks it ready.
+
+    The first requests of a new endpoint are slow while the model loads its weights and compiles its kernels,
+    the warm-up requests absorb that cost instead of the first users. The warm-up requests of a run stop once
+    its WARMUP_BUDGET_SECONDS are spent, so that a slow model does not hold up the other endpoints.
+    """
+    if endpoint_status_table is None or time.monotonic() >= warmup_budget["deadline"]:
+        return
+    # Ready endpoints are only read, so that the runs after the warm-up make no conditional writes
+    if get_endpoint_status(name).get('ready') is True:
+        return
+    status = claim_warm_up(name)
+    if status is None:
+        return
+
+    # Resume the warm-up where the previous runs left it
+    sent = int(status.get('warmup_sent', 0))
+    errors = int(status.get('warmup_errors', 0))
+    previous_seconds = float(status.get('warmup_seconds', 0))
+    start = time.monotonic()
+    if warmup is not None:
+        requests = [payload for _ in range(warmup['repeat']) for payload in warmup['payloads']]
+        print(f"Warming up {name}, {len(requests) - sent} requests left")
+        while sent < len(requests):
+            if time.monotonic() >= warmup_budget["deadline"]:
+                print(f"Warm-up budget spent, {name} resumes its warm-up on the next run")
+                record_warm_up_progress(name, sent, int(round(previous_seconds + time.monotonic() - start)), errors)
+                return
+            try:
+                sagemaker_runtime_client.invoke_endpoint(ContentType=warmup['content_type'], Body=requests[sent], **invoke_args)
+            except botocore.exceptions.ClientError as error:
+                # Warm-up is best effort, a failing request does not keep the endpoint from being ready
+                errors += 1
+                print(f"Error invoking {name} during warm-up")
+                print(error)
+            sent += 1
+    warmup_seconds = int(round(previous_seconds + time.monotonic() - start))
+
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET ready = :true, ready_time = :now, warmup_seconds = :seconds, warmup_errors = :errors REMOVE warmup_started, warmup_sent",
+            ExpressionAttributeValues={
+                ':true': True,
+                ':now': datetime.utcnow().isoformat(),
+                ':seconds': warmup_seconds,
+                ':errors': errors
+            })
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint status")
+        print(error)
+        return
+
+    print(f"{name} is ready after {warmup_seconds} seconds of warm-up")
+    if warmup is not None:
+        cloudwatch_client.put_metric_data(
+            Namespace="SageMakerEndpointManager",
+            MetricData=[{
+                "MetricName": "WarmupTime",
+                "Dimensions": [{"Name": "EndpointName", "Value": name}],
+                "Value": warmup_seconds,
+                "Unit": "Seconds"
+            }])
+
+def get_endpoint_status(name):
+    """Returns the status recorded for an endpoint or inference component, empty if there is none"""
+    if endpoint_status_table is None:
+        return {}
+
+    try:
+        return endpoint_status_table.get_item(Key={'endpoint_name': name}).get('Item', {})
+    except botocore.exceptions.ClientError as error:
+        print("Error reading endpoint status")
+        print(error)
+        return {}
+
+def was_update_attempted(name, target):
+    """Returns whether the endpoint or inference component was already updated to the target.
+
+    A failed update rolls back, the target is not retried until it changes.
+    """
+    return get_endpoint_status(name).get('update_target') == target
+
+def record_update_attempt(name, target):
+    if endpoint_status_table is None:
+        return
+
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET update_target = :target, update_time = :now",
+            ExpressionAttributeValues={':target': target, ':now': datetime.utcnow().isoformat()})
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint update")
+        print(error)
+
+def update_drifted_endpoint(expiry_parameter_values, describe_response):
+    """Updates the endpoint in place if its endpoint config differs from the expiry parameter, returns whether it is updating"""
+    endpoint_name = expiry_parameter_values['endpoint_name']
+    endpoint_config_name = expiry_parameter_values['endpoint_config_name']
+    if describe_response['EndpointConfigName'] == endpoint_config_name:
+        return False
+
+    if was_update_attempted(endpoint_name, endpoint_config_name):
+        return False
+
+    print(f"Endpoint config drifted from {describe_response['EndpointConfigName']} to {endpoint_config_name}, updating endpoint")
+    # The scalable target of the variant is registered again once the endpoint is InService
+    if 'autoscaling' in expiry_parameter_values:
+        deregister_autoscaling(endpoint_name)
+
+    update_args = {}
+    if 'deployment_config' in expiry_parameter_values:
+        update_args['DeploymentConfig'] = expiry_parameter_values['deployment_config']
+
+    try:
+        sagemaker_client.update_endpoint(
+            EndpointName=endpoint_name,
+            EndpointConfigName=endpoint_config_name,
+            **update_args)
+    except botocore.exceptions.ClientError as error:
+        print("Error updating endpoint")
+        print(error)
+        return False
+
+    record_update_attempt(endpoint_name, endpoint_config_name)
+    return True
+
+def is_expired(expiry_parameter_values):
+    expiry = datetime.strptime(expiry_parameter_values['expiry'], '%d-%m-%Y-%H-%M-%S')
+    return expiry < datetime.utcnow()
+
+def get_hibernation_tier(expiry_parameter_values):
+    """Returns the index of the hibernation tier an expired endpoint is due for, None once it is due for deletion"""
+    hibernation = expiry_parameter_values['hibernation']
+    expiry = datetime.strptime(expiry_parameter_values['expiry'], '%d-%m-%Y-%H-%M-%S')
+    minutes_expired = (datetime.utcnow() - expiry).total_seconds() / 60
+    if minutes_expired >= hibernation['delete_after_minutes']:
+        return None
+
+    # The first tier applies at expiry, the later ones once their idle period has passed
+    return max(index for index, tier in enumerate(hibernation['tiers']) if tier['after_minutes'] <= minutes_expired)
+
+def record_hibernation_tier(name, tier_index):
+    if endpoint_status_table is None:
+        return
+
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET hibernation_tier = :tier, hibernation_time = :now",
+            ExpressionAttributeValues={':tier': tier_index, ':now': datetime.utcnow().isoformat()})
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint status")
+        print(error)
+
+def clear_hibernation_tier(name):
+    if endpoint_status_table is None:
+        return
+
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="REMOVE hibernation_tier, hibernation_time")
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint status")
+        print(error)
+
+def hibernate_endpoint(expiry_parameter_values, tier_index):
+    """Scales an expired endpoint down to a hibernation tier, returns the endpoint status, None if it does not exist.
+
+    Tiers on a cheaper instance type update the endpoint to their endpoint config, the others scale its variant in place.
+    Each tier is applied once, an endpoint still being created or updated is scaled down once InService.
+    """
+    endpoint_name = expiry_parameter_values['endpoint_name']
+    try:
+        describe_response = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] == 'ValidationException':
+            return None
+
+        print("Error describing endpoint")
+        print(error)
+        return 'Unknown'
+
+    if describe_response['EndpointStatus'] == 'Failed':
+        return delete_endpoint(expiry_parameter_values)
+    if describe_response['EndpointStatus'] != 'InService' or get_endpoint_status(endpoint_name).get('hibernation_tier') == tier_index:
+        return describe_response['EndpointStatus']
+
+    tier = expiry_parameter_values['hibernation']['tiers'][tier_index]
+    print(f"Endpoint has expired, hibernating endpoint on {tier.get('instance_type', 'its instance type')} with {tier['instance_count']} instances")
+    # Autoscaling would scale the endpoint back up to its minimum capacity, it is registered again once the endpoint is extended
+    if 'autoscaling' in expiry_parameter_values:
+        deregister_autoscaling(endpoint_name)
+
+    # The endpoint may already be on the tier, i.e. scaled in by autoscaling, then it is not updated
+    status = describe_response['EndpointStatus']
+    try:
+        if 'endpoint_config_name' in tier:
+            # An update to the endpoint config of the tier which rolled back is not retried, the endpoint stays on its previous tier
+            if describe_response['EndpointConfigName'] != tier['endpoint_config_name'] and not was_update_attempted(endpoint_name, tier['endpoint_config_name']):
+                sagemaker_client.update_endpoint(
+                    EndpointName=endpoint_name,
+                    EndpointConfigName=tier['endpoint_config_name'])
+                record_update_attempt(endpoint_name, tier['endpoint_config_name'])
+                status = 'Updating'
+        elif describe_response['ProductionVariants'][0]['CurrentInstanceCount'] != tier['instance_count']:
+            sagemaker_client.update_endpoint_weights_and_capacities(
+                EndpointName=endpoint_name,
+                DesiredWeightsAndCapacities=[{
+                    'VariantName': describe_response['ProductionVariants'][0]['VariantName'],
+                    'DesiredInstanceCount': tier['instance_count']
+                }])
+            status = 'Updating'
+    except botocore.exceptions.ClientError as error:
+        print("Error hibernating endpoint")
+        print(error)
+        return describe_response['EndpointStatus']
+
+    record_hibernation_tier(endpoint_name, tier_index)
+    return status
+
+def wake_endpoint(expiry_parameter_values, describe_response):
+    """Scales a hibernated endpoint whose expiry was extended back up to its instance count, returns whether it is updating.
+
+    An endpoint hibernated on a cheaper instance type is updated back to its endpoint config by update_drifted_endpoint.
+    """
+    endpoint_name = expiry_parameter_values['endpoint_name']
+    if 'hibernation_tier' not in get_endpoint_status(endpoint_name):
+        return False
+
+    instance_count = expiry_parameter_values['instances']['instance_count']
+    variant = describe_response['ProductionVariants'][0]
+    if describe_response['EndpointConfigName'] != expiry_parameter_values['endpoint_config_name'] or variant['CurrentInstanceCount'] >= instance_count:
+        clear_hibernation_tier(endpoint_name)
+        return False
+
+    print(f"Endpoint was extended while hibernating, scaling endpoint back to {instance_count} instances")
+    try:
+        sagemaker_client.update_endpoint_weights_and_capacities(
+            EndpointName=endpoint_name,
+            DesiredWeightsAndCapacities=[{'VariantName': variant['VariantName'], 'DesiredInstanceCount': instance_count}])
+    except botocore.exceptions.ClientError as error:
+        print("Error scaling endpoint")
+        print(error)
+        return False
+
+    clear_hibernation_tier(endpoint_name)
+    return True
+
+def is_missing_endpoint_error(error):
+    return error.response['Error']['Code'] == 'ValidationException' and 'Could not find' in error.response['Error'].get('Message', '')
+
+def delete_endpoint(expiry_parameter_values):
+    """Deletes an endpoint and its inference components, returns the endpoint status, None if it does not exist.
+
+    An endpoint which could not be deleted keeps its published status, its deletion is retried on the next run.
+    """
+    if 'autoscaling' in expiry_parameter_values:
+        deregister_autoscaling(expiry_parameter_values['endpoint_name'])
+    # The inference components of a shared endpoint are deleted before the endpoint
+    for inference_component in expiry_parameter_values.get('inference_components', []):
+        delete_inference_component(inference_component)
+    try:
+        sagemaker_client.delete_endpoint(EndpointName=expiry_parameter_values['endpoint_name'])
+        mark_not_ready(expiry_parameter_values['endpoint_name'])
+    except botocore.exceptions.ClientError as error:
+        if is_missing_endpoint_error(error):
+            return None
+
+        print("Error deleting endpoint")
+        print(error)
+        # Count the instances of the endpoint, it may exist
+        return 'Unknown'
+    # The instances are released once the endpoint is deleted
+    return 'Deleting'
+
+def has_async_backlog(endpoint_name):
+    """Returns whether an async endpoint has queued or in-flight requests, according to its ApproximateBacklogSize over the last minutes.
+
+    The requests of a deleted async endpoint are never processed, the metric is assumed non-empty when it cannot be read.
+    """
+    now = datetime.utcnow()
+    try:
+        response = cloudwatch_client.get_metric_statistics(
+            Namespace="AWS/SageMaker",
+            MetricName="ApproximateBacklogSize",
+            Dimensions=[{"Name": "EndpointName", "Value": endpoint_name}],
+            StartTime=now - timedelta(seconds=BACKLOG_EMPTY_SECONDS),
+            EndTime=now,
+            Period=60,
+            Statistics=["Maximum"])
+    except botocore.exceptions.ClientError as error:
+        print("Error looking up endpoint backlog")
+        print(error)
+        return True
+
+    return any(datapoint["Maximum"] > 0 for datapoint in response.get("Datapoints", []))
+
+def start_stop_endpoint(expiry_parameter_values):
+    """Deletes or hibernates an expired endpoint and reconciles an unexpired one, returns the endpoint status, None if it does not exist.
+
+    Missing endpoints are created by schedule_creations, within the instance quotas. An expired async endpoint
+    is reconciled like an unexpired one until its queued and in-flight requests are processed.
+    """
+    expired = is_expired(expiry_parameter_values)
+    if expired and expiry_parameter_values.get('async_inference') and has_async_backlog(expiry_parameter_values['endpoint_name']):
+        print("Endpoint has expired with queued async requests, deleting endpoint once they are processed")
+        expired = False
+
+    # Expired, hibernate the endpoint through its tiers, then delete it
+    if expired:
+        tier_index = get_hibernation_tier(expiry_parameter_values) if 'hibernation' in expiry_parameter_values else None
+        if tier_index is not None:
+            return hibernate_endpoint(expiry_parameter_values, tier_index)
+
+        print("Endpoint has expired, deleting endpoint")
+        return delete_endpoint(expiry_parameter_values)
     else:
         # Check if endpoint is expiring
         print("Endpoint is not expiring")
@@ -28,28 +687,236 @@ def start_stop_endpoint(expiry_parameter_values):
             describe_response = sagemaker_client.describe_endpoint(
                 EndpointName=expiry_parameter_values['endpoint_name']
             )
+        except botocore.exceptions.ClientError as error:
+            # Endpoint does not exist, it is created if its instances fit in the quota
+            if error.response['Error']['Code'] == 'ValidationException':
+                print("Endpoint does not exist")
+                return None
+
+            print("Error describing endpoint")
+            print(error)
+            # Count the instances of the endpoint, it may exist
+            return 'Unknown'
 
+        # The endpoint exists, an error reconciling it is retried on the next run
+        try:
             # Check if endpoint creation failed, it it has, delete it so that it can be created
             if describe_response['EndpointStatus'] == 'Failed':
                 print("Endpoint creation failed, deleting endpoint")
                 sagemaker_client.delete_endpoint(EndpointName=expiry_parameter_values['endpoint_name'])
+                mark_not_ready(expiry_parameter_values['endpoint_name'])
+                return 'Deleting'
+            elif describe_response['EndpointStatus'] == 'InService':
+                record_time_to_in_service(expiry_parameter_values['endpoint_name'], describe_response)
+                # An endpoint extended while hibernating scales back up instead of being created again
+                if 'hibernation' in expiry_parameter_values and wake_endpoint(expiry_parameter_values, describe_response):
+                    return 'Updating'
+                # Roll out a new endpoint config without recreating the endpoint
+                if update_drifted_endpoint(expiry_parameter_values, describe_response):
+                    return 'Updating'
+                # The endpoint is advertised as ready once it has served the warm-up requests
+                warm_up(expiry_parameter_values['endpoint_name'], expiry_parameter_values.get('warmup'),
+                        EndpointName=expiry_parameter_values['endpoint_name'])
+                if 'autoscaling' in expiry_parameter_values:
+                    try:
+                        register_autoscaling(expiry_parameter_values['endpoint_name'], expiry_parameter_values['autoscaling'])
+                    except botocore.exceptions.ClientError as error:
+                        print("Error registering endpoint autoscaling")
+                        print(error)
+                if 'inference_components' in expiry_parameter_values:
+                    start_inference_components(expiry_parameter_values['endpoint_name'], expiry_parameter_values['inference_components'])
         except botocore.exceptions.ClientError as error:
-            # Endpoint does not exist, create endpoint
-            if error.response['Error']['Code'] == 'ValidationException':
-                print("Creating endpoint")
-                try:
-                    create_endpoint_response = create_endpoint(expiry_parameter_values['endpoint_name'], expiry_parameter_values['endpoint_config_name'])
-                except botocore.exceptions.ClientError as error:
-                    print("Error creating endpoint")
-            else:
-                print("Error describing endpoint")
-                print(error)
+            print("Error reconciling endpoint")
+            print(error)
+        return describe_response['EndpointStatus']
 
 def create_endpoint(endpoint_name, endpoint_config_name):
     return sagemaker_client.create_endpoint(
                                         EndpointName=endpoint_name, 
                                         EndpointConfigName=endpoint_config_name)
 
+def get_account_quotas():
+    """Returns the endpoint instance quotas of the account by instance type, looked up at most every QUOTA_CACHE_SECONDS"""
+    if account_quotas["quotas"] is not None and time.monotonic() - account_quotas["lookup_time"] < QUOTA_CACHE_SECONDS:
+        return account_quotas["quotas"]
+
+    print("Looking up the endpoint instance quotas")
+    quotas = {}
+    try:
+        response = service_quotas_client.list_service_quotas(ServiceCode="sagemaker")
+        result = response["Quotas"]
+        while "NextToken" in response:
+            response = service_quotas_client.list_service_quotas(ServiceCode="sagemaker", NextToken=response["NextToken"])
+            result.extend(response["Quotas"])
+    except botocore.exceptions.ClientError as error:
+        # Retried on the next run, creations over the quota fail with ResourceLimitExceeded meanwhile
+        print("Error looking up the endpoint instance quotas")
+        print(error)
+        return {}
+
+    for quota in result:
+        if quota["QuotaName"].endswith(ENDPOINT_QUOTA_SUFFIX):
+            quotas[quota["QuotaName"][:-len(ENDPOINT_QUOTA_SUFFIX)]] = int(quota["Value"])
+
+    account_quotas["quotas"] = quotas
+    account_quotas["lookup_time"] = time.monotonic()
+    return quotas
+
+def get_endpoint_config_variants(endpoint_config_name):
+    """Returns the instance type and initial instance count of each variant of an endpoint config, by variant name"""
+    if endpoint_config_name not in endpoint_config_variants:
+        response = sagemaker_client.describe_endpoint_config(EndpointConfigName=endpoint_config_name)
+        endpoint_config_variants[endpoint_config_name] = {
+            variant['VariantName']: {
+                "instance_type": variant.get('InstanceType'),
+                "instance_count": variant.get('InitialInstanceCount', 0)
+            }
+            for variant in response['ProductionVariants']
+        }
+    return endpoint_config_variants[endpoint_config_name]
+
+def get_endpoint_instances(expiry_parameter_values):
+    """Returns the instances of an endpoint to create, resolved from its endpoint config for the endpoints added through the api"""
+    if 'instances' in expiry_parameter_values:
+        return expiry_parameter_values['instances']
+
+    try:
+        variants = get_endpoint_config_variants(expiry_parameter_values['endpoint_config_name'])
+    except botocore.exceptions.ClientError as error:
+        print("Error describing endpoint config")
+        print(error)
+        variants = {}
+    # Serverless variants have no instances, they are only limited by ResourceLimitExceeded
+    return next((variant for variant in variants.values() if variant['instance_type'] is not None),
+                {"instance_type": None, "instance_count": 0})
+
+def count_instances(expiry_parameter_values, instance_usage):
+    """Adds the instances run by an existing endpoint to the usage of their instance type.
+
+    Hibernating and autoscaled endpoints run another number of instances than the expiry parameter, and
+    possibly another instance type, so the current instances of each variant are counted on the instance
+    type of the endpoint config it runs, and the instances of an update in progress are counted too.
+    """
+    try:
+        describe_response = sagemaker_client.describe_endpoint(EndpointName=expiry_parameter_values['endpoint_name'])
+        variants = get_endpoint_config_variants(describe_response['EndpointConfigName'])
+    except botocore.exceptions.ClientError as error:
+        if error.response['Error']['Code'] == 'ValidationException':
+            return
+        print("Error describing endpoint instances")
+        print(error)
+        # Count the instances the endpoint was created with
+        instances = get_endpoint_instances(expiry_parameter_values)
+        if instances['instance_type'] is not None:
+            instance_usage[instances['instance_type']] = instance_usage.get(instances['instance_type'], 0) + instances['instance_count']
+        return
+
+    # The variants are not reported until the endpoint is created
+    current_variants = describe_response.get('ProductionVariants') or [
+        {"VariantName": variant_name, "CurrentInstanceCount": variant['instance_count']} for variant_name, variant in variants.items()]
+    for variant in current_variants:
+        instance_type = variants.get(variant['VariantName'], {}).get('instance_type')
+        if instance_type is not None:
+            # Instances being added by autoscaling are counted as running
+            instance_count = max(variant.get('CurrentInstanceCount', 0), variant.get('DesiredInstanceCount', 0))
+            instance_usage[instance_type] = instance_usage.get(instance_type, 0) + instance_count
+
+    for variant in describe_response.get('PendingDeploymentSummary', {}).get('ProductionVariants', []):
+        if variant.get('InstanceType') is not None:
+            instance_usage[variant['InstanceType']] = instance_usage.get(variant['InstanceType'], 0) + variant.get('DesiredInstanceCount', 0)
+
+def get_instance_quotas(instance_types):
+    """Returns the quota of each instance type, the configured quota or else the quota of the account, None if unknown"""
+    quotas = {instance_type: INSTANCE_QUOTAS.get(instance_type) for instance_type in instance_types}
+    if any(quota is None for quota in quotas.values()):
+        looked_up_quotas = get_account_quotas()
+        quotas = {instance_type: looked_up_quotas.get(instance_type) if quota is None else quota
+                  for instance_type, quota in quotas.items()}
+    return quotas
+
+def record_queue_position(name, instance_type, position):
+    """Records the position of an endpoint waiting for instances, reported by the expiry listing"""
+    if endpoint_status_table is None:
+        return
+
+    now = datetime.utcnow().isoformat()
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET queue_position = :position, queue_instance_type = :instance_type, queue_time = :now, "
+                             "queued_since = if_not_exists(queued_since, :now)",
+            ExpressionAttributeValues={':position': position, ':instance_type': instance_type, ':now': now})
+    except botocore.exceptions.ClientError as error:
+        print("Error recording endpoint queue position")
+        print(error)
+
+def publish_status(name, status):
+    """Publishes the status of an endpoint to the endpoint status table when it changes.
+
+    The invoke lambdas answer requests to endpoints which are not serving from the published
+    statuses, with a Retry-After estimated from status_time and the last time to InService.
+    """
+    if endpoint_status_table is None or status == 'Unknown':
+        return
+
+    try:
+        endpoint_status_table.update_item(
+            Key={'endpoint_name': name},
+            UpdateExpression="SET endpoint_status = :status, status_time = :now",
+            ConditionExpression="attribute_not_exists(endpoint_status) OR endpoint_status <> :status",
+            ExpressionAttributeValues={':status': status, ':now': datetime.utcnow().isoformat()})
+    except botocore.exceptions.ClientError as error:
+        # Unchanged since the last run
+        if error.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print("Error publishing endpoint status")
+            print(error)
+
+def schedule_creations(missing_endpoints, instance_usage):
+    """Creates the missing endpoints in priority order while their instances fit in the quotas, and queues the others.
+
+    An endpoint waits for the higher priority endpoints queued for the same instance type, so that a large
+    endpoint is not starved by smaller ones. Creations rejected with ResourceLimitExceeded, because of instances
+    used outside the endpoint manager, are queued too. Returns the status of the created and queued endpoints.
+    """
+    missing_endpoints = sorted(missing_endpoints, key=lambda values: (-values.get('priority', 0), values['endpoint_name']))
+    endpoint_instances = {values['endpoint_name']: get_endpoint_instances(values) for values in missing_endpoints}
+    quotas = get_instance_quotas(set(instances['instance_type'] for instances in endpoint_instances.values()
+                                     if instances['instance_type'] is not None))
+
+    queues = {}
+    statuses = {}
+    for expiry_parameter_values in missing_endpoints:
+        endpoint_name = expiry_parameter_values['endpoint_name']
+        instances = endpoint_instances[endpoint_name]
+        instance_type = instances['instance_type']
+        queue = queues.setdefault(instance_type, [])
+        quota = quotas.get(instance_type)
+        if len(queue) > 0 or (quota is not None and instance_usage.get(instance_type, 0) + instances['instance_count'] > quota):
+            queue.append(endpoint_name)
+            continue
+
+        print(f"Creating endpoint {endpoint_name}")
+        try:
+            create_endpoint(endpoint_name, expiry_parameter_values['endpoint_config_name'])
+        except botocore.exceptions.ClientError as error:
+            print("Error creating endpoint")
+            print(error)
+            if error.response['Error']['Code'] == 'ResourceLimitExceeded':
+                queue.append(endpoint_name)
+            continue
+
+        mark_not_ready(endpoint_name)
+        instance_usage[instance_type] = instance_usage.get(instance_type, 0) + instances['instance_count']
+        statuses[endpoint_name] = 'Creating'
+
+    for instance_type, queue in queues.items():
+        for position, endpoint_name in enumerate(queue, 1):
+            print(f"Endpoint {endpoint_name} is waiting for {instance_type} instances, queue position {position}")
+            record_queue_position(endpoint_name, instance_type, position)
+            statuses[endpoint_name] = 'Queued'
+
+    return statuses
+
 def handler(event, context):
     # Get a list of endpoint expiry parameters
     response = ssm_client.get_parameters_by_path(
@@ -62,12 +929,32 @@ def handler(event, context):
         response = ssm_client.get_parameters_by_path(
             Path="/sagemaker/endpoint/expiry/",
             Recursive=True,
-            NextToken=result["NextToken"])
+            NextToken=response["NextToken"])
         result.extend(response["Parameters"])
 
-    # Process each endpoint expiry configuration
+    # Process each endpoint expiry configuration, counting the instances of the existing endpoints
+    endpoint_config_variants.clear()
+    warmup_budget["deadline"] = time.monotonic() + WARMUP_BUDGET_SECONDS
+    missing_endpoints = []
+    instance_usage = {}
+    statuses = {}
     for parameter in result:
         print("Processing endpoint")
         # endpoint_name = parameter['Name'].split("/")[-1]
         parameter_values = json.loads(parameter['Value'])
-        start_stop_endpoint(parameter_values) 
\ No newline at end of file
+        status = start_stop_endpoint(parameter_values)
+        if status is not None:
+            statuses[parameter_values['endpoint_name']] = status
+            count_instances(parameter_values, instance_usage)
+        elif not is_expired(parameter_values):
+            missing_endpoints.append(parameter_values)
+        else:
+            # Expired and deleted, it is started again once its expiry is extended
+            statuses[parameter_values['endpoint_name']] = 'Stopped'
+
+    # Create the missing endpoints whose instances fit in the quotas
+    if len(missing_endpoints) > 0:
+        statuses.update(schedule_creations(missing_endpoints, instance_usage))
+
+    for endpoint_name, status in statuses.items():
+        publish_status(endpoint_name, status) 
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import boto3
 import botocore
 import json
@@ -5,6 +6,22 @@ import json
 from datetime import datetime, timedelta
 
 ssm_client = boto3.client("ssm")
+endpoint_status_table = boto3.resource("dynamodb").Table(os.environ["ENDPOINT_STATUS_TABLE_NAME"]) if "ENDPOINT_STATUS_TABLE_NAME" in os.environ else None
+
+# Expiry parameters with warm-up payloads may not fit in a standard parameter, overwriting an advanced parameter without its tier fails
+PARAMETER_TIER = "Intelligent-Tiering"
+
+def get_endpoint_status(name):
+    """Returns the status recorded by the endpoint manager for an endpoint or inference component"""
+    if endpoint_status_table is None:
+        return {}
+
+    try:
+        return endpoint_status_table.get_item(Key={'endpoint_name': name}).get('Item', {})
+    except botocore.exceptions.ClientError as error:
+        print("Error reading endpoint status")
+        print(error)
+        return {}
 
 def get_expiry(expiry_parameter_values):
     expiry = datetime.strptime(expiry_parameter_values['expiry'], '%d-%m-%Y-%H-%M-%S')
@@ -18,6 +35,30 @@ def get_expiry(expiry_parameter_values):
         "TimeLeft": str(time_left)
     }
 
+    # An endpoint is ready once it and its inference components are InService and warmed up
+    statuses = [get_endpoint_status(expiry_parameter_values['endpoint_name'])]
+    statuses.extend(get_endpoint_status(inference_component['name'])
+                    for inference_component in expiry_parameter_values.get('inference_components', []))
+    endpoint_expiry_info["Ready"] = all(status.get('ready', False) for status in statuses)
+    if endpoint_expiry_info["Ready"]:
+        endpoint_expiry_info["WarmupSeconds"] = max(int(status.get('warmup_seconds', 0)) for status in statuses)
+
+    endpoint_expiry_info["Priority"] = expiry_parameter_values.get('priority', 0)
+    # An unexpired endpoint waiting for instances reports its position in the queue of its instance type
+    if 'queue_position' in statuses[0] and time_left.total_seconds() > 0:
+        endpoint_expiry_info["QueuePosition"] = int(statuses[0]['queue_position'])
+        endpoint_expiry_info["QueuedInstanceType"] = statuses[0]['queue_instance_type']
+        endpoint_expiry_info["QueuedSince"] = statuses[0]['queued_since']
+
+    # An expired endpoint hibernating on fewer or cheaper instances reports its tier and when it is deleted
+    if 'hibernation_tier' in statuses[0] and 'hibernation' in expiry_parameter_values and time_left.total_seconds() <= 0:
+        tier = expiry_parameter_values['hibernation']['tiers'][int(statuses[0]['hibernation_tier'])]
+        endpoint_expiry_info["Hibernating"] = True
+        endpoint_expiry_info["HibernationInstanceType"] = tier.get('instance_type', expiry_parameter_values.get('instances', {}).get('instance_type'))
+        endpoint_expiry_info["HibernationInstanceCount"] = tier['instance_count']
+        deletion_time = expiry + timedelta(minutes=expiry_parameter_values['hibernation']['delete_after_minutes'])
+        endpoint_expiry_info["DeletionTime"] = deletion_time.strftime("%d-%m-%Y-%H-%M-%S")
+
     return endpoint_expiry_info
 
 def get_endpoint_expiry_info(event):
@@ -51,7 +92,7 @@ def get_endpoint_expiry_info(event):
             ssm_response = ssm_client.get_parameters_by_path(
                 Path="/sagemaker/endpoint/expiry/",
                 Recursive=True,
-                NextToken=result["NextToken"])
+                NextToken=ssm_response["NextToken"])
             result.extend(ssm_response["Parameters"])
 
         # Process each endpoint expiry configuration
@@ -71,7 +112,7 @@ def get_endpoint_expiry_info(event):
 
     return response
 
-def create_endpoint_config(endpoint_name, endpoint_config_name, provision_minutes):
+def create_endpoint_config(endpoint_name, endpoint_config_name, provision_minutes, priority=0):
     now = datetime.utcnow()
     expiry = now + timedelta(minutes=provision_minutes)
     expiry_str = expiry.strftime("%d-%m-%Y-%H-%M-%S")
@@ -79,7 +120,8 @@ def create_endpoint_config(endpoint_name, endpoint_config_name, provision_minute
     expiry_ssm_value = {
         "expiry": expiry_str,
         "endpoint_name": endpoint_name,
-        "endpoint_config_name": endpoint_config_name
+        "endpoint_config_name": endpoint_config_name,
+        "priority": priority
     }
 
     # Add new parameter
@@ -87,12 +129,18 @@ def create_endpoint_config(endpoint_name, endpoint_config_name, provision_minute
         Name=f"/sagemaker/endpoint/expiry/{endpoint_name}",
         Type="String",
         Overwrite=True,
-        Value=json.dumps(expiry_ssm_value)
+        Value=json.dumps(expiry_ssm_value),
+        Tier=PARAMETER_TIER
     )
 
     return provision_minutes, expiry_str
 
-def update_endpoint_config(endpoint_name, provision_minutes, expiry_parameter_values):
+def update_endpoint_config(endpoint_name, provision_minutes, expiry_parameter_values, wakeup=False):
+    """Extends the expiry of an endpoint by provision_minutes.
+
+    A wake-up keeps the endpoint up for at least provision_minutes from now instead, so that
+    repeated wake-ups, i.e. one per queued request, do not add up.
+    """
     current_expiry = datetime.strptime(expiry_parameter_values['expiry'], '%d-%m-%Y-%H-%M-%S')
 
     # Check if current expiry is in the past
@@ -100,7 +148,10 @@ def update_endpoint_config(endpoint_name, provision_minutes, expiry_parameter_va
     if current_expiry < now:
         current_expiry = now
 
-    expiry = current_expiry + timedelta(minutes=provision_minutes)
+    if wakeup:
+        expiry = max(current_expiry, now + timedelta(minutes=provision_minutes))
+    else:
+        expiry = current_expiry + timedelta(minutes=provision_minutes)
     expiry_str = expiry.strftime("%d-%m-%Y-%H-%M-%S")
 
     time_left = expiry - now
@@ -111,7 +162,8 @@ def update_endpoint_config(endpoint_name, provision_minutes, expiry_parameter_va
     ssm_response = ssm_client.put_parameter(
         Name=f"/sagemaker/endpoint/expiry/{endpoint_name}",
         Overwrite=True,
-        Value=json.dumps(expiry_parameter_values)
+        Value=json.dumps(expiry_parameter_values),
+        Tier=PARAMETER_TIER
     )
 
     return time_left, expiry_str
@@ -137,7 +189,8 @@ def create_update_endpoint_expiry(event):
             expiry_parameter_values = json.loads(expiry_parameter['Parameter']['Value'])
 
             print("Updating endpoint")
-            time_left, expiry_str = update_endpoint_config(endpoint_name, body['minutes'], expiry_parameter_values)
+            time_left, expiry_str = update_endpoint_config(endpoint_name, body['minutes'], expiry_parameter_values,
+                                                           wakeup=body.get('wakeup', False))
 
             response =  {
                         "statusCode": 200,
@@ -154,7 +207,8 @@ def create_update_endpoint_expiry(event):
             if error.response['Error']['Code'] == 'ParameterNotFound':
                 if 'EndpointConfigName' in body:
                     print("Creating new endpoint config")
-                    time_left, expiry_str = create_endpoint_config(endpoint_name, body['EndpointConfigName'], body['minutes'])
+                    time_left, expiry_str = create_endpoint_config(endpoint_name, body['EndpointConfigName'], body['minutes'],
+                                                                   int(body.get('Priority', 0)))
 
                     response =  {
                         "statusCode": 200,
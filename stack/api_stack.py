@@ -47,3 +47,18 @@ class APIStack(NestedStack):
             "ApiGatewayRole",
             assumed_by=iam.ServicePrincipal("apigateway.amazonaws.com"),
         )
+
+        self.method_settings = []
+
+    def add_method_throttling(self, resource_path, http_method, rate_limit, burst_limit):
+        """Throttles a method of the api stage, requests over the limits get a 429 response"""
+        self.method_settings.append({
+            # Forward slashes in the resource path are encoded as ~1
+            "ResourcePath": "/" + ("/" + resource_path.strip("/")).replace("/", "~1"),
+            "HttpMethod": http_method,
+            "ThrottlingRateLimit": rate_limit,
+            "ThrottlingBurstLimit": burst_limit
+        })
+
+        stage = self.api.deployment_stage.node.default_child
+        stage.add_property_override("MethodSettings", self.method_settings)
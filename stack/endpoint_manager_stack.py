@@ -6,32 +6,136 @@ from aws_cdk import (
     aws_lambda as _lambda,
     aws_events as events,
     aws_events_targets as targets,
-    aws_apigateway as apigateway
+    aws_apigateway as apigateway,
+    aws_dynamodb as dynamodb,
+    RemovalPolicy
 )
 
 from constructs import Construct
 
+import json
+
 class EndpointManagerStack(NestedStack):
 
-    def __init__(self, scope: Construct, construct_id: str, api_stack, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, api_stack, configs, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Instances per instance type the endpoint manager may start, the quotas of the other instance types are looked up
+        instance_quotas = configs.get("instance_quotas", {})
+        for instance_type, quota in instance_quotas.items():
+            if not isinstance(quota, int) or isinstance(quota, bool) or quota < 0:
+                raise ValueError(f"Instance quota of {instance_type} must be a non negative integer")
+
+        # Table recording the status of the managed endpoints, i.e. how long they took to be InService, whether they are warmed up and their in place updates
+        endpoint_status_table = dynamodb.Table(self, "EndpointStatusTable",
+                                               partition_key=dynamodb.Attribute(name="endpoint_name", type=dynamodb.AttributeType.STRING),
+                                               billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                                               removal_policy=RemovalPolicy.DESTROY)
+        self.endpoint_status_table = endpoint_status_table
+
         # Create endpoint manager lambdas
         start_endpoint_handler = _lambda.Function(self, f"StartEndpointHandler",
                 runtime=_lambda.Runtime.PYTHON_3_9,
                 code=_lambda.Code.from_asset("functions/start_stop_endpoint"),
                 handler="app.handler",
-                timeout=Duration.seconds(30))
+                # Leave time to send the warm-up requests of new endpoints
+                timeout=Duration.minutes(5),
+                # Runs longer than the schedule period would overlap and both create endpoints in the same quota headroom,
+                # a run scheduled while the previous one is still running is throttled, then dropped instead of retried
+                reserved_concurrent_executions=1,
+                retry_attempts=0,
+                max_event_age=Duration.minutes(1),
+                environment={
+                    "ENDPOINT_STATUS_TABLE_NAME": endpoint_status_table.table_name,
+                    "INSTANCE_QUOTAS": json.dumps(instance_quotas)
+                })
+        endpoint_status_table.grant_read_write_data(start_endpoint_handler)
 
         # Add policy to lambda to create endpoint
         start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
             effect=iam.Effect.ALLOW,
-            actions=["sagemaker:CreateEndpoint", "sagemaker:DeleteEndpoint", "sagemaker:DescribeEndpoint"],
+            actions=["sagemaker:CreateEndpoint", "sagemaker:DeleteEndpoint", "sagemaker:DescribeEndpoint", "sagemaker:UpdateEndpoint"],
+            resources=[
+                "*"
+            ],
+        ))
+
+        # Add policy to lambda to create the inference components of shared endpoints
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["sagemaker:CreateInferenceComponent", "sagemaker:DeleteInferenceComponent", "sagemaker:DescribeInferenceComponent", "sagemaker:UpdateInferenceComponent"],
+            resources=[
+                "*"
+            ],
+        ))
+
+        # Add policy to lambda to look up the endpoint instance quotas of the account
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["servicequotas:ListServiceQuotas"],
+            resources=[
+                "*"
+            ],
+        ))
+
+        # Add policy to lambda to warm up new endpoints before they are ready
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["sagemaker:InvokeEndpoint"],
+            resources=[
+                "*"
+            ],
+        ))
+
+        # Shared endpoints are created with the execution role of their endpoint config
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["iam:PassRole"],
+            resources=[
+                "*"
+            ],
+            conditions={"StringEquals": {"iam:PassedToService": "sagemaker.amazonaws.com"}}
+        ))
+
+        # Add policy to lambda to register the autoscaling of managed endpoints once they are created
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=[
+                "application-autoscaling:DescribeScalableTargets",
+                "application-autoscaling:RegisterScalableTarget",
+                "application-autoscaling:DeregisterScalableTarget",
+                "application-autoscaling:PutScalingPolicy",
+                "cloudwatch:PutMetricAlarm",
+                "cloudwatch:PutMetricData",
+                "cloudwatch:DeleteAlarms",
+                "cloudwatch:DescribeAlarms",
+                "sagemaker:DescribeEndpointConfig",
+                "sagemaker:UpdateEndpointWeightsAndCapacities"
+            ],
+            resources=[
+                "*"
+            ],
+        ))
+
+        # Add policy to lambda to keep expired async endpoints until their backlog is processed
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["cloudwatch:GetMetricStatistics"],
             resources=[
                 "*"
             ],
         ))
 
+        # Application autoscaling uses a service linked role to scale endpoints
+        start_endpoint_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["iam:CreateServiceLinkedRole"],
+            resources=[
+                f"arn:aws:iam::{self.account}:role/aws-service-role/sagemaker.application-autoscaling.amazonaws.com/AWSServiceRoleForApplicationAutoScaling_SageMakerEndpoint"
+            ],
+            conditions={"StringLike": {"iam:AWSServiceName": "sagemaker.application-autoscaling.amazonaws.com"}}
+        ))
+
         ssm_arn = f"arn:aws:ssm:{self.region}:{self.account}:parameter/sagemaker/endpoint/expiry/*"
         
         # Add SSM read access
@@ -52,7 +156,13 @@ class EndpointManagerStack(NestedStack):
                 runtime=_lambda.Runtime.PYTHON_3_9,
                 code=_lambda.Code.from_asset("functions/update_expiry"),
                 handler="app.handler",
-                timeout=Duration.seconds(30))
+                timeout=Duration.seconds(30),
+                environment={
+                    "ENDPOINT_STATUS_TABLE_NAME": endpoint_status_table.table_name
+                })
+        self.update_expiry_handler = update_expiry_handler
+        # The expiry api reports whether the endpoints are ready
+        endpoint_status_table.grant_read_data(update_expiry_handler)
 
         # Add SSM read/write policy
         update_expiry_handler.add_to_role_policy(iam.PolicyStatement(
@@ -6,14 +6,22 @@ from aws_cdk import (
     aws_lambda as _lambda,
     aws_apigateway as apigateway,
     aws_sns as sns,
-    aws_s3 as s3
+    aws_s3 as s3,
+    aws_s3_notifications as s3_notifications,
+    aws_sns_subscriptions as sns_subscriptions,
+    aws_dynamodb as dynamodb,
+    aws_events as events,
+    aws_events_targets as targets,
+    RemovalPolicy
 )
 
 from constructs import Construct
 from construct.sagemaker_endpoint_construct import SageMakerEndpointConstruct
 from construct.sagemaker_async_endpoint_construct import SageMakerAsyncEndpointConstruct
+from construct.sagemaker_shared_endpoint_construct import SageMakerSharedEndpointConstruct
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from stack.util import merge_env
 
@@ -27,12 +35,25 @@ from utils.sagemaker_helper import (
 
 from stack.stepfunction_stack import StepFunctionStack
 
+# Jumpstart models whose metadata is looked up at the same time during synth
+MODEL_METADATA_MAX_WORKERS = 16
+
+# Predefined metrics tracked by the autoscaling of realtime endpoints
+REALTIME_SCALING_METRICS = {
+    "invocations": "SageMakerVariantInvocationsPerInstance",
+    "concurrency": "SageMakerVariantConcurrentRequestsPerModelHighResolution"
+}
+
 class FoundationModelStack(NestedStack):
 
-    def __init__(self, scope: Construct, construct_id: str, configs, api_stack, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, configs, api_stack, endpoint_manager_stack, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         step_function_enabled_endpoints = []
+        sync_enabled_endpoints = []
+        async_endpoints = []
+        batch_max_concurrency = {}
+        overflow_handlers = []
 
         # Create policies for model
         role = iam.Role(self, "Gen-AI-SageMaker-Policy", assumed_by=iam.ServicePrincipal("sagemaker.amazonaws.com"))
@@ -77,25 +98,42 @@ class FoundationModelStack(NestedStack):
         role.attach_inline_policy(logs_policy)
         role.attach_inline_policy(ecr_policy)
 
+        self.role = role
+        self.role_policies = [sts_policy, logs_policy, ecr_policy]
+
+        # Shared code for the model invoke lambdas
+        invoke_layer = _lambda.LayerVersion(self, "InvokeUtilsLayer",
+                                            code=_lambda.Code.from_asset("functions/layer"),
+                                            compatible_runtimes=[_lambda.Runtime.PYTHON_3_9])
+
+        # Table tracking in-flight requests and latency of replica endpoints and admitted requests of models
+        router_table = None
+        if any(len(model.get("replicas", [])) > 0 or "admission_control" in model for model in configs.get("jumpstart_models", [])):
+            router_table = dynamodb.Table(self, "RouterStateTable",
+                                          partition_key=dynamodb.Attribute(name="endpoint_name", type=dynamodb.AttributeType.STRING),
+                                          billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                                          removal_policy=RemovalPolicy.DESTROY)
+
+        # Create shared endpoints on which models are packed as inference components
+        shared_endpoints = self._create_shared_endpoints(configs)
+
+        # Look up the metadata of all jumpstart models before creating their resources
+        model_metadata = self._prefetch_model_metadata(configs)
+
+        # The first async model keeps the construct id of the single async endpoint the stack used to deploy,
+        # so that CloudFormation does not replace the named endpoint and endpoint config of existing deployments
+        first_async_model = next((model["name"] for model in configs.get("jumpstart_models", [])
+                                  if model["inference_type"] == "async"), None)
+
         # Deploy jumpstart models
         for model in configs.get("jumpstart_models", []):
-            # Get model info
-            model_info = get_sagemaker_uris(model_id=model["model_id"],
-                                        instance_type=model["inference_instance_type"],
-                                        region_name=configs["region_name"])
-
-            # Get model default environment parameters
-            model_env = sagemaker_env(model_id=model["model_id"],
-                                    region=configs["region_name"],
-                                    model_version="*")
+            # Get model info, default environment parameters and specs
+            metadata = model_metadata[model["name"]]
+            model_info = metadata["model_info"]
+            model_env = metadata["model_env"]
+            model_specs = metadata["model_specs"]
 
             # Get jumpstart model package arn if available
-            model_specs = get_model_spec(
-                                model_id=model["model_id"],
-                                model_version="*",
-                                region=configs["region_name"]
-            )
-
             model_package_arn = get_model_package_arn(
                                 model_specs=model_specs,
                                 region=configs["region_name"]
@@ -103,8 +141,8 @@ class FoundationModelStack(NestedStack):
 
             is_network_isolation_enabled = enable_network_isolation(model_specs=model_specs)
 
-            if model["inference_type"] == "realtime":
-                # Create real-time endpoint
+            if model["inference_type"] in ["realtime", "serverless"]:
+                # Create real-time or serverless endpoint
                 # environment = {
                 #                     "MODEL_CACHE_ROOT": "/opt/ml/model",
                 #                     "SAGEMAKER_ENV": "1",
@@ -126,56 +164,120 @@ class FoundationModelStack(NestedStack):
                                 }
 
                 environment = merge_env(environment, model_env)
-                
-                endpoint = SageMakerEndpointConstruct(self, f'FoundationModelEndpoint-{model["name"]}',
-                                            project_prefix = configs["project_prefix"],
-                                            
-                                            role_arn= role.role_arn,
-
-                                            model_name = model["name"],
-                                            model_bucket_name = model_info["model_bucket_name"],
-                                            model_bucket_key = model_info["model_bucket_key"],
-                                            model_docker_image = model_info["model_docker_image"],
-
-                                            variant_name = "AllTraffic",
-                                            variant_weight = 1,
-                                            instance_count = model.get("inference_instance_count", 1),
-                                            instance_type = model_info["instance_type"],
-
-                                            environment = environment,
-                                            deploy_enable = False,
-                                            model_package_arn=model_package_arn,
-                                            enable_network_isolation=is_network_isolation_enabled
-                )
-                
-                endpoint.node.add_dependency(role)
-                endpoint.node.add_dependency(sts_policy)
-                endpoint.node.add_dependency(logs_policy)
-                endpoint.node.add_dependency(ecr_policy)
 
-                endpoint_name = f'{configs["project_prefix"]}-{model["name"]}-Endpoint'
+                warmup = self._warmup(model)
+                hibernation = self._hibernation(model)
 
-                # Set endpoint expiry
-                now = datetime.utcnow()
-                expiry = now + timedelta(minutes=model["schedule"]["initial_provision_minutes"])
+                inference_component_name = None
+                if "shared_endpoint" in model:
+                    if model["inference_type"] != "realtime" or len(model.get("replicas", [])) > 0 or "autoscaling" in model:
+                        raise ValueError(f'Model {model["name"]} packed on a shared endpoint must be a realtime model without replicas or autoscaling')
+                    if model.get("async_api_enabled", False):
+                        raise ValueError(f'Model {model["name"]} packed on a shared endpoint cannot enable async_api_enabled')
+                    if model["shared_endpoint"] not in shared_endpoints:
+                        raise ValueError(f'Shared endpoint {model["shared_endpoint"]} of model {model["name"]} is not configured')
 
-                expiry_ssm_value = {
-                    "expiry": expiry.strftime("%d-%m-%Y-%H-%M-%S"),
-                    "endpoint_name": endpoint_name,
-                    "endpoint_config_name": endpoint.config.attr_endpoint_config_name
-                }
+                    endpoint_name, inference_component_name = self._model_endpoint(configs, model)
+                    component = model["inference_component"]
+                    shared_endpoints[model["shared_endpoint"]].add_inference_component(
+                                                inference_component_name=inference_component_name,
+                                                model_name=model["name"],
+                                                model_bucket_name=model_info["model_bucket_name"],
+                                                model_bucket_key=model_info["model_bucket_key"],
+                                                model_docker_image=model_info["model_docker_image"],
+                                                environment=environment,
+                                                model_package_arn=model_package_arn,
+                                                enable_network_isolation=is_network_isolation_enabled,
+                                                compute_resource_requirements=self._component_compute_requirements(component),
+                                                copy_count=component.get("copy_count", 1),
+                                                autoscaling=self._component_autoscaling(component.get("autoscaling")),
+                                                warmup=warmup
+                    )
+                elif model["inference_type"] == "serverless":
+                    if len(model.get("replicas", [])) > 0 or "autoscaling" in model:
+                        raise ValueError(f'Serverless model {model["name"]} cannot have replicas or autoscaling')
+
+                    endpoint_name = self._create_serverless_endpoint(configs, model,
+                                                model_info=model_info,
+                                                environment=environment,
+                                                model_package_arn=model_package_arn,
+                                                enable_network_isolation=is_network_isolation_enabled
+                    )
+                else:
+                    autoscaling = self._realtime_autoscaling(model, model.get("autoscaling"))
+
+                    endpoint_name = self._create_realtime_endpoint(configs, model,
+                                                endpoint_model_name=model["name"],
+                                                model_info=model_info,
+                                                instance_count=model.get("inference_instance_count", 1),
+                                                environment=environment,
+                                                model_package_arn=model_package_arn,
+                                                enable_network_isolation=is_network_isolation_enabled,
+                                                autoscaling=autoscaling,
+                                                warmup=warmup,
+                                                hibernation=hibernation,
+                                                hibernation_infos=metadata["hibernation_infos"]
+                    )
 
-                # Create default SSM parameter to manage endpoint
-                expiry_ssm = ssm.StringParameter(self, 
-                                                f"{endpoint_name}-expiry", 
-                                                parameter_name=f"/sagemaker/endpoint/expiry/{endpoint_name}", 
-                                                string_value=json.dumps(expiry_ssm_value))
-                
                 endpoint_arn = f'arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{endpoint_name.lower()}'
                 resource_name = model["integration"]["properties"]["api_resource_name"]
 
+                # Create replica endpoints for the model, the model endpoint is the first replica
+                replicas = [{"endpoint_name": endpoint_name}]
+                replica_arns = [endpoint_arn]
+                replica_role_arns = []
+                # Admission control is limited on the instances serving the model at minimum capacity
+                instance_count = self._min_instance_count(model, model.get("autoscaling"))
+                if inference_component_name is not None:
+                    # Packed models are served by the copies of their inference component
+                    replica_arns.append(f'arn:aws:sagemaker:{self.region}:{self.account}:inference-component/{inference_component_name.lower()}')
+                    component = model["inference_component"]
+                    instance_count = component["autoscaling"].get("min_copy_count", 1) if "autoscaling" in component else component.get("copy_count", 1)
+                for replica in model.get("replicas", []):
+                    if "endpoint_name" in replica:
+                        instance_count += replica.get("inference_instance_count", 1)
+                    else:
+                        instance_count += self._min_instance_count(replica, replica.get("autoscaling", model.get("autoscaling")))
+
+                    if "endpoint_name" in replica:
+                        # Existing endpoint, possibly in another region or account
+                        replicas.append({key: replica[key] for key in ["endpoint_name", "region_name", "role_arn"] if key in replica})
+                        if "role_arn" in replica:
+                            replica_role_arns.append(replica["role_arn"])
+                        else:
+                            replica_arns.append(f'arn:aws:sagemaker:{replica.get("region_name", self.region)}:{self.account}:endpoint/{replica["endpoint_name"].lower()}')
+                    else:
+                        replica_info = metadata["replica_infos"][replica["name"]]
+
+                        replica_endpoint_name = self._create_realtime_endpoint(configs, model,
+                                                    endpoint_model_name=f'{model["name"]}-{replica["name"]}',
+                                                    model_info=replica_info,
+                                                    instance_count=replica.get("inference_instance_count", 1),
+                                                    environment=environment,
+                                                    model_package_arn=model_package_arn,
+                                                    enable_network_isolation=is_network_isolation_enabled,
+                                                    autoscaling=self._realtime_autoscaling(model, replica.get("autoscaling", model.get("autoscaling"))),
+                                                    warmup=warmup,
+                                                    hibernation=hibernation,
+                                                    hibernation_infos=metadata["hibernation_infos"]
+                        )
+                        replicas.append({"endpoint_name": replica_endpoint_name})
+                        replica_arns.append(f'arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{replica_endpoint_name.lower()}')
+
+                if (len(replicas) > 1 or "slo" in model) and model["integration"]["type"] != "lambda":
+                    raise ValueError(f'Model {model["name"]} has replicas or a latency SLO which require a lambda integration')
+
                 if model.get("async_api_enabled", False):
-                    step_function_enabled_endpoints.append(endpoint_arn)
+                    step_function_enabled_endpoints.extend(replica_arns)
+
+                    # Limit concurrent batch invocations of each endpoint
+                    for replica in replicas:
+                        batch_max_concurrency[replica["endpoint_name"]] = model.get("batch", {}).get("max_concurrency", 4)
+
+                    if model.get("sync_api_enabled", False):
+                        sync_enabled_endpoints.extend(replica_arns)
+                elif model.get("sync_api_enabled", False):
+                    raise ValueError(f'Model {model["name"]} must enable async_api_enabled to enable the sync api')
                 
                 # Check integration type
                 if model["integration"]["type"] == "lambda":
@@ -185,17 +287,81 @@ class FoundationModelStack(NestedStack):
                     code=_lambda.Code.from_asset(model["integration"]["properties"]["lambda_src"]),
                     handler="app.handler",
                     timeout=Duration.seconds(180),
+                    layers=[invoke_layer],
                     environment={
                         "ENDPOINT_NAME": endpoint_name,
+                        "MODEL_NAME": model["name"],
                     })
+
+                    if inference_component_name is not None:
+                        app_handler.add_environment("INFERENCE_COMPONENT_NAME", inference_component_name)
+
+                    # Answer requests to endpoints which are not serving from the statuses published by the endpoint manager
+                    app_handler.add_environment("ENDPOINT_STATUS_TABLE_NAME", endpoint_manager_stack.endpoint_status_table.table_name)
+                    endpoint_manager_stack.endpoint_status_table.grant_read_data(app_handler)
             
                     # Add sagemaker invoke permissions    
                     app_handler.add_to_role_policy(iam.PolicyStatement(
                         effect=iam.Effect.ALLOW,
-                        actions=["sagemaker:InvokeEndpoint"],
-                        resources=[endpoint_arn],
+                        actions=["sagemaker:InvokeEndpoint", "sagemaker:DescribeEndpoint", "sagemaker:DescribeInferenceComponent"],
+                        resources=replica_arns,
                     ))
 
+                    if len(replicas) > 1:
+                        # Route requests across replicas
+                        app_handler.add_environment("ENDPOINT_REPLICAS", json.dumps(replicas))
+
+                    if len(replicas) > 1 or "admission_control" in model:
+                        app_handler.add_environment("ROUTER_TABLE_NAME", router_table.table_name)
+                        router_table.grant_read_write_data(app_handler)
+
+                    if "admission_control" in model:
+                        # Limit in-flight requests based on the number of instances serving the model, looked up as it scales
+                        admission_control = model["admission_control"]
+                        app_handler.add_environment("ADMISSION_LIMIT", str(admission_control["max_concurrency_per_instance"] * instance_count))
+                        app_handler.add_environment("ADMISSION_LIMIT_PER_INSTANCE", str(admission_control["max_concurrency_per_instance"]))
+
+                        if admission_control.get("overflow", "reject") == "async":
+                            if not model.get("async_api_enabled", False):
+                                raise ValueError(f'Model {model["name"]} must enable async_api_enabled to overflow to the async api')
+                            overflow_handlers.append(app_handler)
+
+                    if "slo" in model:
+                        # Answer from the fallback model when the model misses its latency deadline
+                        slo = model["slo"]
+                        fallback_model = next((fallback for fallback in configs["jumpstart_models"]
+                                               if fallback["name"] == slo["fallback_model"]), None)
+                        if fallback_model is None or fallback_model["inference_type"] not in ["realtime", "serverless"]:
+                            raise ValueError(f'Fallback model {slo["fallback_model"]} of model {model["name"]} must be a realtime or serverless model')
+
+                        fallback_endpoint_name, fallback_component_name = self._model_endpoint(configs, fallback_model)
+                        fallback_arns = [f'arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{fallback_endpoint_name.lower()}']
+                        app_handler.add_environment("FALLBACK_ENDPOINT_NAME", fallback_endpoint_name)
+                        if fallback_component_name is not None:
+                            app_handler.add_environment("FALLBACK_INFERENCE_COMPONENT_NAME", fallback_component_name)
+                            fallback_arns.append(f'arn:aws:sagemaker:{self.region}:{self.account}:inference-component/{fallback_component_name.lower()}')
+                        app_handler.add_environment("FALLBACK_MODEL_NAME", fallback_model["name"])
+                        app_handler.add_environment("SLO_DEADLINE_SECONDS", str(slo["deadline_seconds"]))
+                        app_handler.add_environment("SLO_HEDGE", "true" if slo.get("hedge", True) else "false")
+                        if "timeout_seconds" in slo:
+                            app_handler.add_environment("SLO_TIMEOUT_SECONDS", str(slo["timeout_seconds"]))
+                        if "request_mapping" in slo:
+                            app_handler.add_environment("FALLBACK_REQUEST_MAPPING", json.dumps(slo["request_mapping"]))
+
+                        app_handler.add_to_role_policy(iam.PolicyStatement(
+                            effect=iam.Effect.ALLOW,
+                            actions=["sagemaker:InvokeEndpoint", "sagemaker:DescribeEndpoint", "sagemaker:DescribeInferenceComponent"],
+                            resources=fallback_arns,
+                        ))
+
+                    if len(replica_role_arns) > 0:
+                        # Allow invoking cross account replicas
+                        app_handler.add_to_role_policy(iam.PolicyStatement(
+                            effect=iam.Effect.ALLOW,
+                            actions=["sts:AssumeRole"],
+                            resources=replica_role_arns,
+                        ))
+
                     post_model_integration = apigateway.LambdaIntegration(app_handler,
                                                                             request_templates={"application/json": '{ "statusCode": "200" }'})
                     # Add lambda to api
@@ -210,9 +376,18 @@ class FoundationModelStack(NestedStack):
                     api_stack.api_gateway_role.add_to_policy(iam.PolicyStatement(
                                                         effect=iam.Effect.ALLOW,
                                                         actions=["sagemaker:InvokeEndpoint"],
-                                                        resources=[endpoint_arn],
+                                                        resources=replica_arns,
                                                     )
                                                 )
+
+                    integration_request_parameters = {
+                        "integration.request.header.Content-Type": "method.request.header.Content-Type",
+                        "integration.request.header.Accept": "method.request.header.Accept",
+                        "integration.request.header.X-Amzn-SageMaker-Custom-Attributes": "method.request.header.X-Amzn-SageMaker-Custom-Attributes"
+                    }
+                    if inference_component_name is not None:
+                        # Invoke the inference component of the model on the shared endpoint
+                        integration_request_parameters["integration.request.header.X-Amzn-SageMaker-Inference-Component"] = f"'{inference_component_name}'"
                     
                     # Add api integration/aws integration
                     resource = api_stack.api.root.add_resource(resource_name)
@@ -221,11 +396,7 @@ class FoundationModelStack(NestedStack):
                                                         integration_http_method="POST",
                                                         path=f"endpoints/{endpoint_name}/invocations",
                                                         options=apigateway.IntegrationOptions(
-                                                            request_parameters={
-                                                                "integration.request.header.Content-Type": "method.request.header.Content-Type",
-                                                                "integration.request.header.Accept": "method.request.header.Accept",
-                                                                "integration.request.header.X-Amzn-SageMaker-Custom-Attributes": "method.request.header.X-Amzn-SageMaker-Custom-Attributes"
-                                                            },
+                                                            request_parameters=integration_request_parameters,
                                                             credentials_role=api_stack.api_gateway_role,
                                                             integration_responses=[
                                                                 apigateway.IntegrationResponse(
@@ -251,6 +422,14 @@ class FoundationModelStack(NestedStack):
                                                             ],
                                                         ),
                                                     )
+                    if "admission_control" in model:
+                        # Throttle requests over the concurrency limit with a 429
+                        admission_control = model["admission_control"]
+                        concurrency_limit = admission_control["max_concurrency_per_instance"] * instance_count
+                        api_stack.add_method_throttling(resource_name, "POST",
+                                                        rate_limit=admission_control.get("rate_limit", concurrency_limit),
+                                                        burst_limit=concurrency_limit)
+
                     resource.add_method("POST", 
                                         post_model_integration, 
                                         authorizer=None if model.get("public") else api_stack.api_authorizer,
@@ -286,7 +465,7 @@ class FoundationModelStack(NestedStack):
                 error_topic = sns.Topic(self, f'{model["name"]}-ErrorTopic',
                                             display_name=f'{model["name"]}-ErrorTopic')
                 
-                sns_policy = iam.Policy(self, "sm-deploy-policy-sns",
+                sns_policy = iam.Policy(self, f'{model["name"]}-sm-deploy-policy-sns',
                                             statements=[iam.PolicyStatement(
                                                 effect=iam.Effect.ALLOW,
                                                 actions=["sns:Publish"],
@@ -297,11 +476,11 @@ class FoundationModelStack(NestedStack):
                 # Create async output bucket
                 s3_async = s3.Bucket(self, f'{model["name"]}-S3Async')
 
-                s3_policy = iam.Policy(self, "sm-deploy-policy-s3",
+                s3_policy = iam.Policy(self, f'{model["name"]}-sm-deploy-policy-s3',
                                             statements=[iam.PolicyStatement(
                                                 effect=iam.Effect.ALLOW,
                                                 actions=["s3:*"],
-                                                resources=[s3_async.bucket_arn]
+                                                resources=[s3_async.bucket_arn, s3_async.arn_for_objects("*")]
                                             )]
                 )
 
@@ -320,7 +499,12 @@ class FoundationModelStack(NestedStack):
 
                 environment = merge_env(environment, model_env)
 
-                endpoint = SageMakerAsyncEndpointConstruct(self, "FoundationModelEndpoint",
+                # Endpoints with a schedule are created and deleted by the endpoint manager
+                is_managed = "schedule" in model
+                endpoint_name = f'{configs["project_prefix"]}-{model["name"]}-Endpoint'
+
+                endpoint_id = "FoundationModelEndpoint" if model["name"] == first_async_model else f'FoundationModelEndpoint-{model["name"]}'
+                endpoint = SageMakerAsyncEndpointConstruct(self, endpoint_id,
                                 project_prefix = configs["project_prefix"],
                                 
                                 role_arn= role.role_arn,
@@ -336,20 +520,554 @@ class FoundationModelStack(NestedStack):
                                 instance_type = model_info["instance_type"],
 
                                 environment = environment,
-                                deploy_enable = True,
+                                deploy_enable = not is_managed,
 
                                 success_topic=success_topic.topic_arn,
                                 error_topic=error_topic.topic_arn,
                                 s3_async_bucket=s3_async.bucket_name,
                                 model_package_arn=model_package_arn,
-                                enable_network_isolation=is_network_isolation_enabled
+                                enable_network_isolation=is_network_isolation_enabled,
+                                max_concurrent_invocations_per_instance=model.get("max_concurrent_invocations_per_instance", 4),
+                                model_data_download_timeout=model.get("model_data_download_timeout"),
+                                container_startup_health_check_timeout=model.get("container_startup_health_check_timeout")
                 )
                 endpoint.node.add_dependency(role)
                 endpoint.node.add_dependency(sts_policy)
                 endpoint.node.add_dependency(logs_policy)
                 endpoint.node.add_dependency(ecr_policy)
 
+                async_endpoints.append({
+                    "endpoint_name": endpoint_name,
+                    "bucket": s3_async,
+                    "success_topic": success_topic,
+                    "error_topic": error_topic,
+                    "wake_minutes": model["schedule"].get("wake_on_backlog_minutes") if is_managed else None
+                })
+
+                autoscaling = None
+                if "autoscaling" in model:
+                    autoscaling = {
+                        "min_capacity": model["autoscaling"].get("min_capacity", 0),
+                        "max_capacity": model["autoscaling"]["max_capacity"],
+                        "target_backlog_per_instance": model["autoscaling"].get("target_backlog_per_instance", 5),
+                        "scale_in_cooldown": model["autoscaling"].get("scale_in_cooldown", 600),
+                        "scale_out_cooldown": model["autoscaling"].get("scale_out_cooldown", 300)
+                    }
+
+                if is_managed:
+                    # Autoscaling is registered by the endpoint manager once it has created the endpoint
+                    self._create_expiry_parameter(model, endpoint_name, endpoint.config.attr_endpoint_config_name,
+                                                  autoscaling=autoscaling,
+                                                  deployment_config=self._deployment_config(model),
+                                                  instances={"instance_type": model_info["instance_type"],
+                                                             "instance_count": model.get("inference_instance_count", 1)},
+                                                  async_inference=True)
+                elif autoscaling is not None:
+                    # Scale the endpoint with its queue backlog
+                    endpoint.add_autoscaling(**autoscaling)
+
+        # The endpoint manager creates the shared endpoints, then their inference components
+        for name, shared_endpoint in shared_endpoints.items():
+            shared_endpoint_config = next(endpoint for endpoint in configs["shared_endpoints"] if endpoint["name"] == name)
+            # A shared endpoint is started with the priority of its most important model, unless it has its own
+            priority = shared_endpoint_config.get("priority", max(self._priority(model) for model in configs["jumpstart_models"]
+                                                                  if model.get("shared_endpoint") == name))
+            self._create_expiry_parameter(dict(shared_endpoint_config, priority=priority),
+                                          f'{configs["project_prefix"]}-{name}-Endpoint',
+                                          shared_endpoint.config.attr_endpoint_config_name,
+                                          inference_components=shared_endpoint.inference_components,
+                                          deployment_config=self._deployment_config(shared_endpoint_config),
+                                          instances={"instance_type": shared_endpoint_config["inference_instance_type"],
+                                                     "instance_count": shared_endpoint_config.get("inference_instance_count", 1)})
+
         if len(step_function_enabled_endpoints) > 0:
             stepfunction_stack = StepFunctionStack(self, "StepFunctionStack",
                                             api_stack = api_stack,
-                                            step_function_enabled_endpoints=step_function_enabled_endpoints)
\ No newline at end of file
+                                            update_expiry_handler=endpoint_manager_stack.update_expiry_handler,
+                                            step_function_enabled_endpoints=step_function_enabled_endpoints,
+                                            batch_max_concurrency=batch_max_concurrency,
+                                            invoke_layer=invoke_layer,
+                                            sync_enabled_endpoints=sync_enabled_endpoints,
+                                            callback_allowed_hosts=configs.get("callback_allowed_hosts"))
+
+            # Start requests over the concurrency limit with the async invoke workflow
+            for app_handler in overflow_handlers:
+                app_handler.add_environment("OVERFLOW_STATE_MACHINE_ARN", stepfunction_stack.state_machine.state_machine_arn)
+                stepfunction_stack.state_machine.grant_start_execution(app_handler)
+
+        if len(async_endpoints) > 0:
+            # Add an api submitting jobs to the async endpoints
+            self._add_async_job_api(api_stack, async_endpoints)
+
+    def _create_shared_endpoints(self, configs):
+        """Creates the configs of the shared endpoints used by models, keyed by shared endpoint name"""
+        used_endpoints = set(model["shared_endpoint"] for model in configs.get("jumpstart_models", []) if "shared_endpoint" in model)
+
+        shared_endpoints = {}
+        for shared_endpoint in configs.get("shared_endpoints", []):
+            if shared_endpoint["name"] not in used_endpoints:
+                continue
+
+            managed_instance_scaling = shared_endpoint.get("managed_instance_scaling", {})
+            endpoint = SageMakerSharedEndpointConstruct(self, f'SharedEndpoint-{shared_endpoint["name"]}',
+                                    role_arn=self.role.role_arn,
+                                    endpoint_name=shared_endpoint["name"],
+                                    variant_name="AllTraffic",
+                                    instance_count=shared_endpoint.get("inference_instance_count", 1),
+                                    instance_type=shared_endpoint["inference_instance_type"],
+                                    min_instance_count=managed_instance_scaling.get("min_instance_count"),
+                                    max_instance_count=managed_instance_scaling.get("max_instance_count"),
+                                    model_data_download_timeout=shared_endpoint.get("model_data_download_timeout"),
+                                    container_startup_health_check_timeout=shared_endpoint.get("container_startup_health_check_timeout")
+            )
+
+            endpoint.node.add_dependency(self.role)
+            for policy in self.role_policies:
+                endpoint.node.add_dependency(policy)
+
+            shared_endpoints[shared_endpoint["name"]] = endpoint
+
+        return shared_endpoints
+
+    @staticmethod
+    def _model_endpoint(configs, model):
+        """Returns the endpoint name of a model and its inference component name, None unless the model is packed on a shared endpoint"""
+        if "shared_endpoint" in model:
+            return f'{configs["project_prefix"]}-{model["shared_endpoint"]}-Endpoint', f'{configs["project_prefix"]}-{model["name"]}-Component'
+
+        return f'{configs["project_prefix"]}-{model["name"]}-Endpoint', None
+
+    @staticmethod
+    def _model_instance_type(configs, model):
+        """Returns the instance type the model is deployed on, which selects its container image"""
+        if "inference_instance_type" in model:
+            return model["inference_instance_type"]
+
+        return next(endpoint["inference_instance_type"] for endpoint in configs.get("shared_endpoints", [])
+                    if endpoint["name"] == model.get("shared_endpoint"))
+
+    @staticmethod
+    def _component_compute_requirements(component):
+        """Returns the compute resources reserved for each copy of an inference component"""
+        compute_resource_requirements = {"MinMemoryRequiredInMb": component["memory_mb"]}
+        if "accelerators" in component:
+            compute_resource_requirements["NumberOfAcceleratorDevicesRequired"] = component["accelerators"]
+        if "cpus" in component:
+            compute_resource_requirements["NumberOfCpuCoresRequired"] = component["cpus"]
+
+        return compute_resource_requirements
+
+    @staticmethod
+    def _component_autoscaling(autoscaling_config):
+        """Returns the autoscaling of the copies of an inference component registered by the endpoint manager"""
+        if autoscaling_config is None:
+            return None
+
+        return {
+            "min_capacity": autoscaling_config.get("min_copy_count", 1),
+            "max_capacity": autoscaling_config["max_copy_count"],
+            "predefined_metric": "SageMakerInferenceComponentInvocationsPerCopy",
+            "target_value": autoscaling_config["target_value"],
+            "scale_in_cooldown": autoscaling_config.get("scale_in_cooldown", 300),
+            "scale_out_cooldown": autoscaling_config.get("scale_out_cooldown", 60)
+        }
+
+    @staticmethod
+    def _resolve_model_metadata(model, region_name, instance_type):
+        """Looks up the uris, default environment and specs of a jumpstart model and its replicas"""
+        # The specs resolve the model version used by the other lookups
+        model_specs = get_model_spec(model_id=model["model_id"],
+                                     model_version="*",
+                                     region=region_name)
+
+        model_info = get_sagemaker_uris(model_id=model["model_id"],
+                                        instance_type=instance_type,
+                                        region_name=region_name)
+
+        model_env = sagemaker_env(model_id=model["model_id"],
+                                  region=region_name,
+                                  model_version="*")
+
+        replica_infos = {}
+        for replica in model.get("replicas", []):
+            if "endpoint_name" not in replica:
+                replica_infos[replica["name"]] = get_sagemaker_uris(model_id=model["model_id"],
+                                                                    instance_type=replica["inference_instance_type"],
+                                                                    region_name=region_name)
+
+        # Cheaper instance types the endpoints of the model hibernate on once expired
+        hibernation_infos = {}
+        for tier in model.get("schedule", {}).get("hibernation", {}).get("tiers", []):
+            if "inference_instance_type" in tier and tier["inference_instance_type"] not in hibernation_infos:
+                hibernation_infos[tier["inference_instance_type"]] = get_sagemaker_uris(model_id=model["model_id"],
+                                                                                        instance_type=tier["inference_instance_type"],
+                                                                                        region_name=region_name)
+
+        return {"model_info": model_info, "model_env": model_env, "model_specs": model_specs, "replica_infos": replica_infos,
+                "hibernation_infos": hibernation_infos}
+
+    def _prefetch_model_metadata(self, configs):
+        """Looks up the metadata of the jumpstart models concurrently, keyed by model name"""
+        models = configs.get("jumpstart_models", [])
+        if len(models) == 0:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(len(models), MODEL_METADATA_MAX_WORKERS)) as executor:
+            futures = {model["name"]: executor.submit(self._resolve_model_metadata, model, configs["region_name"],
+                                                      self._model_instance_type(configs, model))
+                       for model in models}
+
+            return {name: future.result() for name, future in futures.items()}
+
+    @staticmethod
+    def _min_instance_count(model, autoscaling_config):
+        """Returns the fewest instances a realtime endpoint of a model or replica is scaled in to"""
+        if autoscaling_config is None:
+            return model.get("inference_instance_count", 1)
+        return autoscaling_config.get("min_capacity", 1)
+
+    @staticmethod
+    def _realtime_autoscaling(model, autoscaling_config):
+        """Returns the autoscaling registered by the endpoint manager for a realtime endpoint, None without autoscaling"""
+        if autoscaling_config is None:
+            return None
+
+        metric = autoscaling_config.get("metric", "invocations")
+        if metric not in REALTIME_SCALING_METRICS:
+            raise ValueError(f'Autoscaling metric of model {model["name"]} must be one of {", ".join(REALTIME_SCALING_METRICS)}')
+
+        min_capacity = autoscaling_config.get("min_capacity", 1)
+        if min_capacity < 1:
+            raise ValueError(f'Autoscaling min_capacity of realtime model {model["name"]} must be at least 1')
+
+        return {
+            "min_capacity": min_capacity,
+            "max_capacity": autoscaling_config["max_capacity"],
+            "predefined_metric": REALTIME_SCALING_METRICS[metric],
+            "target_value": autoscaling_config["target_value"],
+            "scale_in_cooldown": autoscaling_config.get("scale_in_cooldown", 300),
+            "scale_out_cooldown": autoscaling_config.get("scale_out_cooldown", 60)
+        }
+
+    def _create_realtime_endpoint(self, configs, model, endpoint_model_name, model_info, instance_count,
+                                  environment, model_package_arn, enable_network_isolation, autoscaling=None, warmup=None,
+                                  hibernation=None, hibernation_infos=None):
+        """Creates a real-time endpoint config managed by the endpoint manager, returns the endpoint name"""
+        endpoint_config_name = self._create_managed_endpoint_config(configs, model,
+                                    endpoint_model_name=endpoint_model_name,
+                                    model_info=model_info,
+                                    instance_count=instance_count,
+                                    environment=environment,
+                                    model_package_arn=model_package_arn,
+                                    enable_network_isolation=enable_network_isolation)
+
+        if hibernation is not None:
+            # Tiers on a cheaper instance type are rolled out to the expired endpoint with an endpoint config of their own
+            tiers = []
+            for index, tier in enumerate(hibernation["tiers"]):
+                tier = dict(tier)
+                if "instance_type" in tier:
+                    tier["endpoint_config_name"] = self._create_managed_endpoint_config(configs, model,
+                                    endpoint_model_name=f'{endpoint_model_name}-Hibernation{index}',
+                                    model_info=hibernation_infos[tier["instance_type"]],
+                                    instance_count=tier["instance_count"],
+                                    environment=environment,
+                                    model_package_arn=model_package_arn,
+                                    enable_network_isolation=enable_network_isolation)
+                tiers.append(tier)
+            hibernation = dict(hibernation, tiers=tiers)
+
+        endpoint_name = f'{configs["project_prefix"]}-{endpoint_model_name}-Endpoint'
+        # Autoscaling is registered by the endpoint manager once it has created the endpoint
+        self._create_expiry_parameter(model, endpoint_name, endpoint_config_name,
+                                      autoscaling=autoscaling,
+                                      deployment_config=self._deployment_config(model),
+                                      warmup=warmup,
+                                      instances={"instance_type": model_info["instance_type"], "instance_count": instance_count},
+                                      hibernation=hibernation)
+
+        return endpoint_name
+
+    def _create_managed_endpoint_config(self, configs, model, endpoint_model_name, model_info, instance_count,
+                                        environment, model_package_arn, enable_network_isolation):
+        """Creates the model and endpoint config of an endpoint deployed by the endpoint manager, returns the endpoint config name"""
+        endpoint = SageMakerEndpointConstruct(self, f'FoundationModelEndpoint-{endpoint_model_name}',
+                                    project_prefix = configs["project_prefix"],
+                                    
+                                    role_arn= self.role.role_arn,
+
+                                    model_name = endpoint_model_name,
+                                    model_bucket_name = model_info["model_bucket_name"],
+                                    model_bucket_key = model_info["model_bucket_key"],
+                                    model_docker_image = model_info["model_docker_image"],
+
+                                    variant_name = "AllTraffic",
+                                    variant_weight = 1,
+                                    instance_count = instance_count,
+                                    instance_type = model_info["instance_type"],
+
+                                    environment = environment,
+                                    deploy_enable = False,
+                                    model_package_arn=model_package_arn,
+                                    enable_network_isolation=enable_network_isolation,
+                                    model_data_download_timeout=model.get("model_data_download_timeout"),
+                                    container_startup_health_check_timeout=model.get("container_startup_health_check_timeout")
+        )
+        
+        endpoint.node.add_dependency(self.role)
+        for policy in self.role_policies:
+            endpoint.node.add_dependency(policy)
+
+        return endpoint.config.attr_endpoint_config_name
+
+    def _create_serverless_endpoint(self, configs, model, model_info, environment, model_package_arn, enable_network_isolation):
+        """Creates a serverless endpoint deployed with the stack, returns the endpoint name"""
+        serverless = model.get("serverless", {})
+        serverless_config = {
+            "memory_size_in_mb": serverless.get("memory_size_in_mb", 4096),
+            "max_concurrency": serverless.get("max_concurrency", 5),
+            "provisioned_concurrency": serverless.get("provisioned_concurrency")
+        }
+
+        endpoint = SageMakerEndpointConstruct(self, f'FoundationModelEndpoint-{model["name"]}',
+                                    project_prefix = configs["project_prefix"],
+
+                                    role_arn= self.role.role_arn,
+
+                                    model_name = model["name"],
+                                    model_bucket_name = model_info["model_bucket_name"],
+                                    model_bucket_key = model_info["model_bucket_key"],
+                                    model_docker_image = model_info["model_docker_image"],
+
+                                    variant_name = "AllTraffic",
+                                    variant_weight = 1,
+                                    instance_count = None,
+                                    instance_type = None,
+
+                                    environment = environment,
+                                    deploy_enable = True,
+                                    model_package_arn=model_package_arn,
+                                    enable_network_isolation=enable_network_isolation,
+                                    serverless_config=serverless_config
+        )
+
+        endpoint.node.add_dependency(self.role)
+        for policy in self.role_policies:
+            endpoint.node.add_dependency(policy)
+
+        return f'{configs["project_prefix"]}-{model["name"]}-Endpoint'
+
+    @staticmethod
+    def _warmup(model):
+        """Returns the requests sent by the endpoint manager to a new endpoint before it is ready, None without warm-up"""
+        if "warmup" not in model:
+            return None
+
+        if model["inference_type"] != "realtime":
+            raise ValueError(f'Model {model["name"]} must be a realtime model to be warmed up')
+
+        warmup = model["warmup"]
+        return {
+            # Payloads are sent as is, serialize them once at synth time
+            "payloads": [payload if isinstance(payload, str) else json.dumps(payload) for payload in warmup["payloads"]],
+            "content_type": warmup.get("content_type", "application/json"),
+            "repeat": warmup.get("repeat", 1)
+        }
+
+    @staticmethod
+    def _deployment_config(model):
+        """Returns how the endpoint manager rolls out a new endpoint config to a running endpoint, None for the default all at once blue/green deployment"""
+        if "deployment" not in model:
+            return None
+
+        deployment = model["deployment"]
+        strategy = deployment.get("strategy", "all_at_once")
+        wait_interval = deployment.get("wait_interval_seconds", 300)
+        step_size = {"Type": "CAPACITY_PERCENT", "Value": deployment.get("step_percent", 25)}
+
+        if strategy == "rolling":
+            # Replace instances in batches, without provisioning a second fleet
+            return {
+                "RollingUpdatePolicy": {
+                    "MaximumBatchSize": step_size,
+                    "WaitIntervalInSeconds": wait_interval
+                }
+            }
+
+        traffic_routing = {"Type": strategy.upper(), "WaitIntervalInSeconds": wait_interval}
+        if strategy == "canary":
+            traffic_routing["CanarySize"] = step_size
+        elif strategy == "linear":
+            traffic_routing["LinearStepSize"] = step_size
+        elif strategy != "all_at_once":
+            raise ValueError(f'Deployment strategy of {model["name"]} must be one of all_at_once, canary, linear, rolling')
+
+        return {
+            "BlueGreenUpdatePolicy": {
+                "TrafficRoutingConfiguration": traffic_routing,
+                "TerminationWaitInSeconds": deployment.get("termination_wait_seconds", 0)
+            }
+        }
+
+    @staticmethod
+    def _priority(model):
+        """Returns the priority of a model, endpoints of higher priority models are started first when instances are scarce"""
+        priority = model.get("priority", 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError(f'Priority of {model["name"]} must be an integer')
+        return priority
+
+    @staticmethod
+    def _hibernation(model):
+        """Returns the tiers an expired endpoint is scaled down through before it is deleted, None to delete it at expiry"""
+        hibernation = model.get("schedule", {}).get("hibernation")
+        if hibernation is None:
+            return None
+
+        if model["inference_type"] != "realtime" or "shared_endpoint" in model:
+            raise ValueError(f'Model {model["name"]} must be a realtime model with its own endpoint to hibernate')
+
+        tiers = hibernation.get("tiers", [])
+        after_minutes = [tier.get("after_minutes", 0) for tier in tiers]
+        if len(tiers) == 0 or after_minutes[0] != 0:
+            raise ValueError(f'Hibernation of {model["name"]} must have tiers, the first one applying at expiry')
+        if after_minutes != sorted(after_minutes) or after_minutes[-1] >= hibernation["delete_after_minutes"]:
+            raise ValueError(f'Hibernation tiers of {model["name"]} must be in order of after_minutes, before delete_after_minutes')
+
+        normalized_tiers = []
+        for tier in tiers:
+            instance_count = tier.get("inference_instance_count", 1)
+            # Realtime endpoints cannot be scaled to zero instances
+            if instance_count < 1:
+                raise ValueError(f'Hibernation tiers of {model["name"]} must keep at least 1 instance')
+            normalized_tier = {"after_minutes": tier.get("after_minutes", 0), "instance_count": instance_count}
+            if "inference_instance_type" in tier:
+                normalized_tier["instance_type"] = tier["inference_instance_type"]
+            normalized_tiers.append(normalized_tier)
+
+        return {"tiers": normalized_tiers, "delete_after_minutes": hibernation["delete_after_minutes"]}
+
+    def _create_expiry_parameter(self, model, endpoint_name, endpoint_config_name, autoscaling=None, inference_components=None,
+                                 deployment_config=None, warmup=None, instances=None, hibernation=None, async_inference=False):
+        """Creates the SSM parameter through which the endpoint manager starts and stops the endpoint"""
+        # Set endpoint expiry
+        now = datetime.utcnow()
+        expiry = now + timedelta(minutes=model["schedule"]["initial_provision_minutes"])
+
+        expiry_ssm_value = {
+            "expiry": expiry.strftime("%d-%m-%Y-%H-%M-%S"),
+            "endpoint_name": endpoint_name,
+            "endpoint_config_name": endpoint_config_name,
+            "priority": self._priority(model)
+        }
+
+        # Instances the endpoint is created with, counted against the instance quotas by the endpoint manager
+        if instances is not None:
+            expiry_ssm_value["instances"] = instances
+
+        if autoscaling is not None:
+            expiry_ssm_value["autoscaling"] = autoscaling
+
+        if inference_components is not None:
+            expiry_ssm_value["inference_components"] = inference_components
+
+        if deployment_config is not None:
+            expiry_ssm_value["deployment_config"] = deployment_config
+
+        if warmup is not None:
+            expiry_ssm_value["warmup"] = warmup
+
+        if hibernation is not None:
+            expiry_ssm_value["hibernation"] = hibernation
+
+        # An expired async endpoint is deleted once its queued requests are processed
+        if async_inference:
+            expiry_ssm_value["async_inference"] = True
+
+        # Create default SSM parameter to manage endpoint, the value may not fit in a standard parameter (i.e. with
+        # warm-up payloads, hibernation tiers or inference components), intelligent tiering keeps it standard when it fits
+        ssm.StringParameter(self, 
+                            f"{endpoint_name}-expiry", 
+                            parameter_name=f"/sagemaker/endpoint/expiry/{endpoint_name}", 
+                            string_value=json.dumps(expiry_ssm_value),
+                            tier=ssm.ParameterTier.INTELLIGENT_TIERING)
+
+    def _add_async_job_api(self, api_stack, async_endpoints):
+        """Adds an api staging and submitting jobs to the async endpoints, with their results recorded from the endpoint notifications"""
+        wake_endpoints = {endpoint["endpoint_name"]: endpoint["wake_minutes"]
+                          for endpoint in async_endpoints if endpoint["wake_minutes"] is not None}
+
+        # Create an async job index
+        async_job_table = dynamodb.Table(self, "AsyncJobTable",
+                                         partition_key=dynamodb.Attribute(name="job_id", type=dynamodb.AttributeType.STRING),
+                                         billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                                         time_to_live_attribute="expires_at",
+                                         removal_policy=RemovalPolicy.DESTROY)
+        async_job_table.add_global_secondary_index(index_name="status-index",
+                                                   partition_key=dynamodb.Attribute(name="status", type=dynamodb.AttributeType.STRING),
+                                                   sort_key=dynamodb.Attribute(name="submitted_at", type=dynamodb.AttributeType.STRING))
+
+        # Create a lambda staging and submitting async jobs, and looking them up
+        async_job_handler = _lambda.Function(self, "AsyncJobHandler",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset("functions/async_job"),
+                handler="app.handler",
+                timeout=Duration.seconds(60),
+                environment={
+                    "ASYNC_JOB_TABLE_NAME": async_job_table.table_name,
+                    "ASYNC_ENDPOINTS": json.dumps({endpoint["endpoint_name"]: endpoint["bucket"].bucket_name
+                                                   for endpoint in async_endpoints}),
+                    "WAKE_ENDPOINTS": json.dumps(wake_endpoints)
+                })
+        async_job_table.grant_read_write_data(async_job_handler)
+
+        async_job_handler.add_to_role_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["sagemaker:InvokeEndpointAsync"],
+            resources=[f'arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{endpoint["endpoint_name"].lower()}'
+                       for endpoint in async_endpoints],
+        ))
+
+        if len(wake_endpoints) > 0:
+            # Wake up managed endpoints with queued jobs, and submit the jobs once they are InService
+            async_job_handler.add_to_role_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["ssm:GetParameter", "ssm:PutParameter"],
+                resources=[f"arn:aws:ssm:{self.region}:{self.account}:parameter/sagemaker/endpoint/expiry/{endpoint_name}"
+                           for endpoint_name in wake_endpoints],
+            ))
+
+            events.Rule(self, "SubmitQueuedAsyncJobsRule",
+                        description="Submit queued async jobs",
+                        schedule=events.Schedule.rate(Duration.minutes(1)),
+                        targets=[targets.LambdaFunction(handler=async_job_handler)])
+
+        # Create a lambda recording the results of async jobs
+        async_result_handler = _lambda.Function(self, "AsyncResultHandler",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset("functions/async_result"),
+                handler="app.handler",
+                timeout=Duration.seconds(30),
+                environment={
+                    "ASYNC_JOB_TABLE_NAME": async_job_table.table_name
+                })
+        async_job_table.grant_read_write_data(async_result_handler)
+
+        for endpoint in async_endpoints:
+            bucket = endpoint["bucket"]
+            bucket.grant_read_write(async_job_handler)
+
+            # Submit jobs uploaded with a presigned url
+            bucket.add_event_notification(s3.EventType.OBJECT_CREATED,
+                                          s3_notifications.LambdaDestination(async_job_handler),
+                                          s3.NotificationKeyFilter(prefix="async_inference_uploads/"))
+
+            # Record job results from the async inference notifications
+            endpoint["success_topic"].add_subscription(sns_subscriptions.LambdaSubscription(async_result_handler))
+            endpoint["error_topic"].add_subscription(sns_subscriptions.LambdaSubscription(async_result_handler))
+
+        # Add lambda to api
+        async_job_integration = apigateway.LambdaIntegration(async_job_handler)
+        resource = api_stack.api.root.add_resource("asyncjobs")
+        resource.add_method("POST", async_job_integration, authorizer=api_stack.api_authorizer)
+        resource.add_method("GET", async_job_integration, authorizer=api_stack.api_authorizer)
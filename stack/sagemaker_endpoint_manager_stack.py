@@ -21,13 +21,15 @@ class SagemakerEndpointManagerStack(Stack):
 
         # Deploy endpoint manager stack
         endpoint_manager_stack = EndpointManagerStack(self, "EndpointManagerStack", 
-                    api_stack = api_stack
+                    api_stack = api_stack,
+                    configs=configs
         )
 
         # Deploy model stack
         fm_stack = FoundationModelStack(self, "ModelStack", 
                                 configs=configs,
-                                api_stack=api_stack
+                                api_stack=api_stack,
+                                endpoint_manager_stack=endpoint_manager_stack
         )
 
         CfnOutput(self, "APIURL",
@@ -1,33 +1,77 @@
 from aws_cdk import (
+    Duration,
     NestedStack,
+    RemovalPolicy,
     aws_apigateway as apigateway,
     aws_stepfunctions as sfn,
     aws_iam as iam,
+    aws_s3 as s3,
+    aws_dynamodb as dynamodb,
+    aws_lambda as _lambda,
+    aws_lambda_event_sources as lambda_event_sources,
 )
 
 from constructs import Construct
 
+import json
+
+# The synchronous workflow must answer within the 29 seconds api gateway integration timeout,
+# it times out before so that the api answers with a 504, its waits and retries take at most 19 seconds
+SYNC_TIMEOUT_SECONDS = 28
+SYNC_READINESS_WAIT_SECONDS = 4
+SYNC_READINESS_MAX_ATTEMPTS = 4
+SYNC_RETRY_INTERVAL_SECONDS = 1
+SYNC_RETRY_BACKOFF_RATE = 1
+SYNC_RETRY_MAX_ATTEMPTS = 1
+
+# States of the invoke workflow indexing jobs, skipped by the synchronous workflow
+JOB_STATES = ["RecordJobStarted", "CheckCallback", "RecordJobCallback", "StoreResult", "RecordJobSucceeded", "RecordJobSucceededWithoutResult", "RecordJobFailed"]
+
 class StepFunctionStack(NestedStack):
-    def __init__(self, scope: Construct, construct_id: str, api_stack, step_function_enabled_endpoints, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, api_stack, update_expiry_handler, step_function_enabled_endpoints, batch_max_concurrency, invoke_layer, sync_enabled_endpoints=None, callback_allowed_hosts=None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         # Create a step function execution role
         role = iam.Role(self, "StepfunctionExecutionRole", assumed_by=iam.ServicePrincipal("states.amazonaws.com"))
 
-        # Add permission to role to invoke Amazon SageMaker real time endpoint
+        # Add permission to role to invoke Amazon SageMaker real time endpoint and wait for it to be InService
         role.add_to_policy(
             iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
-                actions=["sagemaker:InvokeEndpoint"],
+                actions=["sagemaker:InvokeEndpoint", "sagemaker:DescribeEndpoint"],
                 resources=step_function_enabled_endpoints
             )
         )
 
+        # Add permission to wake up expired endpoints by extending their expiry
+        update_expiry_handler.grant_invoke(role)
+
+        # Create a bucket for batch and job results
+        batch_bucket = s3.Bucket(self, "BatchBucket",
+                                 removal_policy=RemovalPolicy.DESTROY,
+                                 auto_delete_objects=True)
+        batch_bucket.grant_read_write(role)
+
+        # Create a job index written by the invoke workflow
+        job_table = dynamodb.Table(self, "JobTable",
+                                   partition_key=dynamodb.Attribute(name="job_id", type=dynamodb.AttributeType.STRING),
+                                   billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+                                   stream=dynamodb.StreamViewType.NEW_IMAGE,
+                                   removal_policy=RemovalPolicy.DESTROY)
+        job_table.grant_write_data(role)
+        self.job_table = job_table
+
         # Create an Amazon SageMaker invoke state machine
         sagemaker_invoke_fnc = sfn.StateMachine(self, "SageMakerInvokeStepfunction",
             definition_body=sfn.DefinitionBody.from_file("config/sagemaker-invoke.json"),
+            definition_substitutions={
+                "UpdateExpiryFunction": update_expiry_handler.function_arn,
+                "JobTable": job_table.table_name,
+                "ResultsBucket": batch_bucket.bucket_name
+            },
             role=role
         )
+        self.state_machine = sagemaker_invoke_fnc
        
         # Add permission to invoke step function
         api_stack.api_gateway_role.add_to_policy(
@@ -38,38 +82,116 @@ class StepFunctionStack(NestedStack):
             )
         )
 
+        # Create an Amazon SageMaker batch invoke state machine
+        with open("config/sagemaker-batch-invoke.json", encoding="UTF-8") as file:
+            batch_definition = json.load(file)
+
+        # Set the max concurrency of the batches of each endpoint, Map concurrency is limited per execution
+        # so concurrent batches of the same endpoint add up
+        batch_states = batch_definition["States"]
+        for index, (endpoint_name, max_concurrency) in enumerate(batch_max_concurrency.items()):
+            batch_states["SelectMaxConcurrency"]["Choices"].append({
+                "Variable": "$.endpointname",
+                "StringEquals": endpoint_name,
+                "Next": f"MaxConcurrency{index}"
+            })
+            batch_states[f"MaxConcurrency{index}"] = {
+                "Type": "Pass",
+                "Result": max_concurrency,
+                "ResultPath": "$.max_concurrency",
+                "Next": "CheckInputType"
+            }
+
+        # Merge the results of batches run with a distributed map into a single file in prompt order
+        merge_results_handler = _lambda.Function(self, "MergeBatchResultsHandler",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset("functions/merge_batch_results"),
+                handler="app.handler",
+                timeout=Duration.minutes(5),
+                memory_size=1024)
+        batch_bucket.grant_read_write(merge_results_handler)
+        merge_results_handler.grant_invoke(role)
+
+        sagemaker_batch_invoke_fnc = sfn.StateMachine(self, "SageMakerBatchInvokeStepfunction",
+            definition_body=sfn.DefinitionBody.from_string(json.dumps(batch_definition)),
+            definition_substitutions={
+                "ResultsBucket": batch_bucket.bucket_name,
+                "MergeResultsFunction": merge_results_handler.function_arn
+            },
+            role=role
+        )
+        self.batch_state_machine = sagemaker_batch_invoke_fnc
+
+        # Add permission to run distributed map child executions, in a separate policy to avoid a circular dependency
+        batch_execution_arn = f'arn:aws:states:{self.region}:{self.account}:execution:{sagemaker_batch_invoke_fnc.state_machine_name}/*'
+        iam.Policy(self, "BatchDistributedMapPolicy",
+                   roles=[role],
+                   statements=[
+                       iam.PolicyStatement(
+                           effect=iam.Effect.ALLOW,
+                           actions=["states:StartExecution"],
+                           resources=[sagemaker_batch_invoke_fnc.state_machine_arn]
+                       ),
+                       iam.PolicyStatement(
+                           effect=iam.Effect.ALLOW,
+                           actions=["states:DescribeExecution", "states:StopExecution"],
+                           resources=[batch_execution_arn]
+                       )
+                   ])
+
+        api_stack.api_gateway_role.add_to_policy(
+            iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["states:StartExecution"],
+            resources=[sagemaker_batch_invoke_fnc.state_machine_arn]
+            )
+        )
+
         # Add permission to get describe step function execution
-        stepfunction_execution_arn = f'arn:aws:states:{self.region}:{self.account}:execution:{sagemaker_invoke_fnc.state_machine_name}:*'
+        stepfunction_execution_arns = [
+            f'arn:aws:states:{self.region}:{self.account}:execution:{sagemaker_invoke_fnc.state_machine_name}:*',
+            f'arn:aws:states:{self.region}:{self.account}:execution:{sagemaker_batch_invoke_fnc.state_machine_name}:*'
+        ]
 
         api_stack.api_gateway_role.add_to_policy(
             iam.PolicyStatement(
                 effect=iam.Effect.ALLOW,
                 actions=["states:DescribeExecution"],
-                resources=[stepfunction_execution_arn]
+                resources=stepfunction_execution_arns
             )
         )
 
         # Add api integration with step function
-        start_execution_resource = api_stack.api.root.add_resource("startexecution")
+        self._add_start_execution_resource(api_stack, "startexecution", sagemaker_invoke_fnc)
 
-        # Add apigateway integration with step function using with sagemaker_invoke_fnc state machine arn
-        start_execution_integration = apigateway.AwsIntegration(
+        # Add api integration with batch step function
+        self._add_start_execution_resource(api_stack, "batchexecution", sagemaker_batch_invoke_fnc)
+
+        if sync_enabled_endpoints:
+            self._add_sync_execution(api_stack, update_expiry_handler, sync_enabled_endpoints)
+
+        self._add_job_resources(api_stack, job_table, batch_bucket, invoke_layer, callback_allowed_hosts or [])
+
+        # Add api integration with step function to get step function execution status
+        describe_execution_resource = api_stack.api.root.add_resource("describeexecution")
+
+        # Add apigateway integration with step function to get step function execution status
+        describe_execution_integration = apigateway.AwsIntegration(
             service="states",
             integration_http_method="POST",
-            action="StartExecution",
+            action="DescribeExecution",
             options=apigateway.IntegrationOptions(
                 credentials_role=api_stack.api_gateway_role,
                 integration_responses=[
                                         apigateway.IntegrationResponse(
                                             status_code="200",
                                         )
-                                    ],
-                request_templates={"application/json": "{ \"stateMachineArn\": \""+sagemaker_invoke_fnc.state_machine_arn+"\", \"input\": \"$util.escapeJavaScript($input.json('$'))\" }" }
+                ]
             )
         )
 
-        start_execution_resource.add_method("POST",
-                                            start_execution_integration,
+        describe_execution_resource.add_method("POST",
+                                            describe_execution_integration,
                                             authorizer=api_stack.api_authorizer,
                                             method_responses=[
                                                                 apigateway.MethodResponse(
@@ -93,26 +215,203 @@ class StepFunctionStack(NestedStack):
                                                             ]
         )
 
-        # Add api integration with step function to get step function execution status
-        describe_execution_resource = api_stack.api.root.add_resource("describeexecution")
+    def _add_job_resources(self, api_stack, job_table, results_bucket, invoke_layer, callback_allowed_hosts):
+        """Adds the job lookup api and the completion callbacks of the job index"""
+        job_status_handler = _lambda.Function(self, "JobStatusHandler",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset("functions/job_status"),
+                handler="app.handler",
+                timeout=Duration.seconds(30),
+                layers=[invoke_layer],
+                environment={
+                    "JOB_TABLE_NAME": job_table.table_name
+                })
+        job_table.grant_read_data(job_status_handler)
+        results_bucket.grant_read(job_status_handler)
 
-        # Add apigateway integration with step function to get step function execution status
-        describe_execution_integration = apigateway.AwsIntegration(
+        # Add lambda to api
+        job_status_integration = apigateway.LambdaIntegration(job_status_handler)
+        resource = api_stack.api.root.add_resource("jobs")
+        resource.add_method("GET", job_status_integration, authorizer=api_stack.api_authorizer)
+
+        # Send completed jobs to their callback url
+        job_callback_handler = _lambda.Function(self, "JobCallbackHandler",
+                runtime=_lambda.Runtime.PYTHON_3_9,
+                code=_lambda.Code.from_asset("functions/job_callback"),
+                handler="app.handler",
+                timeout=Duration.seconds(60),
+                layers=[invoke_layer],
+                environment={
+                    "JOB_TABLE_NAME": job_table.table_name,
+                    "CALLBACK_ALLOWED_HOSTS": json.dumps(callback_allowed_hosts)
+                })
+        results_bucket.grant_read(job_callback_handler)
+        # Record the delivery of the callbacks on the jobs
+        job_table.grant_write_data(job_callback_handler)
+
+        job_callback_handler.add_event_source(lambda_event_sources.DynamoEventSource(job_table,
+            starting_position=_lambda.StartingPosition.LATEST,
+            batch_size=10,
+            retry_attempts=2,
+            filters=[_lambda.FilterCriteria.filter({
+                "eventName": _lambda.FilterRule.is_equal("MODIFY"),
+                "dynamodb": {
+                    "NewImage": {
+                        "callback_url": {"S": _lambda.FilterRule.exists()},
+                        "status": {"S": _lambda.FilterRule.or_("SUCCEEDED", "FAILED")},
+                        # Recording the delivery modifies the job again
+                        "callback_status": _lambda.FilterRule.not_exists()
+                    }
+                }
+            })]
+        ))
+
+    @staticmethod
+    def _without_job_states(definition):
+        """Returns the invoke workflow definition with the job index states bypassed"""
+        states = definition["States"]
+
+        def next_state(name):
+            while name in JOB_STATES:
+                name = states[name].get("Next", states[name].get("Default"))
+            return name
+
+        # Point transitions into job states at the first state after them
+        redirects = {name: next_state(name) for name in JOB_STATES}
+        for name in JOB_STATES:
+            del states[name]
+
+        definition["StartAt"] = redirects.get(definition["StartAt"], definition["StartAt"])
+        for state in states.values():
+            if "Next" in state:
+                state["Next"] = redirects.get(state["Next"], state["Next"])
+            if "Default" in state:
+                state["Default"] = redirects.get(state["Default"], state["Default"])
+            for rule in state.get("Choices", []) + state.get("Catch", []):
+                rule["Next"] = redirects.get(rule["Next"], rule["Next"])
+
+        return definition
+
+    @staticmethod
+    def _sync_definition(definition):
+        """Returns the invoke workflow definition without job states, with its readiness polling and retries shortened to fit in SYNC_TIMEOUT_SECONDS"""
+        definition = StepFunctionStack._without_job_states(definition)
+        states = definition["States"]
+        states["WaitForEndpoint"]["Seconds"] = SYNC_READINESS_WAIT_SECONDS
+        states["CheckReadinessAttempts"]["Choices"][0]["NumericGreaterThanEquals"] = SYNC_READINESS_MAX_ATTEMPTS
+        for state in states.values():
+            for retry in state.get("Retry", []):
+                retry["IntervalSeconds"] = min(retry.get("IntervalSeconds", 1), SYNC_RETRY_INTERVAL_SECONDS)
+                retry["BackoffRate"] = min(retry.get("BackoffRate", 2), SYNC_RETRY_BACKOFF_RATE)
+                retry["MaxAttempts"] = min(retry.get("MaxAttempts", 3), SYNC_RETRY_MAX_ATTEMPTS)
+
+        definition["TimeoutSeconds"] = SYNC_TIMEOUT_SECONDS
+        return definition
+
+    def _add_sync_execution(self, api_stack, update_expiry_handler, sync_enabled_endpoints):
+        """Adds an express invoke state machine returning the model output in the api response"""
+        role = iam.Role(self, "SyncStepfunctionExecutionRole", assumed_by=iam.ServicePrincipal("states.amazonaws.com"))
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["sagemaker:InvokeEndpoint", "sagemaker:DescribeEndpoint"],
+                resources=sync_enabled_endpoints
+            )
+        )
+        update_expiry_handler.grant_invoke(role)
+
+        # Use the invoke workflow with shorter readiness polling and retries
+        with open("config/sagemaker-invoke.json", encoding="UTF-8") as file:
+            sync_definition = json.load(file)
+
+        sync_definition = self._sync_definition(sync_definition)
+
+        sagemaker_sync_invoke_fnc = sfn.StateMachine(self, "SageMakerSyncInvokeStepfunction",
+            definition_body=sfn.DefinitionBody.from_string(json.dumps(sync_definition)),
+            definition_substitutions={"UpdateExpiryFunction": update_expiry_handler.function_arn},
+            state_machine_type=sfn.StateMachineType.EXPRESS,
+            timeout=Duration.seconds(SYNC_TIMEOUT_SECONDS),
+            role=role
+        )
+        self.sync_state_machine = sagemaker_sync_invoke_fnc
+
+        api_stack.api_gateway_role.add_to_policy(
+            iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["states:StartSyncExecution"],
+            resources=[sagemaker_sync_invoke_fnc.state_machine_arn]
+            )
+        )
+
+        sync_execution_resource = api_stack.api.root.add_resource("syncexecution")
+
+        # Return the model output of successful executions, otherwise the execution error
+        response_template = """#set($execution = $input.path('$'))
+#if($execution.status == "SUCCEEDED")
+$util.parseJson($execution.output).Body
+#else
+#if($execution.error == "EndpointNotReady")
+#set($context.responseOverride.status = 503)
+#elseif($execution.status == "TIMED_OUT")
+#set($context.responseOverride.status = 504)
+#else
+#set($context.responseOverride.status = 500)
+#end
+{"error": "$util.escapeJavaScript($execution.error)", "cause": "$util.escapeJavaScript($execution.cause)"}
+#end"""
+
+        sync_execution_integration = apigateway.AwsIntegration(
             service="states",
             integration_http_method="POST",
-            action="DescribeExecution",
+            action="StartSyncExecution",
             options=apigateway.IntegrationOptions(
                 credentials_role=api_stack.api_gateway_role,
                 integration_responses=[
                                         apigateway.IntegrationResponse(
                                             status_code="200",
+                                            response_templates={"application/json": response_template}
                                         )
-                ]
+                                    ],
+                request_templates={"application/json": "{ \"stateMachineArn\": \""+sagemaker_sync_invoke_fnc.state_machine_arn+"\", \"input\": \"$util.escapeJavaScript($input.json('$'))\" }" }
             )
         )
 
-        describe_execution_resource.add_method("POST",
-                                            describe_execution_integration,
+        sync_execution_resource.add_method("POST",
+                                           sync_execution_integration,
+                                           authorizer=api_stack.api_authorizer,
+                                           method_responses=[
+                                                                apigateway.MethodResponse(
+                                                                    status_code=status_code,
+                                                                    response_models={
+                                                                        "application/json": apigateway.Model.EMPTY_MODEL if status_code == "200" else apigateway.Model.ERROR_MODEL
+                                                                    },
+                                                                )
+                                                                for status_code in ["200", "400", "500", "503", "504"]
+                                                            ]
+        )
+
+    def _add_start_execution_resource(self, api_stack, resource_name, state_machine):
+        """Adds an api resource starting an execution of the state machine with the request body as input"""
+        start_execution_resource = api_stack.api.root.add_resource(resource_name)
+
+        # Add apigateway integration with step function using the state machine arn
+        start_execution_integration = apigateway.AwsIntegration(
+            service="states",
+            integration_http_method="POST",
+            action="StartExecution",
+            options=apigateway.IntegrationOptions(
+                credentials_role=api_stack.api_gateway_role,
+                integration_responses=[
+                                        apigateway.IntegrationResponse(
+                                            status_code="200",
+                                        )
+                                    ],
+                request_templates={"application/json": "{ \"stateMachineArn\": \""+state_machine.state_machine_arn+"\", \"input\": \"$util.escapeJavaScript($input.json('$'))\" }" }
+            )
+        )
+
+        start_execution_resource.add_method("POST",
+                                            start_execution_integration,
                                             authorizer=api_stack.api_authorizer,
                                             method_responses=[
                                                                 apigateway.MethodResponse(
@@ -135,9 +434,3 @@ class StepFunctionStack(NestedStack):
                                                                 ),
                                                             ]
         )
-
-            
-
-
-
-
@@ -0,0 +1,366 @@
+"""Local harness running Amazon States Language definitions against mocked task resources.
+
+Supports the subset of ASL used by the state machines in config/: Pass, Task, Choice,
+Wait, Map, Succeed and Fail states, Retry and Catch, JsonPath parameters and the
+intrinsic functions used by the definitions. Waits and retry backoffs are recorded
+instead of slept.
+"""
+import copy
+import json
+import re
+from datetime import datetime
+
+
+class StatesError(Exception):
+    """Error raised by a mocked task resource or by a state"""
+
+    def __init__(self, error, cause=""):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class Execution:
+    """Result of running a state machine"""
+
+    def __init__(self, name):
+        self.name = name
+        self.status = "RUNNING"
+        self.output = None
+        self.error = None
+        self.cause = None
+        # Names of the states entered, in order
+        self.history = []
+        # Seconds waited by Wait states and retry backoffs, in order
+        self.waits = []
+        # Task calls as (resource, parameters), in order
+        self.calls = []
+
+
+def load_definition(path, substitutions=None):
+    """Loads a state machine definition, replacing ${Name} with the substitution values"""
+    with open(path, encoding="UTF-8") as file:
+        definition = file.read()
+
+    for name, value in (substitutions or {}).items():
+        definition = definition.replace("${" + name + "}", value)
+
+    return json.loads(definition)
+
+
+_PATH_TOKEN = re.compile(r"\.([A-Za-z0-9_\-]+)|\[(\d+)\]")
+
+
+def get_path(data, path, context=None):
+    """Resolves a reference path such as $.a.b[0] or $$.Execution.Name"""
+    if path.startswith("$$"):
+        data, path = context, path[1:]
+    if path == "$":
+        return data
+
+    value = data
+    for key, index in _PATH_TOKEN.findall(path[1:]):
+        if key:
+            if not isinstance(value, dict) or key not in value:
+                raise StatesError("States.Runtime", f"Path {path} not found")
+            value = value[key]
+        else:
+            value = value[int(index)]
+    return value
+
+
+def has_path(data, path):
+    try:
+        get_path(data, path)
+        return True
+    except (StatesError, IndexError, TypeError):
+        return False
+
+
+def set_path(data, path, value):
+    """Returns data with value set at the reference path, $ replaces data"""
+    if path == "$":
+        return value
+
+    data = copy.deepcopy(data) if isinstance(data, dict) else {}
+    keys = path[2:].split(".")
+    target = data
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+    return data
+
+
+def _split_arguments(arguments):
+    parts, depth, quoted, current = [], 0, False, ""
+    index = 0
+    while index < len(arguments):
+        char = arguments[index]
+        if char == "\\" and quoted:
+            current += arguments[index:index + 2]
+            index += 2
+            continue
+        if char == "'":
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current.strip())
+            current = ""
+            index += 1
+            continue
+        current += char
+        index += 1
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def evaluate(expression, data, context):
+    """Evaluates a path or intrinsic function expression"""
+    expression = expression.strip()
+    if expression.startswith("'"):
+        return re.sub(r"\\(.)", r"\1", expression[1:-1])
+    if expression.startswith("$"):
+        return get_path(data, expression, context)
+    if re.fullmatch(r"-?\d+(\.\d+)?", expression):
+        return json.loads(expression)
+
+    match = re.fullmatch(r"(States\.[A-Za-z]+)\((.*)\)", expression, re.S)
+    if match is None:
+        raise StatesError("States.Runtime", f"Invalid expression {expression}")
+
+    function = match.group(1)
+    arguments = [evaluate(argument, data, context) for argument in _split_arguments(match.group(2))]
+
+    if function == "States.Format":
+        template, values = arguments[0], list(arguments[1:])
+        return re.sub(r"\{\}", lambda _: str(values.pop(0)), template)
+    if function == "States.JsonToString":
+        return json.dumps(arguments[0], separators=(",", ":"))
+    if function == "States.StringToJson":
+        return json.loads(arguments[0])
+    if function == "States.MathAdd":
+        return arguments[0] + arguments[1]
+    if function == "States.Array":
+        return arguments
+    if function == "States.ArrayGetItem":
+        return arguments[0][arguments[1]]
+    if function == "States.ArrayLength":
+        return len(arguments[0])
+
+    raise NotImplementedError(function)
+
+
+def resolve_parameters(template, data, context):
+    """Resolves a Parameters, ItemSelector or ResultSelector template"""
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith(".$"):
+                resolved[key[:-2]] = evaluate(value, data, context)
+            else:
+                resolved[key] = resolve_parameters(value, data, context)
+        return resolved
+    if isinstance(template, list):
+        return [resolve_parameters(value, data, context) for value in template]
+    return template
+
+
+def _matches(error, error_equals):
+    for name in error_equals:
+        if name == "States.ALL" or name == error:
+            return True
+        if name == "States.TaskFailed" and error != "States.Timeout":
+            return True
+    return False
+
+
+def _evaluate_choice(rule, data):
+    if "And" in rule:
+        return all(_evaluate_choice(sub_rule, data) for sub_rule in rule["And"])
+    if "Or" in rule:
+        return any(_evaluate_choice(sub_rule, data) for sub_rule in rule["Or"])
+    if "Not" in rule:
+        return not _evaluate_choice(rule["Not"], data)
+
+    variable = rule["Variable"]
+    if "IsPresent" in rule:
+        return has_path(data, variable) == rule["IsPresent"]
+    if not has_path(data, variable):
+        return False
+
+    value = get_path(data, variable)
+    comparisons = {
+        "StringEquals": lambda expected: value == expected,
+        "BooleanEquals": lambda expected: value == expected,
+        "NumericEquals": lambda expected: value == expected,
+        "NumericGreaterThan": lambda expected: value > expected,
+        "NumericGreaterThanEquals": lambda expected: value >= expected,
+        "NumericLessThan": lambda expected: value < expected,
+        "NumericLessThanEquals": lambda expected: value <= expected,
+        "IsNull": lambda expected: (value is None) == expected,
+    }
+    for operator, compare in comparisons.items():
+        if operator in rule:
+            return compare(rule[operator])
+        if operator + "Path" in rule:
+            return compare(get_path(data, rule[operator + "Path"]))
+
+    raise NotImplementedError(rule)
+
+
+class StateMachine:
+    """Runs a state machine definition.
+
+    resources maps a task resource arn to a callable taking the resolved parameters
+    and returning the task result, or raising a StatesError.
+    """
+
+    max_transitions = 10000
+
+    def __init__(self, definition, resources=None):
+        self.definition = definition
+        self.resources = resources or {}
+
+    def run(self, execution_input, name="test-execution"):
+        execution = Execution(name)
+        context = {
+            "Execution": {
+                "Id": f"arn:aws:states:us-east-1:111111111111:execution:test:{name}",
+                "Name": name,
+                "StartTime": datetime.utcnow().isoformat() + "Z",
+                "Input": execution_input,
+            },
+            "State": {},
+        }
+
+        try:
+            execution.output = self._run_states(self.definition, copy.deepcopy(execution_input), context, execution)
+            execution.status = "SUCCEEDED"
+        except StatesError as error:
+            execution.status = "FAILED"
+            execution.error = error.error
+            execution.cause = error.cause
+
+        return execution
+
+    def _run_states(self, definition, data, context, execution):
+        state_name = definition["StartAt"]
+        for _ in range(self.max_transitions):
+            state = definition["States"][state_name]
+            execution.history.append(state_name)
+            context["State"] = {"Name": state_name, "EnteredTime": datetime.utcnow().isoformat() + "Z"}
+
+            data, state_name = self._run_state(state, data, context, execution)
+            if state_name is None:
+                return data
+
+        raise StatesError("States.Runtime", "Too many state transitions")
+
+    def _run_state(self, state, data, context, execution):
+        state_type = state["Type"]
+
+        if state_type == "Choice":
+            for rule in state["Choices"]:
+                if _evaluate_choice(rule, data):
+                    return data, rule["Next"]
+            if "Default" not in state:
+                raise StatesError("States.NoChoiceMatched", "No choice matched")
+            return data, state["Default"]
+
+        if state_type == "Fail":
+            error = get_path(data, state["ErrorPath"]) if "ErrorPath" in state else state.get("Error")
+            cause = get_path(data, state["CausePath"]) if "CausePath" in state else state.get("Cause")
+            raise StatesError(error, cause)
+
+        if state_type == "Succeed":
+            return data, None
+
+        if state_type == "Wait":
+            execution.waits.append(state.get("Seconds"))
+            return data, self._next(state)
+
+        effective_input = get_path(data, state.get("InputPath", "$"), context)
+
+        try:
+            if state_type == "Pass":
+                if "Parameters" in state:
+                    result = resolve_parameters(state["Parameters"], effective_input, context)
+                else:
+                    result = state.get("Result", effective_input)
+            elif state_type == "Task":
+                result = self._run_task(state, effective_input, context, execution)
+            elif state_type == "Map":
+                result = self._run_map(state, effective_input, context, execution)
+            else:
+                raise NotImplementedError(state_type)
+        except StatesError as error:
+            for catcher in state.get("Catch", []):
+                if _matches(error.error, catcher["ErrorEquals"]):
+                    error_output = {"Error": error.error, "Cause": error.cause}
+                    return self._apply_result_path(data, catcher.get("ResultPath", "$"), error_output), catcher["Next"]
+            raise
+
+        if "ResultSelector" in state:
+            result = resolve_parameters(state["ResultSelector"], result, context)
+
+        data = self._apply_result_path(data, state.get("ResultPath", "$"), result)
+        return get_path(data, state.get("OutputPath", "$"), context), self._next(state)
+
+    def _run_task(self, state, data, context, execution):
+        parameters = resolve_parameters(state.get("Parameters", data), data, context)
+        resource = state["Resource"]
+        if resource not in self.resources:
+            raise StatesError("States.Runtime", f"No mock for resource {resource}")
+
+        attempts = {}
+        while True:
+            execution.calls.append((resource, copy.deepcopy(parameters)))
+            try:
+                return self.resources[resource](parameters)
+            except StatesError as error:
+                retrier = next((retrier for retrier in state.get("Retry", [])
+                                if _matches(error.error, retrier["ErrorEquals"])), None)
+                if retrier is None:
+                    raise
+
+                attempt = attempts.get(id(retrier), 0)
+                if attempt >= retrier.get("MaxAttempts", 3):
+                    raise
+                attempts[id(retrier)] = attempt + 1
+                execution.waits.append(retrier.get("IntervalSeconds", 1) * retrier.get("BackoffRate", 2.0) ** attempt)
+
+    def _run_map(self, state, data, context, execution):
+        if "ItemReader" in state:
+            reader = state["ItemReader"]
+            parameters = resolve_parameters(reader.get("Parameters", {}), data, context)
+            items = self.resources[reader["Resource"]](parameters)
+        else:
+            items = get_path(data, state.get("ItemsPath", "$"), context)
+
+        results = []
+        for index, item in enumerate(items):
+            item_context = dict(context, Map={"Item": {"Index": index, "Value": item}})
+            if "ItemSelector" in state:
+                item = resolve_parameters(state["ItemSelector"], data, item_context)
+            results.append(self._run_states(state["ItemProcessor"], item, item_context, execution))
+
+        if "ResultWriter" in state:
+            writer = state["ResultWriter"]
+            parameters = resolve_parameters(writer.get("Parameters", {}), data, context)
+            return self.resources[writer["Resource"]](dict(parameters, Results=results))
+
+        return results
+
+    @staticmethod
+    def _apply_result_path(data, result_path, result):
+        if result_path is None:
+            return data
+        return set_path(data, result_path, result)
+
+    @staticmethod
+    def _next(state):
+        return None if state.get("End") else state["Next"]
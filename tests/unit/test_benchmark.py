@@ -0,0 +1,53 @@
+from emulator import EmulatorSettings
+from benchmark import Workload, recommend
+from benchmark.emulated import benchmark_candidates
+from benchmark.runner import percentile
+
+
+def step(concurrency, throughput_rps, p90_ms, error_rate=0.0):
+    return {"concurrency": concurrency, "throughput_rps": throughput_rps, "error_rate": error_rate,
+            "latency_ms": {"p50": p90_ms / 2, "p90": p90_ms, "p99": p90_ms * 2}}
+
+
+def test_percentile_uses_the_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.9) == 90
+    assert percentile(values, 0.99) == 99
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile([], 0.5) is None
+
+
+def test_recommend_picks_the_cheapest_setting_meeting_the_slo():
+    results = [
+        {"model": "Falcon", "instance_type": "ml.g5.2xlarge", "instance_count": 1,
+         "steps": [step(1, 1.0, 900), step(4, 3.0, 1500), step(8, 3.5, 4000)]},
+        {"model": "Falcon", "instance_type": "ml.g5.12xlarge", "instance_count": 1,
+         "steps": [step(1, 1.5, 600), step(8, 9.0, 1800, error_rate=0.05)]},
+    ]
+
+    recommendation, = recommend(results, slo_ms=2000)
+    assert recommendation["recommended"]["config"] == {"inference_instance_type": "ml.g5.2xlarge", "inference_instance_count": 1}
+    assert recommendation["recommended"]["concurrency"] == 4
+
+    recommendation, = recommend(results, slo_ms=2000, target_rps=10)
+    assert recommendation["recommended"]["config"] == {"inference_instance_type": "ml.g5.2xlarge", "inference_instance_count": 4}
+
+    recommendation, = recommend(results, slo_ms=500)
+    assert recommendation["recommended"] is None
+    assert len(recommendation["rejected"]) == 2
+
+
+def test_emulated_ramp_reports_the_instance_profile():
+    settings = EmulatorSettings(time_scale=0.1, creation_delay_seconds=10, time_to_first_token_ms=100, tokens_per_second=1000,
+                                instance_profiles={"ml.g5.12xlarge": {"concurrency_per_instance": 8}})
+    results = benchmark_candidates("demo", [("ml.g5.2xlarge", 1), ("ml.g5.12xlarge", 1)], Workload(output_tokens="fixed:100"),
+                                   [8], step_seconds=20, settings=settings, report=lambda line: None)
+
+    small, large = [result["steps"][0] for result in results]
+    assert large["error_rate"] == 0
+    # The smaller instance serves 4 of the 8 requests at once and queues the others
+    assert large["throughput_rps"] > small["throughput_rps"]
+    assert large["latency_ms"]["p50"] < small["latency_ms"]["p50"]
+    # Time to first token of 100 ms plus 128 prompt tokens, then 100 tokens at 1000 tokens per second slowed down by batching
+    assert 250 <= large["latency_ms"]["p50"] < 1000
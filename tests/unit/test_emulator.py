@@ -0,0 +1,619 @@
+import io
+import json
+import time
+import socket
+import calendar
+from concurrent import futures
+
+import boto3
+import botocore
+import pytest
+
+from emulator import Emulator, EmulatorSettings, LocalLambda
+
+# Scale the SageMaker delays down so that a 300 seconds creation takes 0.3 seconds
+TIME_SCALE = 0.001
+STATUS_TABLE = "endpoint-status"
+
+
+@pytest.fixture
+def emulator(monkeypatch):
+    settings = EmulatorSettings(time_scale=TIME_SCALE, concurrency_per_instance=1, queue_per_instance=1,
+                                time_to_first_token_ms=100, tokens_per_second=1000)
+    with Emulator(settings) as emulator:
+        # Restored after the test, the lambdas update the process environment
+        for name, value in emulator.environment().items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.setenv("ENDPOINT_STATUS_TABLE_NAME", STATUS_TABLE)
+        yield emulator
+
+
+def wait(seconds):
+    time.sleep(seconds * TIME_SCALE + 0.05)
+
+
+def put_expiry(ssm_client, endpoint_name, expiry_minutes, **values):
+    expiry = time.strftime("%d-%m-%Y-%H-%M-%S", time.gmtime(time.time() + expiry_minutes * 60))
+    ssm_client.put_parameter(Name=f"/sagemaker/endpoint/expiry/{endpoint_name}", Type="String", Overwrite=True,
+                             Value=json.dumps(dict(values, expiry=expiry, endpoint_name=endpoint_name,
+                                                   endpoint_config_name=f"{endpoint_name}-Config")))
+
+
+def create_endpoint_config(sagemaker_client, endpoint_name, instance_count=1):
+    sagemaker_client.create_endpoint_config(
+        EndpointConfigName=f"{endpoint_name}-Config",
+        ProductionVariants=[{"VariantName": "AllTraffic", "InstanceType": "ml.g5.2xlarge", "InitialInstanceCount": instance_count}])
+
+
+def test_endpoint_manager_creates_warms_up_and_deletes_endpoints(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60, warmup={"payloads": ['{"inputs": "hi"}'], "content_type": "application/json", "repeat": 2})
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    update_expiry = LocalLambda("update_expiry")
+
+    start_stop.invoke()
+    assert sagemaker_client.describe_endpoint(EndpointName="demo-Endpoint")["EndpointStatus"] == "Creating"
+
+    wait(EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 2
+    listing = json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])
+    assert listing[0]["EndpointName"] == "demo-Endpoint"
+    assert listing[0]["Ready"] is True
+
+    # Warmed up once per endpoint creation
+    start_stop.invoke()
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 2
+    assert emulator.calls[("SageMaker", "CreateEndpoint")] == 1
+
+    put_expiry(ssm_client, "demo-Endpoint", -1)
+    start_stop.invoke()
+    assert emulator.calls[("SageMaker", "DeleteEndpoint")] == 1
+    wait(EmulatorSettings().deletion_delay_seconds)
+    with pytest.raises(botocore.exceptions.ClientError):
+        sagemaker_client.describe_endpoint(EndpointName="demo-Endpoint")
+
+
+def test_warm_up_resumes_on_the_next_run_once_its_budget_is_spent(emulator):
+    # Each warm-up request takes 0.2 seconds
+    emulator.settings.time_to_first_token_ms = 200000
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60, warmup={"payloads": ['{"inputs": "hi"}'], "content_type": "application/json", "repeat": 8})
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.module.WARMUP_BUDGET_SECONDS = 0.5
+    update_expiry = LocalLambda("update_expiry")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+
+    start_stop.invoke()
+    assert 0 < emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] < 8
+    assert json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])[0]["Ready"] is False
+
+    for _ in range(8):
+        start_stop.invoke()
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 8
+    assert json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])[0]["Ready"] is True
+
+
+def test_endpoint_manager_starts_endpoints_in_priority_order_within_quota(emulator):
+    # Looked up by the endpoint manager through Service Quotas
+    emulator.settings.instance_quotas = {"ml.g5.2xlarge": 2}
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    instances = {"instance_type": "ml.g5.2xlarge", "instance_count": 1}
+    for name, priority in [("low", 0), ("high", 10), ("medium", 5)]:
+        create_endpoint_config(sagemaker_client, f"{name}-Endpoint")
+        put_expiry(ssm_client, f"{name}-Endpoint", 60, priority=priority, instances=instances)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    update_expiry = LocalLambda("update_expiry")
+
+    start_stop.invoke()
+    assert sagemaker_client.describe_endpoint(EndpointName="high-Endpoint")["EndpointStatus"] == "Creating"
+    assert sagemaker_client.describe_endpoint(EndpointName="medium-Endpoint")["EndpointStatus"] == "Creating"
+    listing = {info["EndpointName"]: info for info in json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])}
+    assert listing["low-Endpoint"]["QueuePosition"] == 1
+    assert listing["low-Endpoint"]["QueuedInstanceType"] == "ml.g5.2xlarge"
+    assert "QueuePosition" not in listing["high-Endpoint"]
+
+    # The queued endpoint is not created while the quota is used, nor are the quotas looked up again
+    start_stop.invoke()
+    assert emulator.calls[("SageMaker", "CreateEndpoint")] == 2
+    assert emulator.calls[("ServiceQuotasV20190624", "ListServiceQuotas")] == 1
+
+    # The queued endpoint is created once the instances of an expired endpoint are released
+    put_expiry(ssm_client, "high-Endpoint", -1, priority=10, instances=instances)
+    start_stop.invoke()
+    wait(EmulatorSettings().deletion_delay_seconds)
+    start_stop.invoke()
+    assert sagemaker_client.describe_endpoint(EndpointName="low-Endpoint")["EndpointStatus"] == "Creating"
+    listing = {info["EndpointName"]: info for info in json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])}
+    assert "QueuePosition" not in listing["low-Endpoint"]
+
+
+def test_endpoint_manager_counts_the_instances_endpoints_run(emulator):
+    emulator.settings.instance_quotas = {"ml.g5.2xlarge": 2}
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "scaled-Endpoint")
+    put_expiry(ssm_client, "scaled-Endpoint", 60, instances={"instance_type": "ml.g5.2xlarge", "instance_count": 1})
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    update_expiry = LocalLambda("update_expiry")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+
+    # Scaled out past the instances of its expiry parameter, i.e. by autoscaling
+    sagemaker_client.update_endpoint_weights_and_capacities(
+        EndpointName="scaled-Endpoint", DesiredWeightsAndCapacities=[{"VariantName": "AllTraffic", "DesiredInstanceCount": 2}])
+    wait(EmulatorSettings().update_delay_seconds)
+
+    # Added through the api, its instances are resolved from its endpoint config
+    create_endpoint_config(sagemaker_client, "api-Endpoint")
+    put_expiry(ssm_client, "api-Endpoint", 60)
+    start_stop.invoke()
+    listing = {info["EndpointName"]: info for info in json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])}
+    assert listing["api-Endpoint"]["QueuedInstanceType"] == "ml.g5.2xlarge"
+    assert emulator.calls[("SageMaker", "CreateEndpoint")] == 1
+
+
+def test_endpoint_manager_hibernates_expired_endpoints_before_deleting_them(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint", instance_count=2)
+    sagemaker_client.create_endpoint_config(
+        EndpointConfigName="demo-Endpoint-Hibernation1-Config",
+        ProductionVariants=[{"VariantName": "AllTraffic", "InstanceType": "ml.g5.xlarge", "InitialInstanceCount": 1}])
+    values = {
+        "instances": {"instance_type": "ml.g5.2xlarge", "instance_count": 2},
+        "hibernation": {
+            "tiers": [
+                {"after_minutes": 0, "instance_count": 1},
+                {"after_minutes": 30, "instance_count": 1, "instance_type": "ml.g5.xlarge",
+                 "endpoint_config_name": "demo-Endpoint-Hibernation1-Config"}
+            ],
+            "delete_after_minutes": 120
+        }
+    }
+    put_expiry(ssm_client, "demo-Endpoint", 60, **values)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    update_expiry = LocalLambda("update_expiry")
+
+    def describe():
+        response = sagemaker_client.describe_endpoint(EndpointName="demo-Endpoint")
+        return response["EndpointConfigName"], response["ProductionVariants"][0]["CurrentInstanceCount"]
+
+    def step(expiry_minutes, delay_seconds=EmulatorSettings().update_delay_seconds):
+        put_expiry(ssm_client, "demo-Endpoint", expiry_minutes, **values)
+        start_stop.invoke()
+        wait(delay_seconds)
+
+    step(60, EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+
+    # At expiry the endpoint is scaled in place down to the instances of the first tier, once
+    step(-1)
+    assert describe() == ("demo-Endpoint-Config", 1)
+    start_stop.invoke()
+    assert emulator.calls[("SageMaker", "UpdateEndpointWeightsAndCapacities")] == 1
+    listing = json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])
+    assert listing[0]["Hibernating"] is True
+    assert listing[0]["HibernationInstanceType"] == "ml.g5.2xlarge"
+    assert listing[0]["HibernationInstanceCount"] == 1
+
+    # After a further idle period the endpoint moves to the cheaper instance type
+    step(-31)
+    assert describe() == ("demo-Endpoint-Hibernation1-Config", 1)
+
+    # Extending the endpoint rolls it back to its endpoint config instead of creating it again
+    step(60)
+    assert describe() == ("demo-Endpoint-Config", 2)
+
+    step(-1)
+    assert describe() == ("demo-Endpoint-Config", 1)
+    step(60)
+    assert describe() == ("demo-Endpoint-Config", 2)
+    listing = json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])
+    assert "Hibernating" not in listing[0]
+
+    # The endpoint is deleted once it is idle for delete_after_minutes
+    step(-121, EmulatorSettings().deletion_delay_seconds)
+    with pytest.raises(botocore.exceptions.ClientError):
+        sagemaker_client.describe_endpoint(EndpointName="demo-Endpoint")
+    assert emulator.calls[("SageMaker", "CreateEndpoint")] == 1
+
+
+def test_endpoint_manager_keeps_expired_async_endpoints_until_their_backlog_is_processed(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60, async_inference=True)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+
+    backlog = {"Datapoints": [{"Maximum": 0.0}, {"Maximum": 3.0}]}
+    start_stop.module.cloudwatch_client.get_metric_statistics = lambda **kwargs: backlog
+    put_expiry(ssm_client, "demo-Endpoint", -1, async_inference=True)
+    start_stop.invoke()
+    assert sagemaker_client.describe_endpoint(EndpointName="demo-Endpoint")["EndpointStatus"] == "InService"
+    assert emulator.calls[("SageMaker", "DeleteEndpoint")] == 0
+
+    backlog["Datapoints"] = [{"Maximum": 0.0}]
+    start_stop.invoke()
+    assert emulator.calls[("SageMaker", "DeleteEndpoint")] == 1
+
+
+def test_endpoint_manager_retries_deletions_which_failed(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+
+    def throttle(**kwargs):
+        raise botocore.exceptions.ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "DeleteEndpoint")
+
+    delete_endpoint = start_stop.module.sagemaker_client.delete_endpoint
+    start_stop.module.sagemaker_client.delete_endpoint = throttle
+    put_expiry(ssm_client, "demo-Endpoint", -1)
+    start_stop.invoke()
+    status_table = boto3.resource("dynamodb").Table(STATUS_TABLE)
+    assert status_table.get_item(Key={"endpoint_name": "demo-Endpoint"})["Item"]["endpoint_status"] == "InService"
+
+    start_stop.module.sagemaker_client.delete_endpoint = delete_endpoint
+    start_stop.invoke()
+    wait(EmulatorSettings().deletion_delay_seconds)
+    start_stop.invoke()
+    assert status_table.get_item(Key={"endpoint_name": "demo-Endpoint"})["Item"]["endpoint_status"] == "Stopped"
+
+
+def test_endpoint_already_on_its_hibernation_tier_is_not_published_as_updating(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    values = {
+        "instances": {"instance_type": "ml.g5.2xlarge", "instance_count": 1},
+        "hibernation": {"tiers": [{"after_minutes": 0, "instance_count": 1}], "delete_after_minutes": 120}
+    }
+    put_expiry(ssm_client, "demo-Endpoint", 60, **values)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+
+    put_expiry(ssm_client, "demo-Endpoint", -1, **values)
+    start_stop.invoke()
+    assert emulator.calls[("SageMaker", "UpdateEndpointWeightsAndCapacities")] == 0
+    assert boto3.resource("dynamodb").Table(STATUS_TABLE).get_item(
+        Key={"endpoint_name": "demo-Endpoint"})["Item"]["endpoint_status"] == "InService"
+
+
+def test_endpoint_manager_makes_no_warm_up_writes_once_endpoints_are_ready(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60, warmup={"payloads": ['{"inputs": "hi"}'], "content_type": "application/json", "repeat": 1})
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+    assert boto3.resource("dynamodb").Table(STATUS_TABLE).get_item(Key={"endpoint_name": "demo-Endpoint"})["Item"]["ready"] is True
+
+    claims = []
+    claim_warm_up = start_stop.module.claim_warm_up
+    start_stop.module.claim_warm_up = lambda name: claims.append(name) or claim_warm_up(name)
+    start_stop.invoke()
+    start_stop.invoke()
+    assert claims == []
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 1
+
+
+def test_endpoint_manager_does_not_create_existing_endpoints_it_fails_to_reconcile(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+
+    def reject(*args):
+        raise botocore.exceptions.ClientError({"Error": {"Code": "ValidationException", "Message": "Invalid"}}, "UpdateItem")
+
+    start_stop.module.record_time_to_in_service = reject
+    start_stop.invoke()
+    start_stop.invoke()
+    assert emulator.calls[("SageMaker", "CreateEndpoint")] == 1
+    assert boto3.resource("dynamodb").Table(STATUS_TABLE).get_item(
+        Key={"endpoint_name": "demo-Endpoint"})["Item"]["endpoint_status"] == "InService"
+
+
+def test_invoke_lambda_answers_requests_to_endpoints_which_are_not_serving(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60)
+
+    start_stop = LocalLambda("start_stop_endpoint")
+    falcon = LocalLambda("falcon", {"ENDPOINT_NAME": "demo-Endpoint", "MODEL_NAME": "Falcon40B"})
+
+    def invoke():
+        # Look the published statuses up again instead of answering from the cached copy
+        falcon.module.status_gate.loaded_at = 0
+        return falcon.invoke({"body": json.dumps({"inputs": "hi"})})
+
+    start_stop.invoke()
+    response = invoke()
+    assert response["statusCode"] == 503
+    assert json.loads(response["body"])["status"] == "Creating"
+    assert 0 < int(response["headers"]["Retry-After"]) <= 600
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 0
+
+    wait(EmulatorSettings().creation_delay_seconds)
+    start_stop.invoke()
+    assert invoke()["statusCode"] == 200
+
+    put_expiry(ssm_client, "demo-Endpoint", -1)
+    start_stop.invoke()
+    wait(EmulatorSettings().deletion_delay_seconds)
+    start_stop.invoke()
+    response = invoke()
+    assert response["statusCode"] == 503
+    assert json.loads(response["body"])["status"] == "Stopped"
+    assert "Retry-After" not in response["headers"]
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 1
+
+
+def test_admission_control_reclaims_leaked_leases_only(emulator, monkeypatch):
+    for name, value in {"ENDPOINT_NAME": "demo-Endpoint", "MODEL_NAME": "Falcon40B", "ROUTER_TABLE_NAME": "router-state",
+                        "ADMISSION_LIMIT": "1", "OVERFLOW_STATE_MACHINE_ARN": "arn:aws:states:us-east-1:123456789012:stateMachine:invoke"}.items():
+        monkeypatch.setenv(name, value)
+    table = boto3.resource("dynamodb").create_table(TableName="router-state", BillingMode="PAY_PER_REQUEST",
+                                                    KeySchema=[{"AttributeName": "endpoint_name", "KeyType": "HASH"}],
+                                                    AttributeDefinitions=[{"AttributeName": "endpoint_name", "AttributeType": "S"}])
+    falcon = LocalLambda("falcon")
+    admission = falcon.module.admission
+
+    # Lease of a request whose lambda timed out before releasing it
+    table.put_item(Item={"endpoint_name": "demo-Endpoint", "admitted": {f"{int(time.time()) - 600}:leaked"}})
+    assert admission.acquire()
+    lease = admission.lease
+    assert table.get_item(Key={"endpoint_name": "demo-Endpoint"})["Item"]["admitted"] == {lease}
+
+    # The lease of a request being served is not reclaimed, the request over the limit cannot be spilled without a JSON body
+    response = falcon.invoke({"body": "not json"})
+    assert response["statusCode"] == 400
+    assert table.get_item(Key={"endpoint_name": "demo-Endpoint"})["Item"]["admitted"] == {lease}
+
+    admission.lease = lease
+    admission.release()
+    assert "admitted" not in table.get_item(Key={"endpoint_name": "demo-Endpoint"})["Item"]
+    assert emulator.calls[("SageMakerRuntime", "InvokeEndpoint")] == 0
+
+
+def test_admission_limit_follows_the_instances_serving_the_model(emulator, monkeypatch):
+    sagemaker_client = boto3.client("sagemaker")
+    ssm_client = boto3.client("ssm")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    put_expiry(ssm_client, "demo-Endpoint", 60)
+    start_stop = LocalLambda("start_stop_endpoint")
+    start_stop.invoke()
+    wait(EmulatorSettings().creation_delay_seconds)
+
+    # Autoscaling between 1 and 3 instances, the limit at minimum capacity is 2 requests
+    for name, value in {"ENDPOINT_NAME": "demo-Endpoint", "MODEL_NAME": "Falcon40B", "ROUTER_TABLE_NAME": "router-state",
+                        "ADMISSION_LIMIT": "2", "ADMISSION_LIMIT_PER_INSTANCE": "2"}.items():
+        monkeypatch.setenv(name, value)
+    boto3.resource("dynamodb").create_table(TableName="router-state", BillingMode="PAY_PER_REQUEST",
+                                            KeySchema=[{"AttributeName": "endpoint_name", "KeyType": "HASH"}],
+                                            AttributeDefinitions=[{"AttributeName": "endpoint_name", "AttributeType": "S"}])
+    admission = LocalLambda("falcon").module.admission
+
+    assert [admission.acquire() for _ in range(3)] == [True, True, False]
+
+    # Scaled out by autoscaling, the limit is raised once the instance count is looked up again
+    sagemaker_client.update_endpoint_weights_and_capacities(
+        EndpointName="demo-Endpoint", DesiredWeightsAndCapacities=[{"VariantName": "AllTraffic", "DesiredInstanceCount": 3}])
+    wait(EmulatorSettings().update_delay_seconds)
+    admission.replicas[0].status_checked = 0
+    assert admission.current_limit() == 6
+    assert [admission.acquire() for _ in range(5)] == [True, True, True, True, False]
+
+
+@pytest.mark.parametrize("callback_url, allowed_hosts", [
+    ("http://example.com/callback", "[]"),
+    ("https://localhost/callback", "[]"),
+    ("https://169.254.169.254/latest/meta-data", "[]"),
+    ("https://example.com/callback", '["hooks.example.com"]'),
+])
+def test_job_callbacks_to_disallowed_urls_are_rejected_and_recorded(emulator, monkeypatch, callback_url, allowed_hosts):
+    monkeypatch.setenv("JOB_TABLE_NAME", "jobs")
+    monkeypatch.setenv("CALLBACK_ALLOWED_HOSTS", allowed_hosts)
+    table = boto3.resource("dynamodb").create_table(TableName="jobs", BillingMode="PAY_PER_REQUEST",
+                                                    KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+                                                    AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}])
+    item = {"job_id": "job-1", "status": "SUCCEEDED", "callback_url": callback_url}
+    table.put_item(Item=item)
+
+    job_callback = LocalLambda("job_callback")
+    job_callback.invoke({"Records": [{"dynamodb": {"NewImage": {key: {"S": value} for key, value in item.items()}}}]})
+
+    job = table.get_item(Key={"job_id": "job-1"})["Item"]
+    assert job["callback_status"] == "REJECTED"
+    assert "callback_error" in job
+
+
+def test_job_callbacks_connect_to_the_checked_address(emulator, monkeypatch):
+    monkeypatch.setenv("JOB_TABLE_NAME", "jobs")
+    table = boto3.resource("dynamodb").create_table(TableName="jobs", BillingMode="PAY_PER_REQUEST",
+                                                    KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+                                                    AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}])
+    item = {"job_id": "job-1", "status": "SUCCEEDED", "callback_url": "https://rebinding.example.com/callback"}
+    table.put_item(Item=item)
+
+    # The host resolves to a public address when checked, then to the metadata address
+    answers = [socket.AF_INET, "93.184.216.34", "169.254.169.254"]
+    getaddrinfo = socket.getaddrinfo
+    create_connection = socket.create_connection
+    connections = []
+
+    def resolve(host, *args, **kwargs):
+        if host != "rebinding.example.com":
+            return getaddrinfo(host, *args, **kwargs)
+        return [(answers[0], socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (answers.pop(1), 443))]
+
+    def connect(address, *args, **kwargs):
+        if address[1] != 443:
+            return create_connection(address, *args, **kwargs)
+        connections.append(address[0])
+        raise ConnectionRefusedError("Connection refused")
+
+    monkeypatch.setattr(socket, "getaddrinfo", resolve)
+    monkeypatch.setattr(socket, "create_connection", connect)
+    job_callback = LocalLambda("job_callback")
+    job_callback.invoke({"Records": [{"dynamodb": {"NewImage": {key: {"S": value} for key, value in item.items()}}}]})
+
+    assert connections == ["93.184.216.34"]
+    assert table.get_item(Key={"job_id": "job-1"})["Item"]["callback_status"] == "FAILED"
+
+
+def test_distributed_batch_results_are_merged_in_prompt_order(emulator):
+    objects = {
+        "batch/run/manifest.json": {"ResultFiles": {
+            "SUCCEEDED": [{"Key": "batch/run/SUCCEEDED_0.json"}, {"Key": "batch/run/SUCCEEDED_1.json"}],
+            "FAILED": [{"Key": "batch/run/FAILED_0.json"}],
+            "PENDING": []
+        }},
+        "batch/run/SUCCEEDED_0.json": [{"Status": "SUCCEEDED", "Output": json.dumps({"index": 2, "output": "third"})}],
+        "batch/run/SUCCEEDED_1.json": [{"Status": "SUCCEEDED", "Output": json.dumps({"index": 0, "error": "ModelError", "cause": "Bad input"})}],
+        "batch/run/FAILED_0.json": [{"Status": "FAILED", "Input": json.dumps({"index": 1, "body": {}}), "Error": "States.Timeout", "Cause": ""}]
+    }
+
+    class S3:
+        def get_object(self, Bucket, Key):
+            return {"Body": io.BytesIO(json.dumps(objects[Key]).encode("utf-8"))}
+
+        def put_object(self, Bucket, Key, Body, **kwargs):
+            objects[Key] = json.loads(Body)
+
+    merge = LocalLambda("merge_batch_results")
+    merge.module.s3_client = S3()
+    response = merge.invoke({"bucket": "results", "manifest_key": "batch/run/manifest.json", "key": "batch/execution/results.json"})
+
+    assert response == {"bucket": "results", "key": "batch/execution/results.json"}
+    assert objects["batch/execution/results.json"] == [
+        {"index": 0, "error": "ModelError", "cause": "Bad input"},
+        {"index": 1, "error": "States.Timeout", "cause": ""},
+        {"index": 2, "output": "third"}
+    ]
+
+
+def test_wake_ups_keep_the_endpoint_up_without_adding_up(emulator):
+    ssm_client = boto3.client("ssm")
+    put_expiry(ssm_client, "demo-Endpoint", 5)
+    update_expiry = LocalLambda("update_expiry")
+
+    def post(**body):
+        """Returns the minutes left until the expiry set by the request"""
+        response = update_expiry.invoke({"httpMethod": "POST", "body": json.dumps(dict(body, EndpointName="demo-Endpoint"))})
+        expiry = time.strptime(json.loads(response["body"])["EndpointExpiry "] + " UTC", "%d-%m-%Y-%H-%M-%S %Z")
+        return (calendar.timegm(expiry) - time.time()) / 60
+
+    assert post(minutes=30, wakeup=True) == pytest.approx(30, abs=0.1)
+    assert post(minutes=30, wakeup=True) == pytest.approx(30, abs=0.1)
+    # An endpoint up for longer keeps its expiry
+    assert post(minutes=60) == pytest.approx(90, abs=0.1)
+    assert post(minutes=30, wakeup=True) == pytest.approx(90, abs=0.1)
+
+
+def test_expiry_of_advanced_parameters_can_be_extended(emulator):
+    ssm_client = boto3.client("ssm")
+    # Warm-up payloads too large for a standard parameter
+    warmup = {"payloads": [json.dumps({"inputs": "x" * 5000})], "content_type": "application/json"}
+    expiry = time.strftime("%d-%m-%Y-%H-%M-%S", time.gmtime(time.time() + 600))
+    ssm_client.put_parameter(Name="/sagemaker/endpoint/expiry/demo-Endpoint", Type="String", Tier="Intelligent-Tiering",
+                             Value=json.dumps({"expiry": expiry, "endpoint_name": "demo-Endpoint",
+                                               "endpoint_config_name": "demo-Endpoint-Config", "warmup": warmup}))
+    update_expiry = LocalLambda("update_expiry")
+
+    response = update_expiry.invoke({"httpMethod": "POST", "body": json.dumps({"EndpointName": "demo-Endpoint", "minutes": 30})})
+
+    assert response["statusCode"] == 200
+    parameter = ssm_client.get_parameter(Name="/sagemaker/endpoint/expiry/demo-Endpoint")["Parameter"]
+    assert json.loads(parameter["Value"])["warmup"] == warmup
+    assert json.loads(parameter["Value"])["expiry"] != expiry
+
+
+def test_expiry_listing_is_paginated(emulator):
+    ssm_client = boto3.client("ssm")
+    for index in range(25):
+        put_expiry(ssm_client, f"demo-{index}-Endpoint", 60)
+
+    update_expiry = LocalLambda("update_expiry")
+    listing = json.loads(update_expiry.invoke({"httpMethod": "GET", "queryStringParameters": None})["body"])
+
+    assert len(listing) == 25
+
+
+def test_invocations_queue_then_throttle_above_instance_concurrency(emulator):
+    sagemaker_client = boto3.client("sagemaker")
+    create_endpoint_config(sagemaker_client, "demo-Endpoint")
+    sagemaker_client.create_endpoint(EndpointName="demo-Endpoint", EndpointConfigName="demo-Endpoint-Config")
+    wait(EmulatorSettings().creation_delay_seconds)
+
+    # Requests take 200ms in real time
+    emulator.settings.time_scale = 1
+    runtime_client = boto3.client("sagemaker-runtime", config=botocore.config.Config(retries={"total_max_attempts": 1}))
+
+    def invoke():
+        try:
+            response = runtime_client.invoke_endpoint(EndpointName="demo-Endpoint", ContentType="application/json",
+                                                      Body=json.dumps({"inputs": "hi", "parameters": {"max_new_tokens": 100}}))
+        except botocore.exceptions.ClientError as error:
+            return error.response["Error"]["Code"]
+        return float(response["ResponseMetadata"]["HTTPHeaders"]["x-emulator-queue-ms"])
+
+    # One request is served, one is queued behind it and one is throttled
+    with futures.ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda _: invoke(), range(3)))
+
+    assert results.count("ThrottlingException") == 1
+    queue_times = sorted(result for result in results if result != "ThrottlingException")
+    assert queue_times[0] < queue_times[1]
+
+
+def test_dynamodb_update_and_condition_expressions(emulator):
+    table = boto3.resource("dynamodb").Table("admission")
+    table.update_item(Key={"endpoint_name": "demo"}, UpdateExpression="ADD admitted :one SET admitted_at = :now",
+                      ConditionExpression="attribute_not_exists(admitted) OR admitted < :limit",
+                      ExpressionAttributeValues={":one": 1, ":now": 10, ":limit": 1})
+
+    with pytest.raises(botocore.exceptions.ClientError) as error:
+        table.update_item(Key={"endpoint_name": "demo"}, UpdateExpression="ADD admitted :one",
+                          ConditionExpression="attribute_not_exists(admitted) OR admitted < :limit",
+                          ExpressionAttributeValues={":one": 1, ":limit": 1})
+    assert error.value.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    table.update_item(Key={"endpoint_name": "demo"}, UpdateExpression="SET #status = :status REMOVE admitted_at",
+                      ConditionExpression="#status IN (:missing) OR attribute_not_exists(#status)",
+                      ExpressionAttributeNames={"#status": "status"},
+                      ExpressionAttributeValues={":status": "READY", ":missing": "MISSING"})
+
+    assert table.get_item(Key={"endpoint_name": "demo"})["Item"] == {"endpoint_name": "demo", "admitted": 1, "status": "READY"}
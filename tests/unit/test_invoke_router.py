@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+
+import botocore
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "functions", "layer", "python"))
+
+from invoke_utils.router import EndpointRouter, Replica
+
+
+class FakeTable:
+    """Router state table keeping the in-flight counters and latencies in memory"""
+
+    name = "router-state"
+
+    def __init__(self, items=None):
+        self.items = items or {}
+        self.meta = self
+        self.client = self
+
+    def batch_get_item(self, RequestItems):
+        keys = [key["endpoint_name"] for key in RequestItems[self.name]["Keys"]]
+        return {"Responses": {self.name: [dict(self.items[key], endpoint_name=key) for key in keys if key in self.items]}}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues):
+        item = self.items.setdefault(Key["endpoint_name"], {"in_flight": 0})
+        item["in_flight"] += ExpressionAttributeValues[":delta"]
+        item["updated_at"] = ExpressionAttributeValues[":now"]
+        if ":latency" in ExpressionAttributeValues:
+            item["latency_ms"] = ExpressionAttributeValues[":latency"]
+
+
+class FakeBody:
+    def __init__(self, payload=b"{}", error=None):
+        self.payload = payload
+        self.error = error
+
+    def read(self):
+        if self.error is not None:
+            raise self.error
+        return self.payload
+
+
+class FakeReplica(Replica):
+    """Replica answering or failing each invocation in turn, InService unless ejected"""
+
+    def __init__(self, endpoint_name, *outcomes):
+        super().__init__(endpoint_name)
+        self.outcomes = list(outcomes)
+        self.invocations = 0
+
+    def is_healthy(self):
+        return time.time() >= self.ejected_until
+
+    def invoke(self, **kwargs):
+        self.invocations += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"Body": outcome}
+
+
+def client_error(code):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": code}}, "InvokeEndpoint")
+
+
+def router(*replicas, items=None):
+    endpoint_router = EndpointRouter(list(replicas))
+    endpoint_router.table = FakeTable(items)
+    return endpoint_router
+
+
+def test_availability_errors_fail_over_to_the_next_replica_and_eject_the_replica():
+    first = FakeReplica("first", client_error("ServiceUnavailable"))
+    second = FakeReplica("second", FakeBody(b"answer"))
+    endpoint_router = router(first, second)
+
+    replica, response = endpoint_router.invoke(Body="{}")
+    assert replica is second
+    assert response["Body"] == b"answer"
+    assert first.ejected_until > 0
+    assert endpoint_router.candidates() == [second]
+
+
+@pytest.mark.parametrize("code", ["ValidationException", "ModelError"])
+def test_request_errors_are_raised_without_ejecting_the_replica(code):
+    first = FakeReplica("first", client_error(code))
+    second = FakeReplica("second", FakeBody())
+    endpoint_router = router(first, second)
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        endpoint_router.invoke(Body="not json")
+    assert first.ejected_until == 0
+    assert second.invocations == 0
+    assert len(endpoint_router.candidates()) == 2
+
+
+def test_candidates_are_ordered_by_in_flight_requests_then_latency():
+    replicas = [FakeReplica(name, FakeBody()) for name in ["busy", "slow", "fast"]]
+    now = int(time.time())
+    endpoint_router = router(*replicas, items={
+        "busy": {"in_flight": 3, "updated_at": now, "latency_ms": 10},
+        "slow": {"in_flight": 1, "updated_at": now, "latency_ms": 900},
+        "fast": {"in_flight": 1, "updated_at": now, "latency_ms": 100},
+    })
+
+    assert [replica.endpoint_name for replica in endpoint_router.candidates()] == ["fast", "slow", "busy"]
+
+
+def test_in_flight_requests_are_released_when_the_body_cannot_be_read():
+    replica = FakeReplica("only", FakeBody(error=botocore.exceptions.ReadTimeoutError(endpoint_url="https://runtime")),
+                          FakeBody(b"answer"))
+    endpoint_router = router(replica)
+
+    with pytest.raises(botocore.exceptions.ReadTimeoutError):
+        endpoint_router.invoke(Body="{}")
+    assert endpoint_router.table.items["only"]["in_flight"] == 0
+
+    endpoint_router.invoke(Body="{}")
+    assert endpoint_router.table.items["only"]["in_flight"] == 0
+    assert "latency_ms" in endpoint_router.table.items["only"]
@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+import time
+
+import botocore
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "functions", "layer", "python"))
+
+from invoke_utils.router import NoHealthyReplicaError
+from invoke_utils.slo import SLOInvoker, SLOTimeoutError
+
+
+class FakeRouter:
+    """Router answering after a delay, or raising an error, recording the invocations"""
+
+    def __init__(self, name, delay_seconds=0, error=None):
+        self.name = name
+        self.delay_seconds = delay_seconds
+        self.error = error
+        self.invocations = []
+
+    def candidates(self):
+        raise AssertionError("The invoker relies on invoke to find the healthy replicas")
+
+    def invoke(self, **kwargs):
+        self.invocations.append(kwargs)
+        time.sleep(self.delay_seconds)
+        if self.error is not None:
+            raise self.error
+        return self.name, {"Body": self.name}
+
+
+def client_error(code, **response):
+    return botocore.exceptions.ClientError(dict(response, Error={"Code": code, "Message": code}), "InvokeEndpoint")
+
+
+def invoker(primary, fallback, **kwargs):
+    return SLOInvoker("Falcon40B", primary, fallback_model_name="FlanT5", fallback_router=fallback,
+                      **dict({"deadline_seconds": 0.1}, **kwargs))
+
+
+def test_model_answering_within_its_deadline_is_not_hedged():
+    fallback = FakeRouter("fallback")
+    model_name, replica, response = invoker(FakeRouter("primary"), fallback).invoke(Body="{}")
+
+    assert (model_name, replica) == ("Falcon40B", "primary")
+    assert fallback.invocations == []
+
+
+def test_hedged_request_returns_the_first_answer_after_the_deadline():
+    model_name, replica, _ = invoker(FakeRouter("primary", delay_seconds=0.2), FakeRouter("fallback", delay_seconds=1)).invoke(Body="{}")
+    assert model_name == "Falcon40B"
+
+    model_name, replica, _ = invoker(FakeRouter("primary", delay_seconds=1), FakeRouter("fallback")).invoke(Body="{}")
+    assert model_name == "FlanT5"
+
+
+def test_unhedged_request_returns_the_fallback_answer_after_the_deadline():
+    model_name, _, _ = invoker(FakeRouter("primary", delay_seconds=0.2), FakeRouter("fallback", delay_seconds=0.3),
+                               hedge=False).invoke(Body="{}")
+    assert model_name == "FlanT5"
+
+
+def test_request_fails_once_neither_model_answers_within_the_timeout():
+    with pytest.raises(SLOTimeoutError):
+        invoker(FakeRouter("primary", delay_seconds=1), FakeRouter("fallback", delay_seconds=1),
+                timeout_seconds=0.3).invoke(Body="{}")
+
+
+@pytest.mark.parametrize("error", [
+    NoHealthyReplicaError("No healthy replica endpoint available"),
+    client_error("ThrottlingException"),
+    client_error("ModelError", OriginalStatusCode=500),
+])
+def test_unavailable_model_is_answered_by_the_fallback_straight_away(error):
+    fallback = FakeRouter("fallback")
+    start = time.monotonic()
+    model_name, _, _ = invoker(FakeRouter("primary", error=error), fallback, deadline_seconds=5,
+                               request_mapping={"inputs": "text_inputs"}).invoke(Body=json.dumps({"inputs": "hi"}))
+
+    assert model_name == "FlanT5"
+    assert time.monotonic() - start < 1
+    assert json.loads(fallback.invocations[0]["Body"]) == {"text_inputs": "hi"}
+
+
+@pytest.mark.parametrize("error", [
+    client_error("ValidationException"),
+    client_error("ModelError", OriginalStatusCode=400),
+])
+def test_request_errors_are_raised_without_invoking_the_fallback(error):
+    fallback = FakeRouter("fallback")
+    with pytest.raises(botocore.exceptions.ClientError):
+        invoker(FakeRouter("primary", error=error), fallback).invoke(Body="{}")
+    assert fallback.invocations == []
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+import aws_cdk.assertions as assertions
+
+from benchmark.synth import run_synth
+
+
+@pytest.fixture(scope="module")
+def synths(tmp_path_factory):
+    """Synth of generated configurations of 3, 6 and 9 models, each model kind of the configurations appears once every 3 models"""
+    workdir = tmp_path_factory.mktemp("synth")
+    return {model_count: run_synth(model_count, workdir) for model_count in [3, 6, 9]}
+
+
+def model_stack_template(result):
+    name = next(name for name in result["templates"] if "ModelStack" in name)
+    with open(os.path.join(result["outdir"], name), encoding="UTF-8") as file:
+        return assertions.Template.from_json(json.load(file))
+
+
+def test_stack_creates_the_resources_of_each_model(synths):
+    template = model_stack_template(synths[3])
+
+    template.resource_count_is("AWS::SageMaker::Model", 3)
+    template.resource_count_is("AWS::SageMaker::EndpointConfig", 3)
+    # Realtime endpoints are created by the endpoint manager from their expiry parameter, async endpoints by the stack
+    template.resource_count_is("AWS::SSM::Parameter", 2)
+    # Expiry parameters larger than a standard parameter are stored as advanced parameters
+    assert all(parameter["Properties"]["Tier"] == "Intelligent-Tiering"
+               for parameter in template.find_resources("AWS::SSM::Parameter").values())
+    template.resource_count_is("AWS::SageMaker::Endpoint", 1)
+    template.has_resource_properties("AWS::SageMaker::EndpointConfig", {
+        "ProductionVariants": [assertions.Match.object_like({"InstanceType": "ml.g5.8xlarge", "InitialInstanceCount": 1})],
+        "AsyncInferenceConfig": assertions.Match.any_value()
+    })
+    template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 1)
+
+
+def test_resources_grow_linearly_with_the_models(synths):
+    # Resources shared by the models are created with the first models
+    assert synths[9]["resources"] - synths[6]["resources"] == synths[6]["resources"] - synths[3]["resources"]
+    assert synths[9]["template_bytes"] > synths[6]["template_bytes"] > synths[3]["template_bytes"]
+    for result in synths.values():
+        assert result["warnings"] == []
+
+
+def test_first_async_endpoint_keeps_the_logical_id_of_the_single_async_endpoint(synths):
+    # Renaming the logical id of the named endpoint would make CloudFormation replace it under the same name
+    endpoints = model_stack_template(synths[9]).find_resources("AWS::SageMaker::Endpoint")
+    logical_ids = sorted(logical_id[:-8] for logical_id in endpoints)
+
+    assert logical_ids == ["FoundationModelEndpointModel2Endpoint", "FoundationModelEndpointModel5Model5Endpoint",
+                           "FoundationModelEndpointModel8Model8Endpoint"]
+
+
+def test_endpoint_manager_runs_do_not_overlap(synths):
+    # A run outliving the schedule period would create endpoints in the same quota headroom as the next one
+    for name in synths[3]["templates"]:
+        with open(os.path.join(synths[3]["outdir"], name), encoding="UTF-8") as file:
+            template = json.load(file)
+        if any(resource["Properties"].get("Description") == "Start/Stop Endpoint Lambda Rule"
+               for resource in template.get("Resources", {}).values() if resource["Type"] == "AWS::Events::Rule"):
+            break
+    template = assertions.Template.from_json(template)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "app.handler",
+        "ReservedConcurrentExecutions": 1,
+        "Environment": {"Variables": assertions.Match.object_like({"INSTANCE_QUOTAS": assertions.Match.any_value()})}
+    })
+    template.has_resource_properties("AWS::Lambda::EventInvokeConfig", {"MaximumRetryAttempts": 0, "MaximumEventAgeInSeconds": 60})
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+
+
+def run_python(code, cache_dir):
+    """Runs code in a new interpreter and returns its output, modules already imported by the tests are not reused"""
+    environment = dict(os.environ,
+                       JUMPSTART_CACHE_DIR=str(cache_dir / "cache"),
+                       JUMPSTART_LOCKFILE=str(cache_dir / "jumpstart.lock.json"),
+                       JUMPSTART_CACHE_REFRESH="false")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, env=environment,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_sagemaker_sdk(tmp_path):
+    output = run_python(
+        "import json, sys\n"
+        "import utils.sagemaker_helper\n"
+        "import stack.foundation_model_stack\n"
+        "print(json.dumps(sorted(name for name in sys.modules if name.split('.')[0] == 'sagemaker')))\n",
+        tmp_path)
+
+    assert output == []
+
+
+def test_cached_lookups_do_not_load_sagemaker_sdk(tmp_path):
+    output = run_python(
+        "import json, sys\n"
+        "from utils.jumpstart_cache import jumpstart_cache\n"
+        "from utils import sagemaker_helper\n"
+        "specs = {'version': '1.2.0', 'hosting_model_package_arns': None, 'inference_enable_network_isolation': True}\n"
+        "uris = {'model_bucket_name': 'bucket', 'model_bucket_key': 'model.tar.gz', 'model_docker_image': 'image',\n"
+        "        'instance_type': 'ml.g5.2xlarge', 'inference_source_uri': 's3://bucket/source.tar.gz', 'region_name': 'us-east-1'}\n"
+        "jumpstart_cache.lock_version('model', '1.2.0')\n"
+        "jumpstart_cache.get('model_specs', lambda: specs, model_id='model', version='1.2.0', region='us-east-1', scope='inference')\n"
+        "jumpstart_cache.get('sagemaker_uris', lambda: uris, model_id='model', version='1.2.0', region='us-east-1',\n"
+        "                    instance_type='ml.g5.2xlarge', scope='inference')\n"
+        "jumpstart_cache.get('environment_variables', lambda: {'NAME': 'value'}, model_id='model', version='1.2.0',\n"
+        "                    region='us-east-1', scope='inference')\n"
+        "model_specs = sagemaker_helper.get_model_spec(model_id='model', model_version='*', region='us-east-1')\n"
+        "model_info = sagemaker_helper.get_sagemaker_uris(model_id='model', instance_type='ml.g5.2xlarge', region_name='us-east-1')\n"
+        "model_env = sagemaker_helper.sagemaker_env(model_id='model', region='us-east-1')\n"
+        "print(json.dumps({'sdk_modules': [name for name in sys.modules if name.split('.')[0] == 'sagemaker'],\n"
+        "                  'version': model_specs.version, 'image': model_info['model_docker_image'], 'env': model_env}))\n",
+        tmp_path)
+
+    assert output == {"sdk_modules": [], "version": "1.2.0", "image": "image", "env": {"NAME": "value"}}
@@ -0,0 +1,423 @@
+import json
+import os
+
+import pytest
+
+from stack.stepfunction_stack import StepFunctionStack
+from tests.asl_harness import StateMachine, StatesError, load_definition
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "config")
+UPDATE_EXPIRY_FUNCTION = "arn:aws:lambda:us-east-1:111111111111:function:update-expiry"
+RESULTS_BUCKET = "results-bucket"
+JOB_TABLE = "job-table"
+
+DESCRIBE_ENDPOINT = "arn:aws:states:::aws-sdk:sagemaker:describeEndpoint"
+INVOKE_ENDPOINT = "arn:aws:states:::aws-sdk:sagemakerruntime:invokeEndpoint"
+LAMBDA_INVOKE = "arn:aws:states:::lambda:invoke"
+MERGE_RESULTS_FUNCTION = "arn:aws:lambda:us-east-1:111111111111:function:merge-batch-results"
+S3_PUT_OBJECT = "arn:aws:states:::aws-sdk:s3:putObject"
+DYNAMODB_PUT_ITEM = "arn:aws:states:::dynamodb:putItem"
+DYNAMODB_UPDATE_ITEM = "arn:aws:states:::dynamodb:updateItem"
+
+
+def sequence(*results):
+    """Returns a mock resource returning or raising each result in turn, repeating the last one"""
+    results = list(results)
+
+    def resource(parameters):
+        result = results.pop(0) if len(results) > 1 else results[0]
+        if isinstance(result, StatesError):
+            raise result
+        return result
+
+    return resource
+
+
+def in_service(parameters):
+    return {"EndpointName": parameters["EndpointName"], "EndpointStatus": "InService"}
+
+
+def invoke_output(parameters):
+    return {"Body": json.dumps({"generated_text": parameters["Body"]["inputs"]}), "ContentType": "application/json"}
+
+
+class JobStore:
+    """Mocks the job table and results bucket written by the invoke workflow"""
+
+    def __init__(self):
+        self.items = {}
+        self.objects = {}
+
+    def put_item(self, parameters):
+        item = {key: value["S"] for key, value in parameters["Item"].items()}
+        self.items[item["job_id"]] = item
+        return {}
+
+    def update_item(self, parameters):
+        item = self.items[parameters["Key"]["job_id"]["S"]]
+        names = parameters.get("ExpressionAttributeNames", {})
+        values = parameters["ExpressionAttributeValues"]
+        for assignment in parameters["UpdateExpression"][len("SET "):].split(","):
+            name, value = [part.strip() for part in assignment.split("=")]
+            item[names.get(name, name)] = values[value]["S"]
+        return {}
+
+    def put_object(self, parameters):
+        self.objects[parameters["Key"]] = parameters["Body"]
+        return {"ETag": "etag"}
+
+    def resources(self, resources):
+        return dict(resources, **{
+            DYNAMODB_PUT_ITEM: self.put_item,
+            DYNAMODB_UPDATE_ITEM: self.update_item,
+            S3_PUT_OBJECT: self.put_object,
+        })
+
+
+@pytest.fixture
+def invoke_definition():
+    return load_definition(os.path.join(CONFIG_DIR, "sagemaker-invoke.json"),
+                           {"UpdateExpiryFunction": UPDATE_EXPIRY_FUNCTION, "JobTable": JOB_TABLE, "ResultsBucket": RESULTS_BUCKET})
+
+
+@pytest.fixture
+def jobs():
+    return JobStore()
+
+
+@pytest.fixture
+def execution_input():
+    return {"endpointname": "Falcon40B", "body": {"inputs": "Hello"}}
+
+
+def test_invokes_in_service_endpoint(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "SUCCEEDED"
+    assert json.loads(execution.output["Body"]) == {"generated_text": "Hello"}
+    assert "ExtendExpiry" not in execution.history
+    assert execution.waits == []
+
+
+def test_waits_for_endpoint_to_be_in_service(invoke_definition, execution_input, jobs):
+    creating = {"EndpointStatus": "Creating"}
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: sequence(StatesError("SageMaker.SageMakerException", "Could not find endpoint"),
+                                    creating, creating, {"EndpointStatus": "InService"}),
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "SUCCEEDED"
+    assert execution.waits == [30, 30, 30]
+    assert execution.history.count("DescribeEndpoint") == 4
+
+
+@pytest.mark.parametrize("status", ["Updating", "SystemUpdating"])
+def test_invokes_updating_endpoint_without_waiting(invoke_definition, execution_input, jobs, status):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: sequence({"EndpointStatus": status}),
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "SUCCEEDED"
+    assert execution.waits == []
+
+
+def test_fails_when_endpoint_is_never_ready(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: sequence(StatesError("SageMaker.SageMakerException", "Could not find endpoint")),
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "FAILED"
+    assert execution.error == "EndpointNotReady"
+    assert len(execution.waits) == 39
+    assert all(resource != INVOKE_ENDPOINT for resource, _ in execution.calls)
+
+
+def test_fails_when_endpoint_failed(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: sequence({"EndpointStatus": "Failed"}),
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "FAILED"
+    assert execution.error == "EndpointFailed"
+
+
+def test_retries_throttled_invocations_with_backoff(invoke_definition, execution_input, jobs):
+    throttled = StatesError("SageMakerRuntime.ThrottlingException", "Rate exceeded")
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: sequence(throttled, throttled, {"Body": "{}"}),
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "SUCCEEDED"
+    assert execution.waits == [2, 4]
+    assert sum(resource == INVOKE_ENDPOINT for resource, _ in execution.calls) == 3
+
+
+def test_fails_after_persistent_model_errors(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: sequence(StatesError("SageMakerRuntime.ModelErrorException", "Out of memory")),
+    }))
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "FAILED"
+    assert execution.error == "SageMakerRuntime.ModelErrorException"
+    assert execution.cause == "Out of memory"
+    assert execution.waits == [5, 10, 20]
+
+
+def test_wakes_up_expired_endpoint(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        LAMBDA_INVOKE: lambda parameters: {"StatusCode": 200},
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(dict(execution_input, wakeup_minutes=30))
+
+    assert execution.status == "SUCCEEDED"
+    resource, parameters = next(call for call in execution.calls if call[0] == LAMBDA_INVOKE)
+    assert resource == LAMBDA_INVOKE
+    assert parameters["FunctionName"] == UPDATE_EXPIRY_FUNCTION
+    assert json.loads(parameters["Payload"]["body"]) == {"EndpointName": "Falcon40B", "minutes": 30, "wakeup": True}
+
+
+def test_wake_up_failure_does_not_fail_invocation(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        LAMBDA_INVOKE: sequence(StatesError("Lambda.ResourceNotFoundException", "Function not found")),
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(dict(execution_input, wakeup_minutes=30))
+
+    assert execution.status == "SUCCEEDED"
+
+
+def test_records_succeeded_job(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(dict(execution_input, callback_url="https://example.com/callback"), name="job-1")
+
+    assert execution.status == "SUCCEEDED"
+    job = jobs.items["job-1"]
+    assert job["status"] == "SUCCEEDED"
+    assert job["endpoint_name"] == "Falcon40B"
+    assert job["callback_url"] == "https://example.com/callback"
+    assert job["result_bucket"] == RESULTS_BUCKET
+    assert json.loads(jobs.objects[job["result_key"]]) == {"generated_text": "Hello"}
+    assert "started_at" in job and "completed_at" in job
+
+
+def test_records_failed_job(invoke_definition, execution_input, jobs):
+    state_machine = StateMachine(invoke_definition, jobs.resources({
+        DESCRIBE_ENDPOINT: sequence({"EndpointStatus": "Failed"}),
+        INVOKE_ENDPOINT: invoke_output,
+    }))
+
+    execution = state_machine.run(execution_input, name="job-2")
+
+    assert execution.status == "FAILED"
+    assert jobs.items["job-2"]["status"] == "FAILED"
+    assert jobs.items["job-2"]["error"] == "EndpointFailed"
+    assert "result_key" not in jobs.items["job-2"]
+
+
+def test_records_succeeded_job_whose_output_cannot_be_stored(invoke_definition, execution_input, jobs):
+    def unavailable(parameters):
+        raise StatesError("S3.S3Exception", "Service unavailable")
+
+    state_machine = StateMachine(invoke_definition, dict(jobs.resources({
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: invoke_output,
+    }), **{S3_PUT_OBJECT: unavailable}))
+
+    execution = state_machine.run(dict(execution_input, callback_url="https://example.com/callback"), name="job-3")
+
+    assert execution.status == "SUCCEEDED"
+    job = jobs.items["job-3"]
+    assert job["status"] == "SUCCEEDED"
+    assert job["error"] == "ResultNotStored"
+    assert "Service unavailable" in job["error_cause"]
+    assert "result_key" not in job
+
+
+def test_job_store_failure_does_not_fail_invocation(invoke_definition, execution_input):
+    def unavailable(parameters):
+        raise StatesError("DynamoDB.AmazonDynamoDBException", "Service unavailable")
+
+    state_machine = StateMachine(invoke_definition, {
+        DYNAMODB_PUT_ITEM: unavailable,
+        DYNAMODB_UPDATE_ITEM: unavailable,
+        S3_PUT_OBJECT: unavailable,
+        DESCRIBE_ENDPOINT: in_service,
+        INVOKE_ENDPOINT: invoke_output,
+    })
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "SUCCEEDED"
+    assert json.loads(execution.output["Body"]) == {"generated_text": "Hello"}
+
+
+def test_sync_workflow_skips_job_states(invoke_definition, execution_input):
+    definition = StepFunctionStack._without_job_states(invoke_definition)
+    state_machine = StateMachine(definition, {
+        DESCRIBE_ENDPOINT: sequence({"EndpointStatus": "Failed"}),
+        INVOKE_ENDPOINT: invoke_output,
+    })
+
+    execution = state_machine.run(execution_input)
+
+    assert execution.status == "FAILED"
+    assert execution.error == "EndpointFailed"
+    assert all(resource not in (DYNAMODB_PUT_ITEM, DYNAMODB_UPDATE_ITEM) for resource, _ in execution.calls)
+
+
+def test_sync_workflow_fits_in_the_api_gateway_timeout(invoke_definition):
+    definition = StepFunctionStack._sync_definition(invoke_definition)
+    states = definition["States"]
+
+    def retry_seconds(state):
+        return sum(retry["IntervalSeconds"] * retry["BackoffRate"] ** attempt
+                   for retry in state.get("Retry", []) for attempt in range(retry["MaxAttempts"]))
+
+    # The endpoint is described on each readiness attempt, with a wait between attempts
+    readiness_attempts = states["CheckReadinessAttempts"]["Choices"][0]["NumericGreaterThanEquals"]
+    wait_seconds = (readiness_attempts - 1) * states["WaitForEndpoint"]["Seconds"]
+    wait_seconds += readiness_attempts * retry_seconds(states["DescribeEndpoint"])
+    wait_seconds += sum(retry_seconds(state) for name, state in states.items() if name != "DescribeEndpoint")
+
+    assert definition["TimeoutSeconds"] < 29
+    assert wait_seconds <= definition["TimeoutSeconds"] - 5
+
+
+def test_batch_invoke_keeps_prompt_order_and_errors():
+    definition = load_definition(os.path.join(CONFIG_DIR, "sagemaker-batch-invoke.json"),
+                                 {"ResultsBucket": RESULTS_BUCKET})
+    written = {}
+
+    def invoke(parameters):
+        if parameters["Body"]["inputs"] == "fail":
+            raise StatesError("SageMakerRuntime.ModelErrorException", "Bad input")
+        return invoke_output(parameters)
+
+    def put_object(parameters):
+        written[parameters["Key"]] = json.loads(parameters["Body"])
+        return {"ETag": "etag"}
+
+    state_machine = StateMachine(definition, {INVOKE_ENDPOINT: invoke, S3_PUT_OBJECT: put_object})
+
+    execution = state_machine.run({
+        "endpointname": "Falcon40B",
+        "prompts": [{"inputs": "first"}, {"inputs": "fail"}, {"inputs": "third"}]
+    }, name="batch-execution")
+
+    assert execution.status == "SUCCEEDED"
+    assert execution.output == {"bucket": RESULTS_BUCKET, "key": "batch/batch-execution/results.json"}
+    results = written["batch/batch-execution/results.json"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert json.loads(results[2]["output"]) == {"generated_text": "third"}
+    assert results[1]["error"] == "SageMakerRuntime.ModelErrorException"
+
+
+def test_batch_invoke_retries_throttled_prompts():
+    definition = load_definition(os.path.join(CONFIG_DIR, "sagemaker-batch-invoke.json"),
+                                 {"ResultsBucket": RESULTS_BUCKET})
+    written = {}
+
+    def put_object(parameters):
+        written[parameters["Key"]] = json.loads(parameters["Body"])
+        return {"ETag": "etag"}
+
+    throttled = sequence(StatesError("SageMakerRuntime.ThrottlingException", "Rate exceeded"), None)
+
+    def invoke(parameters):
+        return throttled(parameters) or invoke_output(parameters)
+
+    state_machine = StateMachine(definition, {INVOKE_ENDPOINT: invoke, S3_PUT_OBJECT: put_object})
+
+    execution = state_machine.run({"endpointname": "Falcon40B", "prompts": [{"inputs": "first"}]}, name="batch-execution")
+
+    assert execution.status == "SUCCEEDED"
+    assert json.loads(written["batch/batch-execution/results.json"][0]["output"]) == {"generated_text": "first"}
+    assert execution.waits == [2]
+
+
+def run_distributed_batch(execution_input, prompts=None):
+    """Runs a batch with a distributed map, returns the execution, the results written by the map and the merge request"""
+    definition = load_definition(os.path.join(CONFIG_DIR, "sagemaker-batch-invoke.json"),
+                                 {"ResultsBucket": RESULTS_BUCKET, "MergeResultsFunction": MERGE_RESULTS_FUNCTION})
+    written = {}
+
+    def invoke(parameters):
+        if parameters["Body"]["inputs"] == "fail":
+            raise StatesError("ValidationError", "Bad input")
+        return invoke_output(parameters)
+
+    def write_results(parameters):
+        written["results"] = parameters["Results"]
+        return {"ResultWriterDetails": {"Bucket": parameters["Bucket"], "Key": f"{parameters['Prefix']}/run/manifest.json"}}
+
+    def merge_results(parameters):
+        written["merge"] = parameters
+        return {"Payload": {"bucket": parameters["Payload"]["bucket"], "key": parameters["Payload"]["key"]}}
+
+    state_machine = StateMachine(definition, {
+        "arn:aws:states:::s3:getObject": lambda parameters: prompts,
+        INVOKE_ENDPOINT: invoke,
+        "arn:aws:states:::s3:putObject": write_results,
+        LAMBDA_INVOKE: merge_results
+    })
+
+    execution = state_machine.run(execution_input, name="batch-execution")
+    return execution, written.get("results"), written.get("merge")
+
+
+def test_batch_manifest_results_are_merged_in_prompt_order():
+    prompts = [{"inputs": "first"}, {"inputs": "fail"}, {"inputs": "third"}]
+    execution, results, merge = run_distributed_batch({"endpointname": "Falcon40B", "manifest": {"key": "manifests/prompts.json"}},
+                                                      prompts)
+
+    assert execution.status == "SUCCEEDED"
+    assert execution.output == {"bucket": RESULTS_BUCKET, "key": "batch/batch-execution/results.json"}
+    # Results of a distributed map are written out of order, each one carries the index of its prompt
+    results = {result["index"]: result for result in results}
+    assert sorted(results) == [0, 1, 2]
+    assert json.loads(results[0]["output"]) == {"generated_text": "first"}
+    assert results[1]["error"] == "ValidationError"
+    assert merge["Payload"] == {"bucket": RESULTS_BUCKET, "manifest_key": "batch/run/manifest.json",
+                                "key": "batch/batch-execution/results.json"}
+
+
+def test_large_batches_are_run_with_a_distributed_map():
+    prompts = [{"inputs": f"prompt {index}"} for index in range(26)]
+    execution, results, merge = run_distributed_batch({"endpointname": "Falcon40B", "prompts": prompts})
+
+    assert execution.status == "SUCCEEDED"
+    assert "InvokeLargePrompts" in execution.history and "InvokePrompts" not in execution.history
+    assert len(results) == 26
+    assert execution.output == {"bucket": RESULTS_BUCKET, "key": "batch/batch-execution/results.json"}
@@ -0,0 +1,98 @@
+"""On-disk cache of JumpStart metadata lookups made at synth time"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+# Cache entries are reused for this long, the entries of a locked model version do not change
+DEFAULT_TTL_HOURS = 7 * 24
+
+
+class JumpStartCache:
+    """Content addressed cache of JumpStart lookups, with a lockfile of resolved model versions.
+
+    Each lookup is stored in cache_dir under the hash of its kind and key, i.e. the model id,
+    version, region, instance type and scope. Model versions resolved from "*" are recorded in
+    the lockfile so that repeated synths use the same version. With refresh, cached entries and
+    locked versions are ignored and replaced by fresh lookups.
+    """
+
+    def __init__(self, cache_dir, lockfile, ttl_seconds, refresh=False):
+        self.cache_dir = cache_dir
+        self.lockfile = lockfile
+        self.ttl_seconds = ttl_seconds
+        self.refresh = refresh
+        self._locked_versions = None
+        # Entries refreshed by this process, reused instead of being fetched again
+        self._refreshed = set()
+        # Models are resolved concurrently, serialize updates of the lockfile
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(cache_dir=os.environ.get("JUMPSTART_CACHE_DIR", ".jumpstart_cache"),
+                   lockfile=os.environ.get("JUMPSTART_LOCKFILE", "jumpstart.lock.json"),
+                   ttl_seconds=float(os.environ.get("JUMPSTART_CACHE_TTL_HOURS", DEFAULT_TTL_HOURS)) * 3600,
+                   refresh=os.environ.get("JUMPSTART_CACHE_REFRESH", "false").lower() in ["1", "true"])
+
+    def _path(self, kind, key):
+        digest = hashlib.sha256(json.dumps(dict(key, kind=kind), sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    @staticmethod
+    def _write_json(path, value):
+        """Writes json to a temporary file first so that concurrent synths never read a partial file"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False, encoding="UTF-8") as file:
+            json.dump(value, file, indent=2, sort_keys=True)
+        os.replace(file.name, path)
+
+    def get(self, kind, fetch, **key):
+        """Returns the cached value of a lookup, calling fetch to look it up on a miss"""
+        path = self._path(kind, key)
+
+        if (not self.refresh or path in self._refreshed) and os.path.exists(path):
+            try:
+                with open(path, encoding="UTF-8") as file:
+                    entry = json.load(file)
+                if time.time() - entry["created_at"] < self.ttl_seconds:
+                    return entry["value"]
+            except (ValueError, KeyError):
+                print(f"Ignoring invalid JumpStart cache entry {path}")
+
+        value = fetch()
+        self._write_json(path, {"kind": kind, "key": key, "created_at": time.time(), "value": value})
+        self._refreshed.add(path)
+
+        return value
+
+    def _load_lockfile(self):
+        with self._lock:
+            return self._load_lockfile_unlocked()
+
+    def _load_lockfile_unlocked(self):
+        if self._locked_versions is None:
+            self._locked_versions = {}
+            if os.path.exists(self.lockfile):
+                with open(self.lockfile, encoding="UTF-8") as file:
+                    self._locked_versions = json.load(file).get("models", {})
+        return self._locked_versions
+
+    def locked_version(self, model_id):
+        """Returns the version of the model recorded in the lockfile, None if it must be resolved"""
+        if self.refresh:
+            return None
+        return self._load_lockfile().get(model_id)
+
+    def lock_version(self, model_id, version):
+        with self._lock:
+            locked_versions = self._load_lockfile_unlocked()
+            if locked_versions.get(model_id) != version:
+                locked_versions[model_id] = version
+                self._write_json(self.lockfile, {"models": dict(locked_versions)})
+
+
+jumpstart_cache = JumpStartCache.from_env()
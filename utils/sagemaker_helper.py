@@ -1,53 +1,83 @@
-import sagemaker
-from sagemaker import script_uris
-from sagemaker import image_uris 
-from sagemaker import model_uris
-from sagemaker.jumpstart.notebook_utils import list_jumpstart_models
-from sagemaker import environment_variables
-from sagemaker.jumpstart.utils import verify_model_region_and_return_specs
-from sagemaker.jumpstart.enums import JumpStartScriptScope
-from sagemaker.jumpstart.constants import (
-    JUMPSTART_DEFAULT_REGION_NAME,
-)
-import boto3
+"""JumpStart metadata lookups made at synth time.
+
+The SageMaker SDK takes seconds to import, so it is only imported when a lookup is not
+found in the JumpStart cache.
+"""
+from collections import namedtuple
 from typing import Optional
 
-# session = sagemaker.Session()
+from utils.jumpstart_cache import jumpstart_cache
+
+# Same as sagemaker.jumpstart.constants.JUMPSTART_DEFAULT_REGION_NAME
+JUMPSTART_DEFAULT_REGION_NAME = "us-west-2"
+
+# Fields of the JumpStart model specs used by the stack, cached instead of the full specs
+CachedModelSpecs = namedtuple("CachedModelSpecs", ["version", "hosting_model_package_arns", "inference_enable_network_isolation"])
+
+def resolve_model_version(model_id, region, model_version="*"):
+    """Returns the version of the model, the version recorded in the lockfile or the latest version for *"""
+    if model_version != "*":
+        return model_version
+
+    model_specs = get_model_spec(model_id=model_id, model_version=model_version, region=region)
+    return model_specs.version if model_specs is not None else model_version
 
 def sagemaker_env(model_id, region, model_version="*"):
-    extra_env_vars = environment_variables.retrieve_default(
-        model_id=model_id,
-        model_version=model_version,
-        region=region,
-        include_aws_sdk_env_vars=False
-    )
+    model_version = resolve_model_version(model_id, region, model_version)
+
+    def lookup():
+        from sagemaker import environment_variables
+
+        return environment_variables.retrieve_default(
+            model_id=model_id,
+            model_version=model_version,
+            region=region,
+            include_aws_sdk_env_vars=False
+        )
+
+    extra_env_vars = jumpstart_cache.get("environment_variables", lookup,
+                                         model_id=model_id,
+                                         version=model_version,
+                                         region=region,
+                                         scope="inference")
 
     return extra_env_vars
 
 def get_sagemaker_uris(model_id,instance_type,region_name):
-    
-    
-    MODEL_VERSION = "*"  # latest
-    SCOPE = "inference"
+    model_version = resolve_model_version(model_id, region_name)
+    scope = "inference"
+
+    return jumpstart_cache.get("sagemaker_uris",
+                               lambda: _retrieve_sagemaker_uris(model_id, instance_type, region_name, model_version, scope),
+                               model_id=model_id,
+                               version=model_version,
+                               region=region_name,
+                               instance_type=instance_type,
+                               scope=scope)
+
+def _retrieve_sagemaker_uris(model_id, instance_type, region_name, model_version, scope):
+    from sagemaker import image_uris, model_uris, script_uris
 
     inference_image_uri = image_uris.retrieve(region=region_name, 
                                           framework=None,
                                           model_id=model_id, 
-                                          model_version=MODEL_VERSION, 
-                                          image_scope=SCOPE, 
+                                          model_version=model_version, 
+                                          image_scope=scope, 
                                           instance_type=instance_type)
     
+    # Uncompressed model data of the instance type is an s3 prefix ending with /
     inference_model_uri = model_uris.retrieve(
                                           region=region_name,
                                           model_id=model_id, 
-                                          model_version=MODEL_VERSION, 
-                                          model_scope=SCOPE)
+                                          model_version=model_version, 
+                                          model_scope=scope,
+                                          instance_type=instance_type)
     
     inference_source_uri = script_uris.retrieve(
                                             region=region_name,
                                             model_id=model_id, 
-                                            model_version=MODEL_VERSION, 
-                                            script_scope=SCOPE)
+                                            model_version=model_version, 
+                                            script_scope=scope)
 
     model_bucket_name = inference_model_uri.split("/")[2]
     model_bucket_key = "/".join(inference_model_uri.split("/")[3:])
@@ -68,19 +98,44 @@ def get_model_spec(
 
     # Default to inference scope
     if scope is None:
-        scope = JumpStartScriptScope.INFERENCE
+        scope = "inference"
 
-    model_specs = verify_model_region_and_return_specs(
-            model_id=model_id,
-            version=model_version,
-            scope=scope,
-            region=region
-        )
+    # Use the version of the lockfile for the latest version
+    resolve_version = model_version == "*"
+    if resolve_version:
+        model_version = jumpstart_cache.locked_version(model_id) or model_version
+
+    def lookup():
+        from sagemaker.jumpstart.enums import JumpStartScriptScope
+        from sagemaker.jumpstart.utils import verify_model_region_and_return_specs
+
+        model_specs = verify_model_region_and_return_specs(
+                model_id=model_id,
+                version=model_version,
+                scope=JumpStartScriptScope(scope),
+                region=region
+            )
+
+        if model_specs is None:
+            return None
+
+        return CachedModelSpecs(model_specs.version,
+                                model_specs.hosting_model_package_arns,
+                                model_specs.inference_enable_network_isolation)._asdict()
+
+    model_specs = jumpstart_cache.get("model_specs", lookup,
+                                      model_id=model_id,
+                                      version=model_version,
+                                      region=region,
+                                      scope=getattr(scope, "value", scope))
 
     if model_specs is None:
         return None
+
+    if resolve_version:
+        jumpstart_cache.lock_version(model_id, model_specs["version"])
     
-    return model_specs
+    return CachedModelSpecs(**model_specs)
 
 def get_model_package_arn(
     model_specs,